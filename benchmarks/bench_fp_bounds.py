@@ -0,0 +1,62 @@
+'''
+Micro-benchmark of the fixed point bounds check in CountFPMatch against the string-based check it replaced.
+Run with
+
+    python benchmarks/bench_fp_bounds.py
+
+The DSGRN computations are done once up front, so only the bounds matching is timed.
+'''
+import DSGRN
+import json, os, time
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.queries.CountFPMatch import DSGRN_Computation, compile_bounds, FP_matrix, bounds_match
+
+
+def is_FP_match(bounds_ind, annotation):
+    digits = [int(s) for s in annotation.replace(",", "").split() if s.isdigit()]
+    return all(digits[k] >= bounds_ind[k][0] and digits[k] <= bounds_ind[k][1] for k in bounds_ind)
+
+
+def is_multistable_match(network, b, stable_FP_annotations):
+    bounds_ind = {network.index(str(k)): b[k] for k in b}
+    return any([is_FP_match(bounds_ind, a) for a in stable_FP_annotations])
+
+
+def string_match(network, included_bounds, excluded_bounds, stable_FP_annotations):
+    return all(is_multistable_match(network, b, stable_FP_annotations) for b in included_bounds) and \
+           not any(is_multistable_match(network, b, stable_FP_annotations) for b in excluded_bounds)
+
+
+def array_match(network, included, excluded, stable_FP_annotations, batch_size=100):
+    matches = []
+    for i in range(0, len(stable_FP_annotations), batch_size):
+        batch = stable_FP_annotations[i:i + batch_size]
+        FPs, owners = FP_matrix(batch, network.size())
+        matches.extend(bounds_match(included, FPs, owners, len(batch)).all(axis=0) &
+                       ~bounds_match(excluded, FPs, owners, len(batch)).any(axis=0))
+    return matches
+
+
+if __name__ == "__main__":
+    testsdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+    params = json.load(open(os.path.join(testsdir, "mpi_params_FP.json")))
+    # exercise excluded bounds and several bounds per parameter as well
+    params["excluded_bounds"] = [{"X1":[0,0],"X2":[0,0]}, {"X3":[3,3]}]
+    for netspec in read_networks(os.path.join(testsdir, "mpi_networks_FP.txt")):
+        network = DSGRN.Network(netspec)
+        parametergraph = DSGRN.ParameterGraph(network)
+        annotations = [DSGRN_Computation(parametergraph.parameter(p)) for p in range(parametergraph.size())]
+        included = compile_bounds(network, params["included_bounds"])
+        excluded = compile_bounds(network, params["excluded_bounds"])
+        repeats = max(1, 20000 // len(annotations))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            old = [string_match(network, params["included_bounds"], params["excluded_bounds"], a) for a in annotations]
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeats):
+            new = array_match(network, included, excluded, annotations)
+        new_time = time.perf_counter() - start
+        assert old == [bool(b) for b in new]
+        print("{} parameters x {} repeats, {} matches: strings {:.4f} s, arrays {:.4f} s".format(
+            len(annotations), repeats, sum(new), old_time, new_time))
@@ -0,0 +1,39 @@
+'''
+Benchmark of make_db with a process pool against the serial build, for 1, 2, 4, ... processes up to the number of
+CPUs. Run with
+
+    python benchmarks/bench_make_db.py <optional_network_specification_file> <optional_chunk_size>
+
+The default network is the first network of tests/networks_stable_X1X2X3.txt (2352 DSGRN parameters). Every pooled
+database is checked to have the same Signatures table as the serial one.
+'''
+import os, sqlite3, sys, tempfile, time
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.utilities.signatures_no_mpi import make_db
+
+
+def signatures(dbfile):
+    connection = sqlite3.connect(dbfile)
+    rows = list(connection.execute("SELECT ParameterIndex, MorseGraphIndex FROM Signatures ORDER BY ParameterIndex"))
+    connection.close()
+    return rows
+
+
+if __name__ == "__main__":
+    testsdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests")
+    netspec = read_networks(sys.argv[1] if len(sys.argv) > 1 else os.path.join(testsdir, "networks_stable_X1X2X3.txt"))[0]
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    num_procs = [1]
+    while num_procs[-1] * 2 <= os.cpu_count():
+        num_procs.append(num_procs[-1] * 2)
+    serial = None
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num_proc in num_procs:
+            dbfile = os.path.join(tmpdir, "network{}.db".format(num_proc))
+            start = time.perf_counter()
+            make_db(netspec, dbfile, num_proc, chunk_size)
+            seconds = time.perf_counter() - start
+            if serial is None:
+                serial = (seconds, signatures(dbfile))
+            assert signatures(dbfile) == serial[1]
+            print("{} processes: {:.2f} s, speedup {:.2f}".format(num_proc, seconds, serial[0] / seconds))
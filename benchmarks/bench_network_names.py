@@ -0,0 +1,53 @@
+'''
+Benchmark of the network name extraction in check_posets against the DSGRN.Network based version it replaced.
+Run with
+
+    python benchmarks/bench_network_names.py <optional_number_of_networks>
+
+The default is 100000 random networks over 30 genes, checked against posets for 200 sets of genes.
+'''
+import DSGRN
+import random, sys, time
+from dsgrn_net_query.utilities.file_utilities import network_names
+from dsgrn_net_query.utilities.poset_utilities import check_posets
+
+
+def old_check_posets(networks, posets):
+    new_networks = []
+    missing_names = set([])
+    for networkspec in networks:
+        network = DSGRN.Network(networkspec)
+        names = tuple(sorted([network.name(k) for k in range(network.size())]))
+        poset_names = set([n for nodes in posets for n in nodes])
+        missing_names = missing_names.union(set(name for name in names if name not in poset_names))
+        if set(names).intersection(missing_names):
+            continue
+        new_networks.append(networkspec)
+    return new_networks
+
+
+def random_network(genes):
+    # a cycle with one repressing edge, written in a random node order
+    names = random.sample(genes, random.randint(3, 6))
+    lines = ["{} : ({}) : E".format(names[k], names[k - 1]) for k in range(1, len(names))]
+    lines.append("{} : (~{}) : E".format(names[0], names[-1]))
+    random.shuffle(lines)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(0)
+    genes = ["G{}".format(k) for k in range(30)]
+    networks = [random_network(genes) for _ in range(N)]
+    # the last gene never occurs in a poset, so some networks are pruned
+    posets = {tuple(sorted(random.sample(genes[:-1], 4))) : {} for _ in range(200)}
+    start = time.perf_counter()
+    old = old_check_posets(networks, posets)
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new = check_posets(networks, posets)
+    new_time = time.perf_counter() - start
+    assert old == new
+    assert all(network_names(n) == tuple(sorted(DSGRN.Network(n).name(k) for k in range(DSGRN.Network(n).size()))) for n in networks[:1000])
+    print("{} networks, {} kept: DSGRN.Network {:.2f} s, spec parser {:.2f} s".format(N, len(new), old_time, new_time))
@@ -2,7 +2,22 @@ import sys,os,json,datetime
 
 
 helpstring = "Calling signature has four required arguments \n " \
-            "python call_job.py <num_processes> <query_module.py> <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir>"
+            "python call_job.py <num_processes> <query_module.py> <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume> <optional --backend mpi|process|serial>"
+
+# resume a run that was interrupted, skipping the work already recorded in the checkpoint file of its results folder
+resume = "--resume" in sys.argv
+if resume:
+    sys.argv.remove("--resume")
+
+# choose how the work is distributed, overriding the key "backend" of the parameter file
+backend = None
+if "--backend" in sys.argv:
+    i = sys.argv.index("--backend")
+    if i + 1 >= len(sys.argv):
+        print(helpstring)
+        exit(1)
+    backend = sys.argv[i + 1]
+    del sys.argv[i:i + 2]
 
 if len(sys.argv) < 5:
     print(helpstring)
@@ -22,19 +37,27 @@ param_dict = json.load(open(param_file))
 if "datetime" not in param_dict:
     datetimestr = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
     param_dict["datetime"] = datetimestr
-    json.dump(param_dict,open(param_file,"w"))
 else:
     datetimestr = param_dict["datetime"]
-
-
-if "CountStableFC_large_networks.py" not in query:
-    command = " ".join(["mpiexec", "-n", num_proc, "python", "src/dsgrn_net_query/queries/{}".format(query), network_file, param_file, resultsdir,">dsgrn_net_query{}.log".format(datetimestr),"2>&1"])
+if backend is not None:
+    param_dict["backend"] = backend
+elif "backend" in param_dict:
+    backend = param_dict["backend"]
 else:
+    # CountStableFC_large_networks.py runs a process pool by default, all other queries run over MPI
+    backend = "process" if "CountStableFC_large_networks.py" in query else "mpi"
+if backend != "mpi":
     # overwrite number of processes in parameter file with the commandline argument
-    params = json.load(open(param_file))
-    params["num_proc"] = num_proc
-    json.dump(params,open(param_file,"w"))
-    command = " ".join(["python", "src/dsgrn_net_query/queries/{}".format(query), network_file, param_file, resultsdir,">dsgrn_net_query{}.log".format(datetimestr),"2>&1"])
+    param_dict["num_proc"] = num_proc
+json.dump(param_dict,open(param_file,"w"))
+
+resumeflag = "--resume" if resume else ""
+# append to the log of the interrupted run when resuming
+redirect = ">>" if resume else ">"
+
+# only the MPI backend is started with mpiexec
+launcher = ["mpiexec", "-n", num_proc, "python"] if backend == "mpi" else ["python"]
+command = " ".join(launcher + ["src/dsgrn_net_query/queries/{}".format(query), network_file, param_file, resultsdir, resumeflag, "{}dsgrn_net_query{}.log".format(redirect,datetimestr),"2>&1"])
 
 os.system(command)
 
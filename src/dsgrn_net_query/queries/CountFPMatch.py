@@ -1,18 +1,23 @@
 import DSGRN
-import os, json, sys
+import os, json, sys, time
+import numpy as np
 from functools import partial
-from mpi4py import MPI
-from mpi4py.futures import MPICommExecutor
-from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder
+from operator import itemgetter
+from dsgrn_net_query.utilities.executor_utilities import open_executor, num_workers, get_backend
+from dsgrn_net_query.utilities.profile_utilities import Profile
+from dsgrn_net_query.utilities.file_utilities import read_networks, iter_networks, count_networks, distinct_networks, fan_out, report_duplicates, create_results_folder, open_checkpoint, append_checkpoint, read_checkpoint, check_resume, write_json
+from dsgrn_net_query.utilities.schedule_utilities import imap_networks
 from dsgrn_net_query.utilities.parameter_utilities import get_neighbors
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache, morse_summary, stable_annotations
 
 
-def query(network_file,params_file,resultsdir=""):
+def query(network_file,params_file,resultsdir="",resume=False):
     '''
     Take the intersection of an arbitrary number of DSGRN fixed points in a list.
 
     :param network_file: a .txt file containing either a single DSGRN network specification or
-                a list of network specification strings in DSGRN format
+                a list of network specification strings in DSGRN format, or a .jsonl file with one network
+                specification per line, which is read lazily
     :param params_file: A json file with a dictionary containing the keys
                     "included_bounds", "excluded_bounds", and "count".
                     The two "bounds" variables are each a list of dictionaries of variable names common to all network
@@ -27,10 +32,29 @@ def query(network_file,params_file,resultsdir=""):
                     "count" : True or False (true or false in .json format);
                     whether to count all parameters with a match or shortcut at first success
                     "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+                    "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                        forked processes on one machine or not at all, default = "mpi"; the results are the same
+                    "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
                     "neighbors" : optional True or False (true or false in .json format) stating whether to query DSGRN parameters that
                     neighbor essential DSGRN parameters, neighbor-checking is computationally expensive, default = False
+                    "neighbor_cache" : optional path to a directory in which the essential DSGRN parameters and their
+                    neighbors are saved for every network, so that later runs over the same networks reuse them,
+                    default = no cache
+                    "batch_size" : optional number of DSGRN parameters whose fixed points are checked against the bounds
+                    together, default = 100. When "count" is False, the search stops after the first batch with a match.
+                    "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN
+                    parameter across runs, default = no cache
+                    "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
+                    "window" : optional maximum number of networks submitted to the workers at one time, default = 1000
+                    "schedule" : optional "file" or "lpt", whether to submit networks in file order or largest parameter graph
+                                first, default = "file"
+                    "cost_model" : optional dictionary of weights for the "lpt" schedule, see schedule_utilities.network_cost
+                    "profile" : optional True or False, whether to time the DSGRN computations of every network and the
+                    busy and idle time of every worker and write them to profile.json in the results folder, default = False
 
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint file of
+                    the results folder with the same datetime, default is False
 
     :return: Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
             The results are DSGRN parameter count with successful matches to the fixed point bounds, or True
@@ -42,22 +66,38 @@ def query(network_file,params_file,resultsdir=""):
             { networkspec : [result, num params with hex constraints, DSGRN param graph size] }.
     '''
 
-    networks = read_networks(network_file)
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
+    num_networks, num_distinct = count_networks(networks)
     params = json.load(open(params_file))
     datetime = None if "datetime" not in params else params["datetime"]
 
     sanity_check(params)
+    check_resume(params, resume)
 
-    if not networks:
+    if not num_networks:
         raise ValueError("No networks available for analysis. Make sure network file is in the correct format.")
     else:
-        work_function = partial(search_over_networks, params, len(networks))
-        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
+        work_function = partial(search_over_networks, params, num_distinct)
+        with open_executor(params) as executor:
             if executor is not None:
+                profile = Profile(params, get_backend(params))
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+                # results stream to the checkpoint file as networks finish; only the keys are held in memory
+                recorded, checkpoint = open_checkpoint(resultsdir, resume, keys_only=True)
+                report_duplicates(num_networks, num_distinct)
+                if recorded:
+                    print("Resuming: {} of {} networks already recorded.".format(len(recorded), num_distinct))
+                # distinct networks are read lazily and submitted as earlier ones finish, unless they are scheduled by size
+                duplicates = {}
+                todo = ((k, netspec) for k, netspec in enumerate(distinct_networks(iter_networks(networks), duplicates)) if netspec not in recorded)
                 print("Querying networks.")
-                output=list(executor.map(work_function, enumerate(networks)))
-                results = dict(output)
-                record_results(network_file, params_file,results,resultsdir,datetime)
+                outputs = imap_networks(executor, profile.wrap(work_function, itemgetter(1)), todo, params, num_workers(params))
+                for netspec, result in profile.unwrap(outputs):
+                    append_checkpoint(checkpoint, netspec, result)
+                checkpoint.close()
+                profile.write(resultsdir)
+                record_results(resultsdir, duplicates)
 
 
 def sanity_check(params):
@@ -70,21 +110,16 @@ def sanity_check(params):
         raise ValueError("The parameter file must contain keys 'included_bounds', 'excluded_bounds', and 'count'.")
 
 
-def record_results(network_file, params_file,results,resultsdir,datetime):
+def record_results(resultsdir,duplicates=None):
     '''
-    Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
-    :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
-    :param datetime: None or string with datetime
+    Compact the results streamed to the checkpoint file into a .json file. The checkpoint is read one network at a
+    time and every entry is written straight to the output file, so memory does not grow with the number of networks.
+    :param resultsdir: The date-time stamped directory in which to save the dictionary of results.
+    :param duplicates: optional dictionary filled by distinct_networks; the results of a queried network are also
+            written for its duplicates
     :return: None. File is written.
     '''
-    resultsdir = create_results_folder(network_file, params_file, resultsdir,datetime)
-    rname = os.path.join(resultsdir,"query_results.json")
-    if os.path.exists(rname):
-        os.rename(rname,rname+".old")
-    json.dump(results,open(rname,'w'))
+    write_json(os.path.join(resultsdir,"query_results.json"), fan_out(read_checkpoint(resultsdir), duplicates))
     print(resultsdir)
 
 
@@ -97,22 +132,35 @@ def search_over_networks(params,N,enum_network):
     :return: (DSGRN network specification, results) pair
     '''
     (k, netspec) = enum_network
+    start = time.perf_counter()
     if "neighbors" in params and params["neighbors"] is True:
-        noness_netspec, paramlist = get_neighbors(netspec)
+        cache_dir = os.path.expanduser(params["neighbor_cache"]) if "neighbor_cache" in params else None
+        noness_netspec, paramlist = get_neighbors(netspec, cache_dir)
         network,parametergraph = getpg(noness_netspec)
     else:
         network, parametergraph = getpg(netspec)
         paramlist = list(range(parametergraph.size()))
+    neighbor_time = time.perf_counter() - start
+    included = compile_bounds(network, params["included_bounds"])
+    excluded = compile_bounds(network, params["excluded_bounds"])
+    batch_size = params["batch_size"] if "batch_size" in params else 100
+    morsecache = open_morse_cache(params, network)
     numparams = 0
-    for p in paramlist:
-        if have_match(network, parametergraph.parameter(p), params["included_bounds"], params["excluded_bounds"]):
-            if params["count"]:
-                numparams +=1
-            else:
-                print("Network {} of {} complete.".format(k + 1, N))
-                sys.stdout.flush()
-                return (netspec,(True, parametergraph.size()))
-    print("Network {} of {} complete.".format(k + 1, N))
+    for i in range(0, len(paramlist), batch_size):
+        stable_FP_annotations = [stable_annotations(morsecache.summary(p, parametergraph.parameter(p)), "FP")
+                                 for p in paramlist[i:i + batch_size]]
+        matches = have_matches(stable_FP_annotations, included, excluded)
+        if params["count"]:
+            numparams += int(matches.sum())
+        elif matches.any():
+            morsecache.close()
+            print(timing_report(k, N, params, neighbor_time, time.perf_counter() - start - neighbor_time))
+            sys.stdout.flush()
+            return (netspec,(True, parametergraph.size()))
+    morsecache.close()
+    print(timing_report(k, N, params, neighbor_time, time.perf_counter() - start - neighbor_time))
+    if morsecache.path is not None:
+        print(morsecache.report())
     sys.stdout.flush()
     if params["count"]:
         return netspec,(numparams,len(paramlist))
@@ -120,6 +168,20 @@ def search_over_networks(params,N,enum_network):
         return netspec,(False,len(paramlist))
 
 
+def timing_report(k, N, params, neighbor_time, query_time):
+    '''
+    :param k: index of the network
+    :param N: number of networks
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param neighbor_time: seconds spent finding the essential DSGRN parameters and their neighbors
+    :param query_time: seconds spent checking the DSGRN parameters against the bounds
+    :return: log message for a finished network, with timings in "neighbors" mode
+    '''
+    if "neighbors" in params and params["neighbors"] is True:
+        return "Network {} of {} complete. Neighbors {:.2f} s, query {:.2f} s.".format(k + 1, N, neighbor_time, query_time)
+    return "Network {} of {} complete.".format(k + 1, N)
+
+
 def getpg(netspec):
     '''
     Calculate DSGRN parameter graph
@@ -131,107 +193,93 @@ def getpg(netspec):
     return network,parametergraph
 
 
-def have_match(network,parameter,included_bounds,excluded_bounds):
+def compile_bounds(network,bounds):
     '''
-    Check if both included and excluded bounds are satisfied for any fixed point of the specified DSGRN parameter.
+    Convert user-specified fixed point bounds to arrays over the DSGRN indices of the network variables. Variables that
+    are not constrained by a bound get the range [0, maximum integer].
     :param network: DSGRN.Network object
-    :param parameter: DSGRN.Parameter object
-    :param included_bounds: List of dictionaries of DSGRN fixed point bounds to include
-    :param excluded_bounds: List of dictionaries of DSGRN fixed point bounds to exclude
-    :return: True or False
+    :param bounds: list of DSGRN fixed point bounds
+    :return: (lower, upper) pair of integer arrays of shape (number of bounds, number of network variables)
     '''
-    stable_FP_annotations = DSGRN_Computation(parameter)
-    included = all_included(network, included_bounds, stable_FP_annotations)
-    excluded = all_excluded(network, excluded_bounds, stable_FP_annotations)
-    if included and excluded:
-        return True
-    return False
+    lower = np.zeros((len(bounds), network.size()), dtype=np.int64)
+    upper = np.full((len(bounds), network.size()), np.iinfo(np.int64).max, dtype=np.int64)
+    for j, b in enumerate(bounds):
+        for k in b:
+            i = network.index(str(k))
+            lower[j, i], upper[j, i] = b[k]
+    return lower, upper
 
 
-def DSGRN_Computation(parameter):
+def have_matches(stable_FP_annotations,included,excluded):
     '''
-    Get DSGRN annotations for all Morse sets that are fixed points.
-    :param parameter: DSGRN.Parameter object
-    :return: list of DSGRN annotations
+    Check if both included and excluded bounds are satisfied for any fixed point of each of a list of DSGRN parameters.
+    :param stable_FP_annotations: list with a list of DSGRN annotations of the stable fixed points of each parameter
+    :param included: (lower, upper) arrays of DSGRN fixed point bounds to include, output of compile_bounds
+    :param excluded: (lower, upper) arrays of DSGRN fixed point bounds to exclude, output of compile_bounds
+    :return: boolean array with one entry per parameter
     '''
-    dg = DSGRN.DomainGraph(parameter)
-    mg = DSGRN.MorseGraph(dg)
-    return [mg.annotation(i)[0] for i in range(0, mg.poset().size()) if is_FP(mg.annotation(i)[0]) and len(mg.poset(
-        ).children(i)) == 0]
+    num_parameters = len(stable_FP_annotations)
+    if not len(included[0]) and not len(excluded[0]):
+        return np.ones(num_parameters, dtype=bool)
+    FPs, owners = FP_matrix(stable_FP_annotations, included[0].shape[1])
+    return bounds_match(included, FPs, owners, num_parameters).all(axis=0) & \
+           ~bounds_match(excluded, FPs, owners, num_parameters).any(axis=0)
 
 
-def is_FP(annotation):
+def FP_matrix(stable_FP_annotations,size):
     '''
-    Specifies whether a Morse set is a fixed point.
-    :param annotation: DSGRN annotation string
-    :return: True or False
+    Parse the locations of the fixed points of several DSGRN parameters into one integer matrix.
+    :param stable_FP_annotations: list with a list of DSGRN annotations for each DSGRN parameter
+    :param size: number of network variables
+    :return: integer array of shape (total number of fixed points, size) and an integer array with the position of
+            the DSGRN parameter of each fixed point in stable_FP_annotations
     '''
-    return annotation.startswith("FP")
+    owners = np.repeat(np.arange(len(stable_FP_annotations)), [len(a) for a in stable_FP_annotations])
+    text = " ".join(a for annotations in stable_FP_annotations for a in annotations)
+    digits = [int(s) for s in text.replace(",", " ").split() if s.isdigit()]
+    return np.array(digits, dtype=np.int64).reshape(len(owners), size), owners
 
 
-def is_FP_match(bounds_ind, annotation):
+def bounds_match(bounds,FPs,owners,num_parameters):
     '''
-    Specifies whether a DSGRN fixed point satisfies the user-specified bounds on fixed point location.
-    :param bounds_ind: User-specified fixed point bounds using DSGRN indices for the variables.
-    :param annotation: DSGRN annotation string
-    :return: True or False
+    Checks across the fixed points of each DSGRN parameter for a match to each bound.
+    :param bounds: (lower, upper) arrays of DSGRN fixed point bounds, output of compile_bounds
+    :param FPs: integer array of fixed point locations, output of FP_matrix
+    :param owners: integer array of DSGRN parameter positions, output of FP_matrix
+    :param num_parameters: number of DSGRN parameters
+    :return: boolean array of shape (number of bounds, num_parameters)
     '''
-    digits = [int(s) for s in annotation.replace(",", "").split() if s.isdigit()]
-    return all(digits[k] >= bounds_ind[k][0] and digits[k] <= bounds_ind[k][1]
-           for k in bounds_ind)
+    lower, upper = bounds
+    inside = ((FPs[None, :, :] >= lower[:, None, :]) & (FPs[None, :, :] <= upper[:, None, :])).all(axis=2)
+    matched = np.zeros((len(lower), num_parameters), dtype=bool)
+    rows, cols = np.nonzero(inside)
+    matched[rows, owners[cols]] = True
+    return matched
 
 
-def is_multistable_match(network,b,stable_FP_annotations):
-    '''
-    Checks across all fixed points for a match to bound b.
-    :param network: DSGRN.Network object
-    :param b: DSGRN fixed point bounds
-    :param stable_FP_annotations: list of DSGRN annotations
-    :return: True or False
-    '''
-    bounds_ind = {network.index(str(k)): b[k] for k in b}
-    return any([is_FP_match(bounds_ind, a) for a in stable_FP_annotations])
-
-
-def all_included(network,included_bounds,stable_FP_annotations):
-    '''
-    Checks if all included bounds are present in the collection of Morse sets.
-    :param network: DSGRN.Network object
-    :param included_bounds: list of DSGRN fixed point bounds
-    :param stable_FP_annotations: list of DSGRN annotations
-    :return: True or False
-    '''
-    for b in included_bounds:
-        if not is_multistable_match(network, b, stable_FP_annotations):
-            return False
-    return True
-
-
-def all_excluded(network,excluded_bounds,stable_FP_annotations):
+def DSGRN_Computation(parameter):
     '''
-    Checks if all excluded bounds are absent in the collection of Morse sets.
-    :param network: DSGRN.Network object
-    :param excluded_bounds: list of DSGRN fixed point bounds
-    :param stable_FP_annotations: list of DSGRN annotations
-    :return: True or False
+    Get DSGRN annotations for all Morse sets that are stable fixed points.
+    :param parameter: DSGRN.Parameter object
+    :return: list of DSGRN annotations
     '''
-    for b in excluded_bounds:
-        if is_multistable_match(network, b, stable_FP_annotations):
-            return False
-    return True
+    return stable_annotations(morse_summary(DSGRN.DomainGraph(parameter)), "FP")
 
 
 if __name__ == "__main__":
+     resume = "--resume" in sys.argv
+     if resume:
+        sys.argv.remove("--resume")
      if len(sys.argv) < 3:
         print(
         "Calling signature has two required arguments \n " \
-        "mpiexec -n <num_processes> python CountFPMatch.py <path_to_network_file> <path_to_parameter_file>"
+        "mpiexec -n <num_processes> python CountFPMatch.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
      network_file = sys.argv[1]
      params_file = sys.argv[2]
      if len(sys.argv)>3:
         resultsdir = sys.argv[3]
-        query(network_file, params_file, resultsdir)
+        query(network_file, params_file, resultsdir, resume=resume)
      else:
-        query(network_file,params_file)
+        query(network_file,params_file, resume=resume)
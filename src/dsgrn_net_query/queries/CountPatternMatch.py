@@ -1,13 +1,18 @@
 import DSGRN
 import json, os, sys, ast
+from collections import Counter
 from functools import partial
-from dsgrn_net_query.utilities.poset_utilities import calculate_posets_from_multiple_time_series,check_posets
-from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder
-from mpi4py import MPI
-from mpi4py.futures import MPICommExecutor
+from operator import itemgetter
+from dsgrn_net_query.utilities.poset_utilities import calculate_posets_from_multiple_time_series,check_posets,node_name_sets
+from dsgrn_net_query.utilities.file_utilities import read_networks, iter_networks, count_networks, create_results_folder, open_checkpoint, append_checkpoint, read_checkpoint, check_resume, network_names, distinct_networks, fan_out, report_duplicates
+from dsgrn_net_query.utilities.schedule_utilities import get_parameter_graph, imap_chunks, network_cost
+from dsgrn_net_query.utilities.pattern_utilities import get_patterngraphs, patterngraph_counters, cache_counters, cache_report, ParameterAnalysis, domain_check, stableFC_check
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache
+from dsgrn_net_query.utilities.executor_utilities import open_executor, num_workers, get_backend
+from dsgrn_net_query.utilities.profile_utilities import Profile
 
 
-def query(network_file,params_file,resultsdir=""):
+def query(network_file,params_file,resultsdir="",resume=False):
     '''
     For each epsilon in a list of epsilons, a partially ordered set (poset) of maxima and minima of time series data
     is created or accessed from the params dictionary.
@@ -16,13 +21,28 @@ def query(network_file,params_file,resultsdir=""):
     and False if not, depending on the choice of the parameter "count".
 
     :param network_file: a .txt file containing either a single DSGRN network specification or a list of network
-    specification strings in DSGRN format
+    specification strings in DSGRN format, or a .jsonl file with one network specification per line, which is read
+    lazily
     :param params_file: A .json file containing a dictionary with the keys
         "domain" : True or False (true or false in .json format), whether or not to perform a path search anywhere in the domain graph
         "stablefc" : True or False (true or false in .json format), whether or not to perform a path search within stable full cycles
         Both "domain" and "stablefc" are allowed to be True.
         "count" : True or False (true or false in .json format), whether to count all DSGRN parameters or shortcut at first success
         "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+        "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                    forked processes on one machine or not at all, default = "mpi"; the results are the same
+        "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
+        "chunk_size" : optional maximum number of DSGRN parameters in one unit of work, default = 1000. The parameter
+                    graph of every network is split into chunks of this size that are load-balanced across processes.
+        "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN parameter
+                    across runs, default = no cache
+        "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
+        "schedule" : optional "file" or "lpt", whether to submit chunks in file order or largest predicted cost first,
+                    default = "file"
+        "profile" : optional True or False, whether to time the DSGRN computations of every network and the busy and
+                    idle time of every worker and write them to profile.json in the results folder, default = False
+        "cost_model" : optional dictionary of weights for the "lpt" schedule, which accounts for the number of posets and
+                    the search types, see schedule_utilities.network_cost
 
         One can either specify posets directly, or extract posets from timeseries data.
         Include EITHER the three keys
@@ -33,6 +53,8 @@ def query(network_file,params_file,resultsdir=""):
                     Note that an epsilon of 0.10 means that the noise level is considered to be +/- 10% of the distance
                     between global maximum and global minimum for each time series. Thus all information on curve shape
                     is lost at epsilon = 0.5. It is recommended to stay below that level.
+        "poset_cache" : optional True or False, whether to save the posets next to each time series file and reuse them
+                    in later runs with the same file contents, names, epsilons and format, default = False
         OR the single key
         "posets" : a (quoted) dictionary of Python tuples of node names keying a list of tuples of epsilon with a DSGRN
         formatted poset:
@@ -41,6 +63,8 @@ def query(network_file,params_file,resultsdir=""):
         This key takes specialized information and is not likely to be specified in general usage.
 
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint file of
+                    the results folder with the same datetime, default is False
 
     :return: Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
         The results are DSGRN parameter count with successful matches, or True (existence of at least one match)
@@ -59,24 +83,62 @@ def query(network_file,params_file,resultsdir=""):
         parameters with a match to at least one time series dataset.
     '''
 
-    networks = read_networks(network_file)
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
     params = json.load(open(params_file))
 
     sanity_check(params)
-
-    posets,networks = get_posets(networks,params)
-
-    if not networks:
-        print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
-        return None
-    else:
-        work_function = partial(search_over_networks, params, posets,len(networks))
-        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
-            if executor is not None:
-                print("Querying networks.")
-                output=list(executor.map(work_function, enumerate(networks)))
-                results = dict(output)
-                record_results(network_file, params_file,results,resultsdir,params)
+    check_resume(params, resume)
+
+    with open_executor(params) as executor:
+        if executor is not None:
+            # the posets are computed on the worker processes
+            posets,names = stream_posets(networks,params,executor)
+            num_networks, num_distinct = count_networks(matching_networks(networks,names))
+            if not num_networks:
+                print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
+                return None
+            else:
+                profile = Profile(params, get_backend(params))
+                work_function = profile.wrap(partial(search_over_chunk, params, posets), itemgetter(1))
+                datetime = params["datetime"] if "datetime" in params else None
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+                # results stream to the checkpoint file as networks finish; only the keys are held in memory
+                recorded, checkpoint = open_checkpoint(resultsdir, resume, keys_only=True)
+                report_duplicates(num_networks, num_distinct)
+                if recorded:
+                    print("Resuming: {} of {} networks already recorded.".format(len(recorded), num_distinct))
+                # distinct networks are read lazily and their chunks submitted as earlier ones finish, unless they are scheduled by cost
+                duplicates = {}
+                todo = ((k, netspec) for k, netspec in enumerate(distinct_networks(matching_networks(networks,names), duplicates)) if netspec not in recorded)
+                print("Querying {} networks.".format(num_distinct - len(recorded)))
+                sys.stdout.flush()
+                chunked = {}
+                chunk_results = {}
+                received = Counter()
+                counters = Counter()
+                # without counts, the chunks of a network that is already complete are not needed any more
+                skip = None if params["count"] else lambda chunk: chunk[0] not in chunked
+                outputs = imap_chunks(executor, work_function, todo, params, num_workers(params), chunked, partial(chunk_cost, params, posets), skip)
+                num_done = len(recorded)
+                for k, chunk_result, chunk_counters in profile.unwrap(outputs):
+                    counters.update(chunk_counters)
+                    if k not in chunked:
+                        # a chunk that had started before its network was complete
+                        continue
+                    merged = merge_chunk_results([chunk_results[k], chunk_result], params["count"]) if k in chunk_results else chunk_result
+                    chunk_results[k] = merged
+                    received[k] += 1
+                    if received[k] == chunked[k][2] or (not params["count"] and all_matched(merged, params["domain"], params["stablefc"])):
+                        del chunk_results[k], received[k]
+                        append_checkpoint(checkpoint, chunked.pop(k)[0], format_results(merged, params))
+                        num_done += 1
+                        print("Network {} of {} complete.".format(num_done, num_distinct))
+                        sys.stdout.flush()
+                checkpoint.close()
+                print(cache_report(counters, "morse_cache" in params))
+                profile.write(resultsdir)
+                record_results(resultsdir,params,duplicates)
 
 
 def sanity_check(params):
@@ -95,9 +157,9 @@ def sanity_check(params):
         raise ValueError("All of the three keys 'domain', 'stablefc' and 'count' must be specified in the parameter file.")
 
 
-def get_posets(networks,params):
+def get_posets(networks,params,executor=None):
     if "posets" not in params:
-        posets,networks = calculate_posets_from_multiple_time_series(params,networks)
+        posets,networks = calculate_posets_from_multiple_time_series(params,networks,executor)
     else:
         lit_posets = ast.literal_eval(params["posets"])
         posets = {}
@@ -110,185 +172,301 @@ def get_posets(networks,params):
     return posets,networks
 
 
+def stream_posets(networks,params,executor=None):
+    '''
+    Compute the posets from one network for every distinct set of node names (see node_name_sets), so that the
+    networks are never all held in memory.
+    :param networks: a .jsonl file, or any input accepted by read_networks
+    :param params: dictionary
+    :param executor: optional executor over which the posets are computed
+    :return: (dictionary of posets keyed by node names, set of the node names of the networks that can be matched)
+    '''
+    posets,kept = get_posets(node_name_sets(iter_networks(networks)),params,executor)
+    return posets, set(network_names(netspec) for netspec in kept)
+
+
+def matching_networks(networks,names):
+    '''
+    :param networks: a .jsonl file, or any input accepted by read_networks
+    :param names: set of node names, see stream_posets
+    :return: generator of the DSGRN network specifications with node names in names
+    '''
+    for netspec in iter_networks(networks):
+        if network_names(netspec) in names:
+            yield netspec
+
+
+def chunk_cost(params,posets,netspec,size):
+    '''
+    Predicted cost of a chunk of DSGRN parameters for the "lpt" schedule, see schedule_utilities.network_cost.
+    :param params: dictionary
+    :param posets: dictionary of posets keyed by node names, see get_posets
+    :param netspec: DSGRN network specification
+    :param size: number of DSGRN parameters in the chunk
+    :return: float
+    '''
+    return network_cost(size, params, sum(len(pos) for pos in posets.get(network_names(netspec), {}).values()))
+
+
 
-def search_over_networks(params,posets,N,enum_netspec):
+def search_over_chunk(params,posets,chunk):
     '''
     Work function for parallelization.
     :param params: dictionary
     :param posets: dictionary of partially ordered sets of extrema for each time series in DSGRN format, keyed by the
             names of the genes in the time series file that are to be matched.
-    :param N: size of the parameter graph for the specified network
-    :param enum_netspec: an (integer, DSGRN network specification) pair
-    :return: (DSGRN network specification, results) pair
+    :param chunk: a (network index, DSGRN network specification, start, stop) tuple; DSGRN parameters with indices
+            start <= p < stop are searched
+    :return: (network index, chunk results, cache counters) tuple
     '''
-    (k,netspec) = enum_netspec
+    (k,netspec,start,stop) = chunk
     domain = params["domain"]
     stablefc = params["stablefc"]
-    network = DSGRN.Network(netspec)
-    names = tuple(sorted([network.name(k) for k in range(network.size())]))
+    # chunks of the same network that run on the same process share the network and parameter graph
+    network, paramgraph = get_parameter_graph(netspec)
+    names = network_names(netspec)
     newposets = posets[names]
-    ER = {}
+    morsecache = open_morse_cache(params, network)
+    before = patterngraph_counters()
     if params["count"]:
-        dmatches, fcmatches = PathMatches_with_count(network,newposets,domain,stablefc)
+        chunk_result = PathMatches_with_count(network,paramgraph,newposets,domain,stablefc,start,stop,morsecache)
     else:
-        dmatches, fcmatches = PathMatches_without_count(network,newposets,domain,stablefc)
-    if domain:
-        ER["domain"]= dmatches
-    if stablefc:
-        ER["stablefc"]= fcmatches
-    print("Network {} of {} complete.".format(k+1,N))
-    sys.stdout.flush()
-    return (netspec, ER)
+        chunk_result = PathMatches_without_count(network,paramgraph,newposets,domain,stablefc,start,stop,morsecache)
+    morsecache.close()
+    return (k, chunk_result, cache_counters(before, morsecache))
 
 
-def record_results(network_file, params_file,results,resultsdir,params):
+def merge_chunk_results(chunk_results, count):
     '''
-    Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
-    :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
-    :param params: The dictionary of parameters generated from the .json parameter file.
-    :return: None. File is written.
+    Reduce the results of all the parameter chunks of one network.
+    :param chunk_results: list of dictionaries returned by PathMatches_with_count or PathMatches_without_count
+    :param count: True or False, the chunk results are counts (True) or existence (False)
+    :return: dictionary of results with the same structure as the chunk results
+    '''
+    merged = chunk_results[0]
+    for chunk_result in chunk_results[1:]:
+        for search in ["domain", "stablefc"]:
+            for tsfile, edict in chunk_result[search].items():
+                for eps, val in edict.items():
+                    if count:
+                        merged[search][tsfile][eps] += val
+                    else:
+                        merged[search][tsfile][eps] = merged[search][tsfile][eps] or val
+        if count:
+            merged["numFC"] += chunk_result["numFC"]
+            for search, edict in chunk_result["all"].items():
+                for eps, paraminds in edict.items():
+                    merged["all"][search][eps].update(paraminds)
+    return merged
+
+
+def format_results(merged, params):
     '''
-    if "datetime" in params:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir,params["datetime"])
+    Format the results of one network for the output files.
+    :param merged: dictionary returned by merge_chunk_results
+    :param params: dictionary
+    :return: dictionary of results keyed by search type, then time series file name
+    '''
+    size = merged["size"]
+    if params["count"]:
+        numFC = merged["numFC"]
+        dommatches = {tsfile : [(float(eps),count,size) for eps,count in edict.items()] for tsfile,edict in merged["domain"].items()}
+        fcmatches = {tsfile : [(float(eps),count,numFC,size) for eps,count in edict.items()] for tsfile,edict in merged["stablefc"].items()}
+        if merged["all"]:
+            dommatches.update({"all": [(float(eps),len(paraminds),size) for eps,paraminds in merged["all"]["domain"].items()]})
+            fcmatches.update({"all" : [(float(eps),len(paraminds),numFC,size) for eps,paraminds in merged["all"]["stablefc"].items()]})
     else:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir)
+        dommatches = {tsfile: [(float(eps), b, size) for eps, b in edict.items()] for tsfile, edict in merged["domain"].items()}
+        fcmatches = {tsfile: [(float(eps), b, size) for eps, b in edict.items()] for tsfile, edict in merged["stablefc"].items()}
+    ER = {}
+    if params["domain"]:
+        ER["domain"]= dommatches
+    if params["stablefc"]:
+        ER["stablefc"]= fcmatches
+    return ER
 
-    def savefile(rname,rdict):
-        if os.path.exists(rname):
-            os.rename(rname, rname + ".old")
-        json.dump(rdict, open(rname, 'w'))
 
-    reparse = {}
-    for netspec,ER in results.items():
+def record_results(resultsdir,params,duplicates=None):
+    '''
+    Compact the results streamed to the checkpoint file into one .json file for every search type and time series.
+    The checkpoint is read one network at a time and every entry is written straight to its output file, so memory
+    does not grow with the number of networks.
+    :param resultsdir: The date-time stamped directory in which to save the dictionary of results.
+    :param params: The dictionary of parameters generated from the .json parameter file.
+    :param duplicates: optional dictionary filled by distinct_networks; the results of a queried network are also
+            written for its duplicates
+    :return: None. Files are written.
+    '''
+    outfiles = {}
+    for netspec,ER in fan_out(read_checkpoint(resultsdir), duplicates):
         for search,tsdict in ER.items():
             if params[search]:
                 for ts, rlist in tsdict.items():
                     key = (search,ts)
-                    if key in reparse:
-                        reparse[key].append((netspec,rlist))
+                    if key not in outfiles:
+                        tsname = ts.split("/")[-1].split(".")[0]
+                        rname = os.path.join(resultsdir, "query_results_{}_{}.json".format(search, tsname))
+                        if os.path.exists(rname):
+                            os.rename(rname, rname + ".old")
+                        outfiles[key] = open(rname, "w")
+                        outfiles[key].write("{")
                     else:
-                        reparse[key] = [(netspec,rlist)]
-    for key,list_of_tup in reparse.items():
-        ts = key[1].split("/")[-1].split(".")[0]
-        rname = os.path.join(resultsdir, "query_results_{}_{}.json".format(key[0], ts))
-        savefile(rname,dict(list_of_tup))
+                        outfiles[key].write(", ")
+                    outfiles[key].write("{}: {}".format(json.dumps(netspec), json.dumps(rlist)))
+    for f in outfiles.values():
+        f.write("}")
+        f.close()
     print(resultsdir)
 
 
-def PathMatches_with_count(network, posets, domain, stablefc):
+def PathMatches_with_count(network, paramgraph, posets, domain, stablefc, start, stop, morsecache=None):
     '''
-    Count the number of pattern matches in the domain graph and/or stable full cycles.
+    Count the number of pattern matches in the domain graph and/or stable full cycles for a chunk of DSGRN parameters.
     :param network: DSGRN network object.
+    :param paramgraph: DSGRN parameter graph object of the network.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
     :param domain: True or False, search over whole domain graph.
     :param stablefc: True or False search over stable full cycles only.
+    :param start: first DSGRN parameter index in the chunk
+    :param stop: one past the last DSGRN parameter index in the chunk
+    :param morsecache: optional MorseGraphCache object of the network
     :return: dictionary of results
     '''
-    if len(posets) > 1:
-        totalDom= {"all": {str(eps[0]) : set() for eps in posets[next(iter(posets))]} }
-        totalFC = {"all": {str(eps[0]) : set() for eps in posets[next(iter(posets))]} }
-    numDomMatch = { tsfile : {str(eps[0]) : 0 for eps in poset_list} for tsfile,poset_list in posets.items()}
-    numFCMatch = { tsfile : {str(eps[0]) : 0 for eps in poset_list} for tsfile,poset_list in posets.items()}
-    numFC = 0
-    paramgraph = DSGRN.ParameterGraph(network)
-    for paramind in range(paramgraph.size()):
-        FC = False
-        domaingraph = DSGRN.DomainGraph(paramgraph.parameter(paramind))
-        for tsfile, poset_list in posets.items():
-            for (eps, (events, event_ordering)) in poset_list:
-                patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
-                if stablefc:
-                    stabmatch, newFC = stableFC_check(domaingraph,patterngraph)
-                    if newFC and not FC:
-                        numFC +=1
-                        FC = True
-                    if stabmatch:
-                        numFCMatch[tsfile][str(eps)]+=1
-                        if len(posets) > 1:
-                            totalFC["all"][str(eps)].add(paramind)
-                    if stabmatch and domain:
-                        numDomMatch[tsfile][str(eps)] += 1
-                        if len(posets) > 1:
-                            totalDom["all"][str(eps)].add(paramind)
-                    elif not stabmatch and domain:
-                        dommatch = domain_check(domaingraph, patterngraph)
-                        if dommatch:
-                            numDomMatch[tsfile][str(eps)] += 1
-                            if len(posets) > 1:
-                                totalDom["all"][str(eps)].add(paramind)
-                if domain and not stablefc:
-                    dommatch = domain_check(domaingraph,patterngraph)
-                    if dommatch:
-                        numDomMatch[tsfile][str(eps)]+=1
-                        if len(posets) > 1:
-                            totalDom["all"][str(eps)].add(paramind)
-    dommatches = {tsfile : [(float(eps),count,paramgraph.size()) for eps,count in edict.items()] for tsfile,edict in numDomMatch.items()}
-    fcmatches = {tsfile : [(float(eps),count,numFC,paramgraph.size()) for eps,count in edict.items()] for tsfile,edict in numFCMatch.items()}
-    if len(posets)>1:
-        dommatches.update({"all": [(float(eps),len(totalDom["all"][eps]),paramgraph.size()) for eps in totalDom["all"]]})
-        fcmatches.update({"all" : [(float(eps),len(totalFC["all"][eps]),numFC,paramgraph.size()) for eps in totalFC["all"]]})
-    return dommatches,fcmatches
-
-
-def PathMatches_without_count(network, posets, domain, stablefc):
+    chunk_result = init_chunk_result(posets, True, paramgraph.size())
+    for paramind in range(start, stop):
+        analysis = ParameterAnalysis(paramgraph.parameter(paramind), morsecache, paramind)
+        count_parameter(chunk_result, analysis, get_patterngraphs(network, posets), domain, stablefc, paramind)
+    return chunk_result
+
+
+def PathMatches_without_count(network, paramgraph, posets, domain, stablefc, start, stop, morsecache=None):
     '''
-    Test for the existence of at least one pattern match in the domain graph and/or stable full cycles.
+    Test for the existence of at least one pattern match in the domain graph and/or stable full cycles for a chunk of
+    DSGRN parameters.
     :param network: DSGRN network object.
+    :param paramgraph: DSGRN parameter graph object of the network.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
     :param domain: True or False, search over whole domain graph.
     :param stablefc: True or False search over stable full cycles only.
+    :param start: first DSGRN parameter index in the chunk
+    :param stop: one past the last DSGRN parameter index in the chunk
+    :param morsecache: optional MorseGraphCache object of the network
+    :return: dictionary of results
+    '''
+    chunk_result = init_chunk_result(posets, False, paramgraph.size())
+    for paramind in range(start, stop):
+        analysis = ParameterAnalysis(paramgraph.parameter(paramind), morsecache, paramind)
+        # shortcut when every requested search has a match at every epsilon
+        if check_parameter(chunk_result, analysis, get_patterngraphs(network, posets), domain, stablefc):
+            break
+    return chunk_result
+
+
+def init_chunk_result(posets, count, size):
+    '''
+    Empty results for a chunk of DSGRN parameters, filled in by count_parameter or check_parameter.
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param count: True or False, the results are counts (True) or existence (False)
+    :param size: size of the DSGRN parameter graph
     :return: dictionary of results
     '''
+    if not count:
+        return {"domain" : { tsfile : {str(eps[0]) : False for eps in poset_list} for tsfile,poset_list in posets.items()},
+                "stablefc" : { tsfile : {str(eps[0]) : False for eps in poset_list} for tsfile,poset_list in posets.items()},
+                "size" : size}
+    total = {}
+    if len(posets) > 1:
+        total= {"domain": {str(eps[0]) : set() for eps in posets[next(iter(posets))]},
+                "stablefc": {str(eps[0]) : set() for eps in posets[next(iter(posets))]} }
+    return {"domain" : { tsfile : {str(eps[0]) : 0 for eps in poset_list} for tsfile,poset_list in posets.items()},
+            "stablefc" : { tsfile : {str(eps[0]) : 0 for eps in poset_list} for tsfile,poset_list in posets.items()},
+            "numFC" : 0, "all" : total, "size" : size}
 
-    def format(numDomMatch,numFCMatch):
-        dommatches = {tsfile: [(float(eps), b, paramgraph.size()) for eps, b in edict.items()] for tsfile, edict in
-             numDomMatch.items()}
-        fcmatches = {tsfile: [(float(eps), b, paramgraph.size()) for eps, b in edict.items()] for tsfile, edict
-             in numFCMatch.items()}
-        return dommatches, fcmatches
-
-
-    numDomMatch = { tsfile : {str(eps[0]) : False for eps in poset_list} for tsfile,poset_list in posets.items()}
-    numFCMatch = { tsfile : {str(eps[0]) : False for eps in poset_list} for tsfile,poset_list in posets.items()}
-    paramgraph = DSGRN.ParameterGraph(network)
-    for paramind in range(paramgraph.size()):
-        domaingraph = DSGRN.DomainGraph(paramgraph.parameter(paramind))
-        for tsfile, poset_list in posets.items():
-            for (eps, (events, event_ordering)) in poset_list:
-                patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
-                if domain and not numDomMatch[tsfile][str(eps)]:
-                    dommatch = domain_check(domaingraph,patterngraph)
+
+def count_parameter(chunk_result, analysis, patterngraphs, domain, stablefc, paramind):
+    '''
+    Add the pattern matches of one DSGRN parameter to the counts of a chunk.
+    :param chunk_result: dictionary of results from init_chunk_result with count True, updated in place
+    :param analysis: ParameterAnalysis object of the DSGRN parameter
+    :param patterngraphs: output of get_patterngraphs for the network and posets
+    :param domain: True or False, search over whole domain graph.
+    :param stablefc: True or False search over stable full cycles only.
+    :param paramind: DSGRN parameter index
+    :return: None
+    '''
+    numDomMatch = chunk_result["domain"]
+    numFCMatch = chunk_result["stablefc"]
+    total = chunk_result["all"]
+    FC = False
+    for tsfile, patterngraph_list in patterngraphs.items():
+        for (eps, patterngraph) in patterngraph_list:
+            if stablefc:
+                stabmatch, newFC = stableFC_check(analysis,patterngraph)
+                if newFC and not FC:
+                    chunk_result["numFC"] +=1
+                    FC = True
+                if stabmatch:
+                    numFCMatch[tsfile][str(eps)]+=1
+                    if total:
+                        total["stablefc"][str(eps)].add(paramind)
+                if stabmatch and domain:
+                    numDomMatch[tsfile][str(eps)] += 1
+                    if total:
+                        total["domain"][str(eps)].add(paramind)
+                elif not stabmatch and domain:
+                    dommatch = domain_check(analysis, patterngraph)
                     if dommatch:
-                        numDomMatch[tsfile][str(eps)] = True
-                if stablefc and not numFCMatch[tsfile][str(eps)]:
-                    stabmatch, newFC = stableFC_check(domaingraph,patterngraph)
-                    if stabmatch:
-                        numFCMatch[tsfile][str(eps)] = True
-        b = True
-        for tsfile,poset_list in posets.items():
-            b = bool(b*all([numDomMatch[tsfile][str(eps[0])] for eps in poset_list]))
-            b = bool(b*all([numFCMatch[tsfile][str(eps[0])] for eps in poset_list]))
-        if b:
-            return format(numDomMatch,numFCMatch)
-    return format(numDomMatch,numFCMatch)
-
-
-def domain_check(domaingraph,patterngraph):
+                        numDomMatch[tsfile][str(eps)] += 1
+                        if total:
+                            total["domain"][str(eps)].add(paramind)
+            if domain and not stablefc:
+                dommatch = domain_check(analysis,patterngraph)
+                if dommatch:
+                    numDomMatch[tsfile][str(eps)]+=1
+                    if total:
+                        total["domain"][str(eps)].add(paramind)
+
+
+def check_parameter(chunk_result, analysis, patterngraphs, domain, stablefc):
+    '''
+    Record the pattern matches of one DSGRN parameter that have not been found earlier in a chunk.
+    :param chunk_result: dictionary of results from init_chunk_result with count False, updated in place
+    :param analysis: ParameterAnalysis object of the DSGRN parameter
+    :param patterngraphs: output of get_patterngraphs for the network and posets
+    :param domain: True or False, search over whole domain graph.
+    :param stablefc: True or False search over stable full cycles only.
+    :return: True if every requested search has a match at every epsilon, else False
     '''
-    Check for match in domain graph for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False
+    numDomMatch = chunk_result["domain"]
+    numFCMatch = chunk_result["stablefc"]
+    for tsfile, patterngraph_list in patterngraphs.items():
+        for (eps, patterngraph) in patterngraph_list:
+            if domain and not numDomMatch[tsfile][str(eps)]:
+                dommatch = domain_check(analysis,patterngraph)
+                if dommatch:
+                    numDomMatch[tsfile][str(eps)] = True
+            if stablefc and not numFCMatch[tsfile][str(eps)]:
+                stabmatch, newFC = stableFC_check(analysis,patterngraph)
+                if stabmatch:
+                    numFCMatch[tsfile][str(eps)] = True
+    return all_matched(chunk_result, domain, stablefc)
+
+
+def all_matched(chunk_result, domain, stablefc):
     '''
-    ismatch = False
-    searchgraph = DSGRN.SearchGraph(domaingraph)
-    matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-    if DSGRN.PathMatch(matchinggraph):
-        ismatch = True
-    return ismatch
+    Test whether the existence results of a chunk or of a whole network can no longer change.
+    :param chunk_result: dictionary of results from init_chunk_result with count False
+    :param domain: True or False, search over whole domain graph.
+    :param stablefc: True or False search over stable full cycles only.
+    :return: True if every requested search has a match at every epsilon, else False
+    '''
+    b = True
+    for tsfile in chunk_result["domain"]:
+        if domain:
+            b = b and all(chunk_result["domain"][tsfile].values())
+        if stablefc:
+            b = b and all(chunk_result["stablefc"][tsfile].values())
+    return b
 
 
 # def stableFC_check_buggy(domaingraph,patterngraph,paramind):
@@ -314,39 +492,21 @@ def domain_check(domaingraph,patterngraph):
 #     return ismatch,FC
 
 
-def stableFC_check(domaingraph,patterngraph):
-    '''
-    Check for match in any stable full cycle for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False for the existence of a match and True or False for the existence of a stable full cycle
-    '''
-    FC = False
-    ismatch = False
-    morsegraph = DSGRN.MorseGraph(domaingraph)
-    for i in range(0, morsegraph.poset().size()):
-        if morsegraph.annotation(i)[0] == "FC" and len(morsegraph.poset().children(i)) == 0:
-            FC = True
-            searchgraph = DSGRN.SearchGraph(domaingraph, i)
-            matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-            if DSGRN.PathMatch(matchinggraph):
-                ismatch = True
-                break
-    return ismatch,FC
-
-
 
 if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
     if len(sys.argv) < 3:
         print(
         "Calling signature has two required arguments \n " \
-        "mpiexec -n <num_processes> python CountPatternMatch.py <path_to_network_file> <path_to_parameter_file>"
+        "mpiexec -n <num_processes> python CountPatternMatch.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
     network_file = sys.argv[1]
     params_file = sys.argv[2]
     if len(sys.argv)>3:
         resultsdir = sys.argv[3]
-        query(network_file, params_file, resultsdir)
+        query(network_file, params_file, resultsdir, resume=resume)
     else:
-        query(network_file,params_file)
+        query(network_file,params_file, resume=resume)
@@ -1,14 +1,16 @@
 import DSGRN
-import json, os, sys, ast
+import json, os, sys, tempfile
 from functools import partial
-from dsgrn_net_query.utilities.poset_utilities import calculate_posets_from_multiple_time_series,check_posets
-from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder
+from dsgrn_net_query.utilities.file_utilities import read_networks, count_networks, create_results_folder, open_checkpoint, append_checkpoint, check_resume, network_names, distinct_networks, report_duplicates
+from dsgrn_net_query.utilities.schedule_utilities import imap_unordered
+from dsgrn_net_query.utilities.pattern_utilities import get_patterngraphs, patterngraph_cache_report, ParameterAnalysis, domain_check, stableFC_check
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache
 from dsgrn_net_query.utilities.signatures_no_mpi import make_db
-from mpi4py import MPI
-from mpi4py.futures import MPICommExecutor
+from dsgrn_net_query.utilities.executor_utilities import open_executor, get_backend
+from dsgrn_net_query.queries.CountPatternMatch import stream_posets, matching_networks, record_results
 
 
-def query(network_file,params_file,resultsdir=""):
+def query(network_file,params_file,resultsdir="",resume=False):
     '''
     For each epsilon in a list of epsilons, a partially ordered set (poset) of maxima and minima of time series data
     is created or accessed from the params dictionary.
@@ -17,13 +19,25 @@ def query(network_file,params_file,resultsdir=""):
     and False if not, depending on the choice of the parameter "count".
 
     :param network_file: a .txt file containing either a single DSGRN network specification or a list of network
-    specification strings in DSGRN format
+    specification strings in DSGRN format, or a .jsonl file with one network specification per line, which is read
+    lazily
     :param params_file: A .json file containing a dictionary with the keys
         "domain" : True or False (true or false in .json format), whether or not to perform a path search anywhere in the domain graph
         "stablefc" : True or False (true or false in .json format), whether or not to perform a path search within stable full cycles
         Both "domain" and "stablefc" are allowed to be True.
         "count" : True or False (true or false in .json format), whether to count all DSGRN parameters or shortcut at first success
         "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+        "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                    forked processes on one machine or not at all, default = "mpi"; the results are the same
+        "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
+        "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN parameter
+                    across runs, default = no cache
+        "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
+        "window" : optional maximum number of networks submitted to the workers at one time, default = 1000
+        "db_num_proc" : optional number of processes each worker uses to build the DSGRN database of its network
+                    when "count" is True and "domain" is False, default = 1. These processes are forked, which is unsafe
+                    under MPI, so values above 1 require the "process" or "serial" backend. With the "process" backend,
+                    num_proc * db_num_proc processes run at once, so set "num_proc" to the number of cores / db_num_proc.
 
         One can either specify posets directly, or extract posets from timeseries data.
         Include EITHER the three keys
@@ -34,6 +48,8 @@ def query(network_file,params_file,resultsdir=""):
                     Note that an epsilon of 0.10 means that the noise level is considered to be +/- 10% of the distance
                     between global maximum and global minimum for each time series. Thus all information on curve shape
                     is lost at epsilon = 0.5. It is recommended to stay below that level.
+        "poset_cache" : optional True or False, whether to save the posets next to each time series file and reuse them
+                    in later runs with the same file contents, names, epsilons and format, default = False
         OR the single key
         "posets" : a (quoted) dictionary of Python tuples of node names keying a list of tuples of epsilon with a DSGRN
         formatted poset:
@@ -42,6 +58,8 @@ def query(network_file,params_file,resultsdir=""):
         This key takes specialized information and is not likely to be specified in general usage.
 
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint file of
+                    the results folder with the same datetime, default is False
 
     :return: Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
         The results are DSGRN parameter count with successful matches, or True (existence of at least one match)
@@ -60,24 +78,40 @@ def query(network_file,params_file,resultsdir=""):
         parameters with a match to at least one time series dataset.
     '''
 
-    networks = read_networks(network_file)
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
     params = json.load(open(params_file))
 
     sanity_check(params)
-
-    posets,networks = get_posets(networks,params)
-
-    if not networks:
-        print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
-        return None
-    else:
-        work_function = partial(search_over_networks, params, posets,len(networks))
-        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
-            if executor is not None:
-                print("Querying networks.")
-                output=list(executor.map(work_function, enumerate(networks)))
-                results = dict(output)
-                record_results(network_file, params_file,results,resultsdir,params)
+    check_resume(params, resume)
+
+    with open_executor(params) as executor:
+        if executor is not None:
+            # the posets are computed on the worker processes
+            posets,names = stream_posets(networks,params,executor)
+            num_networks, num_distinct = count_networks(matching_networks(networks,names))
+            if not num_networks:
+                print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
+                return None
+            else:
+                datetime = params["datetime"] if "datetime" in params else None
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+                # results stream to the checkpoint file as networks finish; only the keys are held in memory
+                recorded, checkpoint = open_checkpoint(resultsdir, resume, keys_only=True)
+                report_duplicates(num_networks, num_distinct)
+                if recorded:
+                    print("Resuming: {} of {} networks already recorded.".format(len(recorded), num_distinct))
+                # distinct networks are read lazily and submitted as earlier ones finish
+                duplicates = {}
+                todo = ((k, netspec) for k, netspec in enumerate(distinct_networks(matching_networks(networks,names), duplicates)) if netspec not in recorded)
+                work_function = partial(search_over_networks, params, posets, num_distinct)
+                print("Querying {} networks.".format(num_distinct - len(recorded)))
+                sys.stdout.flush()
+                window = params["window"] if "window" in params else 1000
+                for netspec, ER in imap_unordered(executor, work_function, todo, window):
+                    append_checkpoint(checkpoint, netspec, ER)
+                checkpoint.close()
+                record_results(resultsdir,params,duplicates)
 
 
 def sanity_check(params):
@@ -94,22 +128,8 @@ def sanity_check(params):
         raise ValueError("Either 'posets' or the three keys 'timeseriesfname', 'tsfile_is_row_format' and 'epsilons' must be specified in the parameter file.")
     if any(["domain" not in params, "stablefc" not in params, "count" not in params]):
         raise ValueError("All of the three keys 'domain', 'stablefc' and 'count' must be specified in the parameter file.")
-
-
-def get_posets(networks,params):
-    if "posets" not in params:
-        posets,networks = calculate_posets_from_multiple_time_series(params,networks)
-    else:
-        lit_posets = ast.literal_eval(params["posets"])
-        posets = {}
-        for names,pos in lit_posets.items():
-            # make sure variables are in canonical order
-            sort_names = tuple(sorted(list(names)))
-            params["timeseriesfname"] = "no_time_series_file"
-            posets[sort_names] = {"no_time_series_file" : pos}
-            networks = check_posets(networks,posets)
-    return posets,networks
-
+    if "db_num_proc" in params and params["db_num_proc"] > 1 and get_backend(params) == "mpi":
+        raise ValueError("The key 'db_num_proc' forks processes, which is unsafe under MPI. Use the 'process' or 'serial' backend with it.")
 
 
 def search_over_networks(params,posets,N,enum_netspec):
@@ -126,87 +146,56 @@ def search_over_networks(params,posets,N,enum_netspec):
     domain = params["domain"]
     stablefc = params["stablefc"]
     network = DSGRN.Network(netspec)
-    names = tuple(sorted([network.name(k) for k in range(network.size())]))
+    names = network_names(netspec)
     newposets = posets[names]
     ER = {}
+    morsecache = open_morse_cache(params, network)
     if params["count"] and not domain:
-        dmatches, fcmatches = PathMatches_with_count_stablefc_only(network,newposets,k+1)
+        db_num_proc = params["db_num_proc"] if "db_num_proc" in params else 1
+        dmatches, fcmatches = PathMatches_with_count_stablefc_only(network,newposets,morsecache,db_num_proc)
     elif params["count"]:
-        dmatches, fcmatches = PathMatches_with_count(network,newposets,domain,stablefc)
+        dmatches, fcmatches = PathMatches_with_count(network,newposets,domain,stablefc,morsecache)
     else:
-        dmatches, fcmatches = PathMatches_without_count(network,newposets,domain,stablefc)
+        dmatches, fcmatches = PathMatches_without_count(network,newposets,domain,stablefc,morsecache)
+    morsecache.close()
     if domain:
         ER["domain"]= dmatches
     if stablefc:
         ER["stablefc"]= fcmatches
     print("Network {} of {} complete.".format(k+1,N))
+    print(patterngraph_cache_report())
+    if morsecache.path is not None:
+        print(morsecache.report())
     sys.stdout.flush()
     return (netspec, ER)
 
 
-def record_results(network_file, params_file,results,resultsdir,params):
-    '''
-    Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
-    :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
-    :param params: The dictionary of parameters generated from the .json parameter file.
-    :return: None. File is written.
-    '''
-    if "datetime" in params:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir,params["datetime"])
-    else:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir)
-
-    def savefile(rname,rdict):
-        if os.path.exists(rname):
-            os.rename(rname, rname + ".old")
-        json.dump(rdict, open(rname, 'w'))
-
-    reparse = {}
-    for netspec,ER in results.items():
-        for search,tsdict in ER.items():
-            if params[search]:
-                for ts, rlist in tsdict.items():
-                    key = (search,ts)
-                    if key in reparse:
-                        reparse[key].append((netspec,rlist))
-                    else:
-                        reparse[key] = [(netspec,rlist)]
-    for key,list_of_tup in reparse.items():
-        ts = key[1].split("/")[-1].split(".")[0]
-        rname = os.path.join(resultsdir, "query_results_{}_{}.json".format(key[0], ts))
-        savefile(rname,dict(list_of_tup))
-    print(resultsdir)
-
-
-def PathMatches_with_count_stablefc_only(network, posets, N):
+def PathMatches_with_count_stablefc_only(network, posets, morsecache=None, db_num_proc=1):
     '''
     Count the number of pattern matches in the domain graph and/or stable full cycles.
     :param network: DSGRN network object.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
-    :param N: network identifying integer
+    :param morsecache: optional MorseGraphCache object of the network
+    :param db_num_proc: number of processes used to build the DSGRN database
     :return: dictionary of results
     '''
     if len(posets) > 1:
         totalFC = {"all": {str(eps[0]) : set() for eps in posets[next(iter(posets))]} }
     numFCMatch = { tsfile : {str(eps[0]) : 0 for eps in poset_list} for tsfile,poset_list in posets.items()}
     paramgraph = DSGRN.ParameterGraph(network)
-    # make DSGRN database to pull out stable FC parameters
-    specfile = "temp{}.txt".format(N)
-    dbfile = "temp{}.db".format(N)
-    open(specfile,"w").write(network.specification())
-    make_db(specfile,dbfile)
-    params = DSGRN.StableFCQuery(DSGRN.Database(dbfile)).matches()
-    os.remove(specfile)
-    os.remove(dbfile)
+    # make DSGRN database to pull out stable FC parameters, in a private temporary directory
+    with tempfile.TemporaryDirectory() as tmpdir:
+        specfile = os.path.join(tmpdir, "network.txt")
+        dbfile = os.path.join(tmpdir, "network.db")
+        open(specfile,"w").write(network.specification())
+        make_db(specfile,dbfile,db_num_proc)
+        params = DSGRN.StableFCQuery(DSGRN.Database(dbfile)).matches()
     for paramind in params:
-        domaingraph = DSGRN.DomainGraph(paramgraph.parameter(paramind))
-        for tsfile, poset_list in posets.items():
-            for (eps, (events, event_ordering)) in poset_list:
-                patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
-                stabmatch, _ = stableFC_check(domaingraph,patterngraph)
+        analysis = ParameterAnalysis(paramgraph.parameter(paramind), morsecache, paramind)
+        patterngraphs = get_patterngraphs(network, posets)
+        for tsfile, patterngraph_list in patterngraphs.items():
+            for (eps, patterngraph) in patterngraph_list:
+                stabmatch, _ = stableFC_check(analysis,patterngraph)
                 if stabmatch:
                     numFCMatch[tsfile][str(eps)]+=1
                     if len(posets) > 1:
@@ -217,13 +206,14 @@ def PathMatches_with_count_stablefc_only(network, posets, N):
     return {},fcmatches
 
 
-def PathMatches_with_count(network, posets, domain, stablefc):
+def PathMatches_with_count(network, posets, domain, stablefc, morsecache=None):
     '''
     Count the number of pattern matches in the domain graph and/or stable full cycles.
     :param network: DSGRN network object.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
     :param domain: True or False, search over whole domain graph.
     :param stablefc: True or False search over stable full cycles only.
+    :param morsecache: optional MorseGraphCache object of the network
     :return: dictionary of results
     '''
     if len(posets) > 1:
@@ -235,12 +225,12 @@ def PathMatches_with_count(network, posets, domain, stablefc):
     paramgraph = DSGRN.ParameterGraph(network)
     for paramind in range(paramgraph.size()):
         FC = False
-        domaingraph = DSGRN.DomainGraph(paramgraph.parameter(paramind))
-        for tsfile, poset_list in posets.items():
-            for (eps, (events, event_ordering)) in poset_list:
-                patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
+        analysis = ParameterAnalysis(paramgraph.parameter(paramind), morsecache, paramind)
+        patterngraphs = get_patterngraphs(network, posets)
+        for tsfile, patterngraph_list in patterngraphs.items():
+            for (eps, patterngraph) in patterngraph_list:
                 if stablefc:
-                    stabmatch, newFC = stableFC_check(domaingraph,patterngraph)
+                    stabmatch, newFC = stableFC_check(analysis,patterngraph)
                     if newFC and not FC:
                         numFC +=1
                         FC = True
@@ -253,13 +243,13 @@ def PathMatches_with_count(network, posets, domain, stablefc):
                         if len(posets) > 1:
                             totalDom["all"][str(eps)].add(paramind)
                     elif not stabmatch and domain:
-                        dommatch = domain_check(domaingraph, patterngraph)
+                        dommatch = domain_check(analysis, patterngraph)
                         if dommatch:
                             numDomMatch[tsfile][str(eps)] += 1
                             if len(posets) > 1:
                                 totalDom["all"][str(eps)].add(paramind)
                 if domain and not stablefc:
-                    dommatch = domain_check(domaingraph,patterngraph)
+                    dommatch = domain_check(analysis,patterngraph)
                     if dommatch:
                         numDomMatch[tsfile][str(eps)]+=1
                         if len(posets) > 1:
@@ -272,13 +262,14 @@ def PathMatches_with_count(network, posets, domain, stablefc):
     return dommatches,fcmatches
 
 
-def PathMatches_without_count(network, posets, domain, stablefc):
+def PathMatches_without_count(network, posets, domain, stablefc, morsecache=None):
     '''
     Test for the existence of at least one pattern match in the domain graph and/or stable full cycles.
     :param network: DSGRN network object.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
     :param domain: True or False, search over whole domain graph.
     :param stablefc: True or False search over stable full cycles only.
+    :param morsecache: optional MorseGraphCache object of the network
     :return: dictionary of results
     '''
 
@@ -294,16 +285,16 @@ def PathMatches_without_count(network, posets, domain, stablefc):
     numFCMatch = { tsfile : {str(eps[0]) : False for eps in poset_list} for tsfile,poset_list in posets.items()}
     paramgraph = DSGRN.ParameterGraph(network)
     for paramind in range(paramgraph.size()):
-        domaingraph = DSGRN.DomainGraph(paramgraph.parameter(paramind))
-        for tsfile, poset_list in posets.items():
-            for (eps, (events, event_ordering)) in poset_list:
-                patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
+        analysis = ParameterAnalysis(paramgraph.parameter(paramind), morsecache, paramind)
+        patterngraphs = get_patterngraphs(network, posets)
+        for tsfile, patterngraph_list in patterngraphs.items():
+            for (eps, patterngraph) in patterngraph_list:
                 if domain and not numDomMatch[tsfile][str(eps)]:
-                    dommatch = domain_check(domaingraph,patterngraph)
+                    dommatch = domain_check(analysis,patterngraph)
                     if dommatch:
                         numDomMatch[tsfile][str(eps)] = True
                 if stablefc and not numFCMatch[tsfile][str(eps)]:
-                    stabmatch, newFC = stableFC_check(domaingraph,patterngraph)
+                    stabmatch, newFC = stableFC_check(analysis,patterngraph)
                     if stabmatch:
                         numFCMatch[tsfile][str(eps)] = True
         b = True
@@ -315,21 +306,6 @@ def PathMatches_without_count(network, posets, domain, stablefc):
     return format(numDomMatch,numFCMatch)
 
 
-def domain_check(domaingraph,patterngraph):
-    '''
-    Check for match in domain graph for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False
-    '''
-    ismatch = False
-    searchgraph = DSGRN.SearchGraph(domaingraph)
-    matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-    if DSGRN.PathMatch(matchinggraph):
-        ismatch = True
-    return ismatch
-
-
 # def stableFC_check_buggy(domaingraph,patterngraph,paramind):
 #     # Note: morsegraph.poset().stringify != morsedecomposition.poset().stringify in all cases.
 #     '''
@@ -353,39 +329,21 @@ def domain_check(domaingraph,patterngraph):
 #     return ismatch,FC
 
 
-def stableFC_check(domaingraph,patterngraph):
-    '''
-    Check for match in any stable full cycle for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False for the existence of a match and True or False for the existence of a stable full cycle
-    '''
-    FC = False
-    ismatch = False
-    morsegraph = DSGRN.MorseGraph(domaingraph)
-    for i in range(0, morsegraph.poset().size()):
-        if morsegraph.annotation(i)[0] == "FC" and len(morsegraph.poset().children(i)) == 0:
-            FC = True
-            searchgraph = DSGRN.SearchGraph(domaingraph, i)
-            matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-            if DSGRN.PathMatch(matchinggraph):
-                ismatch = True
-                break
-    return ismatch,FC
-
-
 
 if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
     if len(sys.argv) < 3:
         print(
         "Calling signature has two required arguments \n " \
-        "mpiexec -n <num_processes> python CountPatternMatch.py <path_to_network_file> <path_to_parameter_file>"
+        "mpiexec -n <num_processes> python CountPatternMatch_DB.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
     network_file = sys.argv[1]
     params_file = sys.argv[2]
     if len(sys.argv)>3:
         resultsdir = sys.argv[3]
-        query(network_file, params_file, resultsdir)
+        query(network_file, params_file, resultsdir, resume=resume)
     else:
-        query(network_file,params_file)
+        query(network_file,params_file, resume=resume)
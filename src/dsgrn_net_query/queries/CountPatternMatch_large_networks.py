@@ -1,12 +1,16 @@
 import DSGRN
-import json, os, sys, ast
+import json, os, sys, ast, base64, zlib
+import numpy as np
 from functools import partial
 from dsgrn_net_query.utilities.poset_utilities import calculate_posets_from_multiple_time_series,check_posets
-from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder
-from mpi4py.futures import MPICommExecutor
+from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder, open_checkpoint, append_checkpoint, check_resume, network_names
+from dsgrn_net_query.utilities.schedule_utilities import get_parameter_graph, imap_unordered
+from dsgrn_net_query.utilities.pattern_utilities import get_patterngraphs, ParameterAnalysis, domain_check, stableFC_check
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache
+from dsgrn_net_query.utilities.executor_utilities import open_executor
 
 
-def query(network_file,params_file,resultsdir=""):
+def query(network_file,params_file,resultsdir="",resume=False):
     '''
     For each epsilon in a list of epsilons, a partially ordered set (poset) of maxima and minima of time series data
     is created or accessed from the params dictionary.
@@ -21,9 +25,18 @@ def query(network_file,params_file,resultsdir=""):
         "stablefc" : True or False (true or false in .json format), whether or not to perform a path search within stable full cycles
         Both "domain" and "stablefc" are allowed to be True.
         "count" : True or False (true or false in .json format), whether to count all DSGRN parameters or shortcut at first success
-            NOTE: Only count = True is currently implemented
+            When count = False, chunks of DSGRN parameters are searched in parallel and no more chunks are submitted
+            as soon as every (time series, epsilon, search type) combination has a match; queued chunks are cancelled.
         "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+        "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                    forked processes on one machine or not at all, default = "mpi"; the results are the same
+        "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
         "parameter_list" : optional sublist of the parameter graph
+        "chunk_size" : optional number of DSGRN parameters in one unit of work, default = 1000
+        "window" : optional maximum number of chunks submitted ahead of their results, default = 1000
+        "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN parameter
+                    across runs, default = no cache
+        "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
 
         One can either specify posets directly, or extract posets from timeseries data.
         Include EITHER the three keys
@@ -34,6 +47,8 @@ def query(network_file,params_file,resultsdir=""):
                     Note that an epsilon of 0.10 means that the noise level is considered to be +/- 10% of the distance
                     between global maximum and global minimum for each time series. Thus all information on curve shape
                     is lost at epsilon = 0.5. It is recommended to stay below that level.
+        "poset_cache" : optional True or False, whether to save the posets next to each time series file and reuse them
+                    in later runs with the same file contents, names, epsilons and format, default = False
         OR the single key
         "posets" : a (quoted) dictionary of Python tuples of node names keying a list of tuples of epsilon with a DSGRN
         formatted poset:
@@ -42,6 +57,8 @@ def query(network_file,params_file,resultsdir=""):
         This key takes specialized information and is not likely to be specified in general usage.
 
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the parameter chunks already recorded in the checkpoint
+                    file of the results folder with the same datetime, default is False
 
     :return: Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
         The results are DSGRN parameter count with successful matches, or True (existence of at least one match)
@@ -65,34 +82,180 @@ def query(network_file,params_file,resultsdir=""):
     param_dict = json.load(open(params_file))
 
     sanity_check(param_dict)
+    check_resume(param_dict, resume)
 
-    posets,networks = get_posets(spec,param_dict)
-    print("Querying networks.\n")
-
-    if not networks:
-        print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
-        return None
-    else:
-        results = {}
-        if param_dict["count"]:
-            with MPICommExecutor() as executor:
+    with open_executor(param_dict) as executor:
+        if executor is not None:
+            # the posets are computed on the worker processes
+            posets,networks = get_posets(spec,param_dict,executor)
+            print("Querying networks.\n")
+            if not networks:
+                print("No networks available for analysis. Make sure network file is in the correct format\nand make sure that every network node name is the time series data or 'poset' value.")
+                return None
+            else:
+                results = {}
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, param_dict["datetime"] if "datetime" in param_dict else None)
+                records, checkpoint = open_checkpoint(resultsdir, resume)
                 spec = spec[0]
-                results[spec] = {}
                 network = DSGRN.Network(spec)
                 param_graph = DSGRN.ParameterGraph(network)
-                if "parameter_list" in param_dict:
-                    dsgrn_params = [(p,param_graph.parameter(p)) for p in param_dict["parameter_list"]]
+                names = network_names(spec)
+                if param_dict["count"]:
+                    results[spec] = count_search(executor, spec, posets[names], param_dict, param_graph.size(), records, checkpoint)
                 else:
-                    dsgrn_params = [(p,param_graph.parameter(p)) for p in range(param_graph.size())]
-                names = tuple(sorted([network.name(k) for k in range(network.size())]))
-                work_function = partial(PathMatch, network, posets[names], param_dict["domain"], param_dict["stablefc"])
-                output=dict(executor.map(work_function, dsgrn_params))
-                results[spec] = reformat_output(output, list(posets[names].keys()), param_dict, param_graph.size())
-                print("Network {} of {} complete.".format(1, 1))
-                sys.stdout.flush()
-                record_results(network_file, params_file, results, resultsdir, param_dict)
-        else:
-            raise ValueError("Existence of path match without counting is not yet implemented for large networks. Use CountPatternMatch.py.")
+                    results[spec] = existence_search(executor, spec, posets[names], param_dict, param_graph.size(), records, checkpoint)
+                checkpoint.close()
+                record_results(results, resultsdir, param_dict)
+
+
+def get_chunks(param_dict, pgsize, records):
+    '''
+    Split the DSGRN parameters that are not yet recorded in the checkpoint into chunks. Without a "parameter_list" the
+    chunks are range objects, so only their bounds are sent to the workers, which materialize the parameters themselves.
+    :param param_dict: dictionary of parameters generated from the .json parameter file
+    :param pgsize: size of the DSGRN parameter graph
+    :param records: dictionary of checkpoint records, each with the key "parameters"
+    :return: list of ranges or lists of DSGRN parameter indices
+    '''
+    # duplicate parameters would be counted twice
+    paramlist = list(dict.fromkeys(param_dict["parameter_list"])) if "parameter_list" in param_dict else range(pgsize)
+    done = set(p for record in records.values() for p in decode_chunk(record["parameters"]))
+    if done:
+        print("Resuming: {} of {} parameters already recorded.".format(len(done), len(paramlist)))
+        paramlist = [p for p in paramlist if p not in done]
+    chunk_size = param_dict["chunk_size"] if "chunk_size" in param_dict else 1000
+    return [paramlist[i:i + chunk_size] for i in range(0, len(paramlist), chunk_size)]
+
+
+def encode_chunk(chunk):
+    '''
+    :param chunk: range or list of DSGRN parameter indices
+    :return: JSON serializable form of the chunk, {"start" : start, "stop" : stop} for a range
+    '''
+    return {"start" : chunk.start, "stop" : chunk.stop} if isinstance(chunk, range) else list(chunk)
+
+
+def decode_chunk(chunk):
+    '''
+    :param chunk: output of encode_chunk
+    :return: range or list of DSGRN parameter indices
+    '''
+    return range(chunk["start"], chunk["stop"]) if isinstance(chunk, dict) else chunk
+
+
+def encode_bitmaps(bitmaps):
+    '''
+    :param bitmaps: list of compressed bitmaps, output of PathMatch_chunk
+    :return: list of base64 strings
+    '''
+    return [base64.b64encode(bitmap).decode() for bitmap in bitmaps]
+
+
+def decode_bitmaps(bitmaps):
+    '''
+    :param bitmaps: output of encode_bitmaps
+    :return: list of compressed bitmaps
+    '''
+    return [base64.b64decode(bitmap) for bitmap in bitmaps]
+
+
+def decode_eps_keys(results):
+    '''
+    JSON stores the epsilon keys of checkpointed results as strings; convert them back to floats.
+    :param results: dictionary whose dictionary values have the form {tsfile : {eps : value}}
+    :return: dictionary with float epsilon keys
+    '''
+    return {key : {tsfile : {float(eps) : b for eps, b in edict.items()} for tsfile, edict in val.items()}
+            if isinstance(val, dict) else val for key, val in results.items()}
+
+
+def count_search(executor, spec, posets, param_dict, pgsize, records, checkpoint):
+    '''
+    Count pattern matches over chunks of DSGRN parameters in parallel, recording every chunk in the checkpoint file as
+    it finishes. The workers reduce their chunk to match counts per cell (see cell_layout) and, when there are several
+    time series, to one compressed bitmap per (search, eps) of the DSGRN parameters with a match to at least one time
+    series. Here the counts are summed and the bitmaps are merged into bitmaps over the parameter graph.
+    :param executor: executor object on the root process, see executor_utilities.open_executor
+    :param spec: DSGRN network specification
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param param_dict: dictionary of parameters generated from the .json parameter file
+    :param pgsize: size of the DSGRN parameter graph
+    :param records: dictionary of checkpoint records from a previous run
+    :param checkpoint: checkpoint file object
+    :return: dictionary of results keyed by search type, then time series file name
+    '''
+    cells = cell_layout(posets, param_dict)
+    totals = np.zeros(len(cells) + 1, dtype=np.int64)
+    union = {key : np.zeros(pgsize, dtype=bool) for key in union_columns(cells, posets)}
+    for record in records.values():
+        merge_chunk(totals, union, decode_chunk(record["parameters"]), record["counts"], decode_bitmaps(record["union"]))
+    chunks = get_chunks(param_dict, pgsize, records)
+    work_function = partial(PathMatch_chunk, spec, posets, param_dict)
+    for chunk, counts, bitmaps in imap_unordered(executor, work_function, chunks):
+        merge_chunk(totals, union, chunk, counts, bitmaps)
+        append_checkpoint(checkpoint, "chunk {}".format(chunk[0]), {"parameters" : encode_chunk(chunk), "counts" : counts.tolist(), "union" : encode_bitmaps(bitmaps)})
+    return reformat_output(cells, totals, {key : int(matched.sum()) for key, matched in union.items()}, pgsize)
+
+
+def merge_chunk(totals, union, chunk, counts, bitmaps):
+    '''
+    Add the results of one chunk of DSGRN parameters to the results over the parameter graph.
+    :param totals: numpy array of the match counts of every cell followed by the number of DSGRN parameters with a
+            stable full cycle, updated in place
+    :param union: dictionary keyed by the keys of union_columns of boolean numpy arrays over the parameter graph,
+            updated in place
+    :param chunk: range or list of DSGRN parameter indices
+    :param counts: match counts of the chunk in the layout of totals
+    :param bitmaps: list of compressed bitmaps over the chunk, output of union_bitmaps
+    :return: None
+    '''
+    totals[:] += counts
+    indices = np.asarray(chunk)
+    for matched, bitmap in zip(union.values(), bitmaps):
+        matched[indices] |= np.unpackbits(np.frombuffer(zlib.decompress(bitmap), dtype=np.uint8), count=len(chunk)).astype(bool)
+
+
+def existence_search(executor, spec, posets, param_dict, pgsize, records, checkpoint):
+    '''
+    Search chunks of DSGRN parameters in parallel for at least one pattern match in every (time series, epsilon,
+    search type) cell. At most param_dict["window"] (default = 1000) chunks are pending at any time, and as soon as
+    every cell has a match no more chunks are submitted and the queued ones are cancelled.
+    :param executor: executor object on the root process, see executor_utilities.open_executor
+    :param spec: DSGRN network specification
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param param_dict: dictionary of parameters generated from the .json parameter file
+    :param pgsize: size of the DSGRN parameter graph
+    :param records: dictionary of checkpoint records from a previous run
+    :param checkpoint: checkpoint file object
+    :return: {"domain" : {tsfile : [[eps, True or False, pgsize]]}, "stablefc" : {tsfile : [[eps, True or False, pgsize]]}}
+    '''
+    searches = [s for s in ["domain", "stablefc"] if param_dict[s]]
+    found = {s : {tsfile : {eps : False for (eps, _) in poset_list} for tsfile, poset_list in posets.items()} for s in searches}
+    evaluated = 0
+
+    def merge(chunk_found, num_evaluated):
+        for s in searches:
+            for tsfile, edict in chunk_found[s].items():
+                for eps, b in edict.items():
+                    found[s][tsfile][eps] = found[s][tsfile][eps] or b
+        return num_evaluated
+
+    def all_found():
+        return all(b for s in searches for edict in found[s].values() for b in edict.values())
+
+    for record in records.values():
+        evaluated += merge(decode_eps_keys(record["found"]), record["evaluated"])
+    chunks = get_chunks(param_dict, pgsize, records) if not all_found() else []
+    work_function = partial(PathMatch_existence, spec, posets, param_dict)
+    window = param_dict["window"] if "window" in param_dict else 1000
+    # chunks that were already running when the search terminated are still recorded and count as evaluated
+    for chunk, chunk_found, num_evaluated in imap_unordered(executor, work_function, chunks, window, lambda chunk: all_found()):
+        append_checkpoint(checkpoint, "chunk {}".format(chunk[0]), {"parameters" : encode_chunk(chunk), "found" : chunk_found, "evaluated" : num_evaluated})
+        evaluated += merge(chunk_found, num_evaluated)
+    paramlist_size = len(param_dict["parameter_list"]) if "parameter_list" in param_dict else pgsize
+    print("Existence search evaluated {} of {} parameters before termination.".format(evaluated, paramlist_size))
+    sys.stdout.flush()
+    return {s : {tsfile : [[eps, b, pgsize] for eps, b in sorted(edict.items())] for tsfile, edict in found[s].items()} for s in searches}
 
 
 def sanity_check(params):
@@ -111,9 +274,9 @@ def sanity_check(params):
         raise ValueError("All of the three keys 'domain', 'stablefc' and 'count' must be specified in the parameter file.")
 
 
-def get_posets(networks,params):
+def get_posets(networks,params,executor=None):
     if "posets" not in params:
-        posets,networks = calculate_posets_from_multiple_time_series(params,networks)
+        posets,networks = calculate_posets_from_multiple_time_series(params,networks,executor)
     else:
         lit_posets = ast.literal_eval(params["posets"])
         posets = {}
@@ -129,21 +292,14 @@ def get_posets(networks,params):
     return posets,networks
 
 
-def record_results(network_file, params_file,results,resultsdir,params):
+def record_results(results,resultsdir,params):
     '''
     Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
     :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
+    :param resultsdir: The date-time stamped directory in which to save the dictionary of results.
     :param params: The dictionary of parameters generated from the .json parameter file.
     :return: None. File is written.
     '''
-    if "datetime" in params:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir,params["datetime"])
-    else:
-        resultsdir = create_results_folder(network_file, params_file, resultsdir)
-
     def savefile(rname,rdict):
         if os.path.exists(rname):
             os.rename(rname, rname + ".old")
@@ -166,130 +322,163 @@ def record_results(network_file, params_file,results,resultsdir,params):
     open(".query_results.log","w").write(resultsdir)
 
 
-def reformat_output(output, tsfiles, param_dict, pgsize):
-        ts_keys = tsfiles[:]
-        if len(tsfiles) > 1:
-            ts_keys += ["all"]
-            all_match = {}
-        domain_bool = param_dict["domain"]
-        stablefc_bool = param_dict["stablefc"]
-        eps = param_dict["epsilons"]
-        res = {}
-        if domain_bool:
-            res["domain"] = dict.fromkeys(ts_keys, {})
-            if len(tsfiles) > 1:
-                all_match["domain"] = {e: set([]) for e in eps}
-        if stablefc_bool:
-            res["stablefc"] = dict.fromkeys(ts_keys, {})
-            if len(tsfiles) > 1:
-                all_match["stablefc"] = {e: set([]) for e in eps}
-        for tsfile in tsfiles:
-            domain_match = dict.fromkeys(eps, 0)
-            stablefc = 0
-            stablefc_match = dict.fromkeys(eps, 0)
-            for param_index, data in output.items():
-                if domain_bool:
-                    for e, b in data["domain"][tsfile].items():
-                        domain_match[e] += b
-                        if len(tsfiles) > 1 and b:
-                            all_match["domain"][e].add(param_index)
-                if stablefc_bool:
-                    stablefc += data["stablefc"]
-                    for e, b in data["match"][tsfile].items():
-                        stablefc_match[e] += b
-                        if len(tsfiles) > 1 and b:
-                            all_match["stablefc"][e].add(param_index)
-            if domain_bool:
-                res["domain"][tsfile] = [d + [pgsize] for d in sorted([list(m) for m in domain_match.items()])]
-            if stablefc_bool:
-                res["stablefc"][tsfile] = [d + [stablefc, pgsize] for d in sorted([list(m) for m in stablefc_match.items()])]
-        if len(tsfiles) > 1:
-            if domain_bool:
-                res["domain"]["all"] = sorted([[e, len(plist), pgsize] for e, plist in all_match["domain"].items()])
-            if stablefc_bool:
-                res["stablefc"]["all"] = sorted([[e, len(plist), stablefc, pgsize] for e, plist in all_match["stablefc"].items()])
-        return res
-
-
-def PathMatch(network, posets, domain, stablefc,dsgrn_param):
+def cell_layout(posets, params):
+    '''
+    Fixed column order of the match bits of one DSGRN parameter. There is one column per (search, time series, epsilon)
+    cell, and the match rows carry one more column at the end for the existence of a stable full cycle.
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param params: dictionary of parameters generated from the .json parameter file
+    :return: list of (search, tsfile, eps) tuples
+    '''
+    searches = [s for s in ["domain", "stablefc"] if params[s]]
+    return [(s, tsfile, eps) for s in searches for tsfile, poset_list in posets.items() for (eps, _) in poset_list]
+
+
+def union_columns(cells, posets):
+    '''
+    :param cells: output of cell_layout
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :return: dictionary keyed by (search, eps) of the columns of the cells of every time series, empty when there is a
+            single time series and no union across time series is reported
+    '''
+    if len(posets) < 2:
+        return {}
+    columns = {}
+    for j, (search, _, eps) in enumerate(cells):
+        columns.setdefault((search, eps), []).append(j)
+    return columns
+
+
+def reformat_output(cells, totals, union_totals, pgsize):
+    '''
+    :param cells: output of cell_layout
+    :param totals: numpy array of the number of DSGRN parameters with a match in every cell, followed by the number of
+            DSGRN parameters with a stable full cycle
+    :param union_totals: dictionary keyed by (search, eps) of the number of DSGRN parameters with a match to at least one
+            time series, empty when there is a single time series
+    :param pgsize: size of the DSGRN parameter graph
+    :return: dictionary of results keyed by search type, then time series file name (and "all" for the union)
+    '''
+    numFC = int(totals[-1])
+
+    def entry(search, eps, count):
+        return [eps, int(count), pgsize] if search == "domain" else [eps, int(count), numFC, pgsize]
+
+    res = {}
+    for (search, tsfile, eps), count in zip(cells, totals):
+        res.setdefault(search, {}).setdefault(tsfile, []).append(entry(search, eps, count))
+    for (search, eps), count in union_totals.items():
+        res[search].setdefault("all", []).append(entry(search, eps, count))
+    for tsdict in res.values():
+        for rlist in tsdict.values():
+            rlist.sort()
+    return res
+
+
+def PathMatch(network, posets, cells, dsgrn_param, morsecache=None):
     '''
     Test for the existence of at least one pattern match in the domain graph and/or stable full cycles.
     :param network: DSGRN.Network object
-    :param dsgrn_params: list of tuples of parameter indices and DSGRN.Parameter objects.
     :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
-    :param domain: True or False, search over whole domain graph.
-    :param stablefc: True or False search over stable full cycles only.
-    :return: {"domain" : {tsfile : {str(eps) : True or False}}, "match" : {tsfile : {str(eps) : True or False}, "stablefc" : True or False}
+    :param cells: output of cell_layout
+    :param dsgrn_param: tuple of parameter index and DSGRN.Parameter object
+    :param morsecache: optional MorseGraphCache object of the network
+    :return: numpy bool array with one entry per cell, True for a match, and a last entry that is True if there is a
+            stable full cycle (only computed when searching within stable full cycles)
     '''
     param_index,param = dsgrn_param
-    DomMatch = { tsfile : {} for tsfile,_ in posets.items()}
-    FCMatch = { tsfile : {} for tsfile,_ in posets.items()}
-    FC = False
-    domaingraph = DSGRN.DomainGraph(param)
-    for tsfile, poset_list in posets.items():
-        for (eps, (events, event_ordering)) in poset_list:
-            patterngraph = DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network,events,event_ordering))
-            if domain:
-                DomMatch[tsfile][eps] = domain_check(domaingraph,patterngraph)
-            if stablefc:
-                FCMatch[tsfile][eps], FC = stableFC_check(domaingraph,patterngraph)
-    results = {}
-    if domain:
-        results["domain"] = DomMatch
-    if stablefc:
-        results["stablefc"] = FC
-        results["match"] = FCMatch
-    return (param_index,results)
-
-
-def domain_check(domaingraph,patterngraph):
-    '''
-    Check for match in domain graph for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False
-    '''
-    ismatch = False
-    searchgraph = DSGRN.SearchGraph(domaingraph)
-    matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-    if DSGRN.PathMatch(matchinggraph):
-        ismatch = True
-    return ismatch
-
-
-def stableFC_check(domaingraph,patterngraph):
-    '''
-    Check for match in any stable full cycle for one parameter
-    :param domaingraph: DSGRN domain graph object
-    :param patterngraph: DSGRN pattern graph object
-    :return: True or False for the existence of a match and True or False for the existence of a stable full cycle
-    '''
-    FC = False
-    ismatch = False
-    morsegraph = DSGRN.MorseGraph(domaingraph)
-    for i in range(0, morsegraph.poset().size()):
-        if morsegraph.annotation(i)[0] == "FC" and len(morsegraph.poset().children(i)) == 0:
-            FC = True
-            searchgraph = DSGRN.SearchGraph(domaingraph, i)
-            matchinggraph = DSGRN.MatchingGraph(searchgraph, patterngraph)
-            if DSGRN.PathMatch(matchinggraph):
-                ismatch = True
-                break
-    return ismatch,FC
+    analysis = ParameterAnalysis(param, morsecache, param_index)
+    patterngraphs = get_patterngraphs(network, posets, log_builds=True)
+    patterngraphs = {(tsfile, eps) : patterngraph for tsfile, patterngraph_list in patterngraphs.items() for (eps, patterngraph) in patterngraph_list}
+    row = np.zeros(len(cells) + 1, dtype=bool)
+    for j, (search, tsfile, eps) in enumerate(cells):
+        if search == "domain":
+            row[j] = domain_check(analysis,patterngraphs[(tsfile, eps)])
+        else:
+            row[j], row[-1] = stableFC_check(analysis,patterngraphs[(tsfile, eps)])
+    return row
+
+
+def PathMatch_chunk(spec, posets, params, paramlist):
+    '''
+    Work function for parallelization over a chunk of DSGRN parameters.
+    :param spec: DSGRN network specification
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param paramlist: range or list of DSGRN parameter indices
+    :return: (paramlist, numpy array of the number of DSGRN parameters with a match in every cell of cell_layout followed
+            by the number with a stable full cycle, list of zlib compressed bitmaps over paramlist, one for each key of
+            union_columns, of the DSGRN parameters with a match to at least one time series)
+    '''
+    network, param_graph = get_parameter_graph(spec)
+    morsecache = open_morse_cache(params, network)
+    cells = cell_layout(posets, params)
+    rows = np.zeros((len(paramlist), len(cells) + 1), dtype=bool)
+    for k, p in enumerate(paramlist):
+        rows[k] = PathMatch(network, posets, cells, (p, param_graph.parameter(p)), morsecache)
+    morsecache.close()
+    return paramlist, rows.sum(axis=0), union_bitmaps(rows, cells, posets)
 
 
+def union_bitmaps(rows, cells, posets):
+    '''
+    :param rows: boolean numpy array of the match rows of a chunk of DSGRN parameters, one column per cell of cells
+            followed by the existence of a stable full cycle
+    :param cells: output of cell_layout
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :return: list of zlib compressed bitmaps over the rows, one for each key of union_columns, of the DSGRN parameters
+            with a match to at least one time series
+    '''
+    return [zlib.compress(np.packbits(rows[:, columns].any(axis=1)).tobytes()) for columns in union_columns(cells, posets).values()]
+
+
+def PathMatch_existence(spec, posets, params, paramlist):
+    '''
+    Test a chunk of DSGRN parameters for the existence of at least one pattern match in the domain graph and/or stable
+    full cycles, stopping early once every (time series, epsilon, search type) cell has a match.
+    :param spec: DSGRN network specification
+    :param posets: The partially ordered sets that are to be matched at each epsilon in DSGRN format.
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param paramlist: range or list of DSGRN parameter indices
+    :return: (paramlist, {"domain" : {tsfile : {eps : True or False}}, "stablefc" : {tsfile : {eps : True or False}}},
+            number of DSGRN parameters evaluated)
+    '''
+    network, param_graph = get_parameter_graph(spec)
+    domain, stablefc = params["domain"], params["stablefc"]
+    morsecache = open_morse_cache(params, network)
+    searches = [s for s, b in [("domain", domain), ("stablefc", stablefc)] if b]
+    found = {s : {tsfile : {eps : False for (eps, _) in poset_list} for tsfile, poset_list in posets.items()} for s in searches}
+    num_evaluated = 0
+    for p in paramlist:
+        num_evaluated += 1
+        analysis = ParameterAnalysis(param_graph.parameter(p), morsecache, p)
+        patterngraphs = get_patterngraphs(network, posets, log_builds=True)
+        for tsfile, patterngraph_list in patterngraphs.items():
+            for (eps, patterngraph) in patterngraph_list:
+                if domain and not found["domain"][tsfile][eps]:
+                    found["domain"][tsfile][eps] = domain_check(analysis,patterngraph)
+                if stablefc and not found["stablefc"][tsfile][eps]:
+                    found["stablefc"][tsfile][eps], _ = stableFC_check(analysis,patterngraph)
+        if all(b for s in searches for edict in found[s].values() for b in edict.values()):
+            break
+    morsecache.close()
+    return paramlist, found, num_evaluated
+
 
 if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
     if len(sys.argv) < 3:
         print(
         "Calling signature has two required arguments \n " \
-        "mpiexec -n <num_processes> python CountPatternMatch.py <path_to_network_file> <path_to_parameter_file>"
+        "mpiexec -n <num_processes> python CountPatternMatch_large_networks.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
     network_file = sys.argv[1]
     params_file = sys.argv[2]
     if len(sys.argv)>3:
         resultsdir = sys.argv[3]
-        query(network_file, params_file, resultsdir)
+        query(network_file, params_file, resultsdir, resume=resume)
     else:
-        query(network_file,params_file)
+        query(network_file,params_file, resume=resume)
@@ -1,19 +1,37 @@
 import DSGRN
 import os, json,sys
 from functools import partial
-from dsgrn_net_query.utilities.file_utilities import read_networks, create_results_folder
-from mpi4py import MPI
-from mpi4py.futures import MPICommExecutor
+from operator import itemgetter
+from dsgrn_net_query.utilities.file_utilities import read_networks, iter_networks, count_networks, distinct_networks, fan_out, report_duplicates, create_results_folder, open_checkpoint, append_checkpoint, read_checkpoint, check_resume, write_json
+from dsgrn_net_query.utilities.schedule_utilities import imap_networks
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache, count_stable
+from dsgrn_net_query.utilities.executor_utilities import open_executor, num_workers, get_backend
+from dsgrn_net_query.utilities.profile_utilities import Profile
 
 
-def query(network_file,params_file="",resultsdir=""):
+def query(network_file,params_file="",resultsdir="",resume=False):
     '''
-    :param network_file: a .txt file containing either a single DSGRN network specification or a list of network specification strings in DSGRN format
+    :param network_file: a .txt file containing either a single DSGRN network specification or a list of network specification strings in DSGRN format,
+                or a .jsonl file with one network specification per line, which is read lazily
     :param params_file: A json file with the key
             "count" = True or False (true or false in .json format)
                         whether or not to return the number of matches (True) or just whether or not there is at least one match (False)
             "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+            "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                        forked processes on one machine or not at all, default = "mpi"; the results are the same
+            "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
+            "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN parameter
+                        across runs, default = no cache
+            "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
+            "window" : optional maximum number of networks submitted to the workers at one time, default = 1000
+            "schedule" : optional "file" or "lpt", whether to submit networks in file order or largest parameter graph
+                        first, default = "file"
+            "cost_model" : optional dictionary of weights for the "lpt" schedule, see schedule_utilities.network_cost
+            "profile" : optional True or False, whether to time the DSGRN computations of every network and the busy and
+                        idle time of every worker and write them to profile.json in the results folder, default = False
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint file of
+                    the results folder with the same datetime, default is False
 
     :return:  Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
             The results are DSGRN parameter count that have at least one Morse set that is a stable full cycle,
@@ -22,21 +40,37 @@ def query(network_file,params_file="",resultsdir=""):
             { networkspec : [result, DSGRN param graph size] }.
     '''
 
-    networks = read_networks(network_file)
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
+    num_networks, num_distinct = count_networks(networks)
     params = json.load(open(params_file))
     datetime = None if "datetime" not in params else params["datetime"]
 
-    if not networks:
+    if not num_networks:
         raise ValueError("No networks available for analysis. Make sure network file is in the correct format.")
     else:
         count = sanity_check(params)
-        work_function = partial(search_over_networks, count, len(networks))
-        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
+        check_resume(params, resume)
+        work_function = partial(search_over_networks, params, num_distinct)
+        with open_executor(params) as executor:
             if executor is not None:
+                profile = Profile(params, get_backend(params))
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+                # results stream to the checkpoint file as networks finish; only the keys are held in memory
+                recorded, checkpoint = open_checkpoint(resultsdir, resume, keys_only=True)
+                report_duplicates(num_networks, num_distinct)
+                if recorded:
+                    print("Resuming: {} of {} networks already recorded.".format(len(recorded), num_distinct))
+                # distinct networks are read lazily and submitted as earlier ones finish, unless they are scheduled by size
+                duplicates = {}
+                todo = ((k, netspec) for k, netspec in enumerate(distinct_networks(iter_networks(networks), duplicates)) if netspec not in recorded)
                 print("Querying networks.")
-                output=list(executor.map(work_function, enumerate(networks)))
-                results = dict(output)
-                record_results(network_file,params_file,results,resultsdir,datetime)
+                outputs = imap_networks(executor, profile.wrap(work_function, itemgetter(1)), todo, params, num_workers(params))
+                for netspec, result in profile.unwrap(outputs):
+                    append_checkpoint(checkpoint, netspec, result)
+                checkpoint.close()
+                profile.write(resultsdir)
+                record_results(resultsdir, duplicates)
 
 
 def sanity_check(params):
@@ -50,70 +84,52 @@ def sanity_check(params):
     return params["count"]
 
 
-def record_results(network_file,params_file,results,resultsdir,datetime):
+def record_results(resultsdir,duplicates=None):
     '''
-    Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
-    :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
-    :param datetime: None or string with datetime
+    Compact the results streamed to the checkpoint file into a .json file. The checkpoint is read one network at a
+    time and every entry is written straight to the output file, so memory does not grow with the number of networks.
+    :param resultsdir: The date-time stamped directory in which to save the dictionary of results.
+    :param duplicates: optional dictionary filled by distinct_networks; the results of a queried network are also
+            written for its duplicates
     :return: None. File is written.
     '''
-    resultsdir = create_results_folder(network_file, params_file, resultsdir,datetime)
-    rname = os.path.join(resultsdir,"query_results.json")
-    if os.path.exists(rname):
-        os.rename(rname,rname+".old")
-    json.dump(results,open(rname,'w'))
+    write_json(os.path.join(resultsdir,"query_results.json"), fan_out(read_checkpoint(resultsdir), duplicates))
     print(resultsdir)
 
 
-def is_FC(annotation):
-    '''
-    Specifies whether a Morse set is a full cycle.
-    :param annotation: DSGRN annotation string
-    :return: True or False
-    '''
-    return annotation.startswith("FC")
-
-
-def search_over_networks(count,N,enum_network):
+def search_over_networks(params,N,enum_network):
     '''
     Work function for parallelization.
-    :param count: True or False, count DSGRN parameters or shortcut to existence
+    :param params: dictionary containing the key "count", True or False, count DSGRN parameters or shortcut to existence
     :param N: Size of the DSGRN parameter graph
     :param enum_network: An (integer, DSGRN network specification) pair
     :return: (DSGRN network specification, results) pair
     '''
     k,netspec = enum_network
-    numparams = 0
+    count = params["count"]
     network = DSGRN.Network(netspec)
     parametergraph = DSGRN.ParameterGraph(network)
-    for p in range(parametergraph.size()):
-        parameter = parametergraph.parameter(p)
-        dg = DSGRN.DomainGraph(parameter)
-        mg = DSGRN.MorseGraph(dg)
-        stable_FC_annotations = [mg.annotation(i)[0] for i in range(0, mg.poset().size())
-                                 if is_FC(mg.annotation(i)[0]) and len(mg.poset().children(i)) == 0]
-        if count and len(stable_FC_annotations) > 0:
-            numparams+=1
-        elif len(stable_FC_annotations) > 0:
-            print("Network {} of {} complete".format(k + 1, N))
-            sys.stdout.flush()
-            return netspec,(True,parametergraph.size())
+    morsecache = open_morse_cache(params, network)
+    numparams = count_stable(parametergraph, 0, parametergraph.size(), "FC", count, morsecache)
+    morsecache.close()
     print("Network {} of {} complete".format(k+1, N))
+    if morsecache.path is not None:
+        print(morsecache.report())
     sys.stdout.flush()
     if count:
         return netspec,(numparams,parametergraph.size())
     else:
-        return netspec, (False, parametergraph.size())
+        return netspec, (numparams > 0, parametergraph.size())
 
 
 if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
     if len(sys.argv) < 3:
         print(
             "Calling signature has one required argument \n " \
-            "mpiexec -n <num_processes> python CountStableFC.py <path_to_network_file>"
+            "mpiexec -n <num_processes> python CountStableFC.py <path_to_network_file> <optional_path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
     network_file = sys.argv[1]
@@ -125,4 +141,4 @@ if __name__ == "__main__":
         resultsdir = sys.argv[3]
     else:
        resultsdir = ""
-    query(network_file, params_file, resultsdir)
+    query(network_file, params_file, resultsdir, resume=resume)
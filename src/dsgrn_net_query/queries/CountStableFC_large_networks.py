@@ -1,16 +1,34 @@
 import DSGRN
-import os, json, sys,subprocess,ast,shutil
+import os, json, sys, tempfile
+from concurrent.futures import as_completed
+from dsgrn_net_query.utilities.signatures_no_mpi import make_db
+from dsgrn_net_query.utilities.file_utilities import read_networks, iter_networks, count_networks, create_results_folder, open_checkpoint, append_checkpoint, check_resume, distinct_networks, report_duplicates
+from dsgrn_net_query.utilities.executor_utilities import open_executor
+from dsgrn_net_query.utilities.morsegraph_utilities import count_stable
+from dsgrn_net_query.utilities.schedule_utilities import get_parameter_graph, parameter_graph_size
+from dsgrn_net_query.queries.CountStableFC import record_results
 
 
-def query(network_file,params_file,resultsdir=""):
+def query(network_file,params_file,resultsdir="",resume=False):
     '''
-    :param network_file: a .txt file containing either a single DSGRN network specification or a list of network specification strings in DSGRN format
+    :param network_file: a .txt file containing either a single DSGRN network specification or a list of network specification strings in DSGRN format,
+                or a .jsonl file with one network specification per line, which is read lazily
     :param params_file: A json file with the keys
-            "num_proc" = number of processes to use for each database creation
             "count" = True or False (true or false in .json format)
                         whether or not to return the number of matches (True) or just whether or not there is at least one match (False)
             "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+            "backend" : optional "mpi", "process" or "serial", whether to distribute the chunks over MPI processes, over
+                        forked processes on one machine or not at all, default = "process"; the results are the same
+            "num_proc" : optional number of processes computing the Morse graphs of each network with the "process"
+                        backend, default = number of CPUs
+            "chunk_size" : optional number of DSGRN parameters in one unit of work, default = 1000
+            "db_dir" : optional directory (for example a tmpfs such as /dev/shm) in which to also save a DSGRN database
+                        for every network, inside a uniquely named subdirectory; the Morse graphs are computed by the
+                        same workers; default = no databases are saved and the stable full cycles are counted as the
+                        Morse graphs are computed
     :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint file of the
+                    results folder with the same datetime, default is False
 
     :return: Writes a .json file containing a dictionary keyed by DSGRN network specification with a list of results.
             The results are DSGRN parameter count that have at least one Morse set that is a stable full cycle,
@@ -19,122 +37,105 @@ def query(network_file,params_file,resultsdir=""):
             { networkspec : [result, DSGRN param graph size] }.
     '''
 
-    networks = read_networks(network_file)
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
+    num_networks, num_distinct = count_networks(networks)
     params = json.load(open(params_file))
     datetime = None if "datetime" not in params else params["datetime"]
-    if not networks:
+    if not num_networks:
         raise ValueError("No networks available for analysis. Make sure network file is in the correct format.")
     else:
-        num_proc, count = sanity_check(params)
-        results = {}
-        for k,netspec in enumerate(networks):
-            netfile = "temp{}.txt".format(k)
-            dbfile = "temp{}.db".format(k)
-            if os.path.exists(dbfile):
-                os.remove(dbfile)
-            with open(netfile,"w") as f:
-                f.write(netspec)
-            subprocess.check_call("mpiexec -n {} Signatures {} {}".format(num_proc,netfile,dbfile),shell=True)
-            db = DSGRN.Database(dbfile)
-            N = db.parametergraph.size()
-            matches = len(DSGRN.StableFCQuery(db).matches())
-            if count:
-                results[netspec] = (matches,N)
-            else:
-                results[netspec] = (matches > 0, N)
-            subprocess.call(["rm",netfile])
-            subprocess.call(["rm",dbfile])
-            print("Network {} of {} complete".format(k + 1, len(networks)))
-            sys.stdout.flush()
-        record_results(network_file,params_file,results,resultsdir,datetime)
+        count = sanity_check(params)
+        check_resume(params, resume)
+        with open_executor(params, "process") as pool:
+            if pool is not None:
+                resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+                # results stream to the checkpoint file as networks finish; only the keys are held in memory
+                recorded, checkpoint = open_checkpoint(resultsdir, resume, keys_only=True)
+                report_duplicates(num_networks, num_distinct)
+                if recorded:
+                    print("Resuming: {} of {} networks already recorded.".format(len(recorded), num_distinct))
+                chunk_size = params["chunk_size"] if "chunk_size" in params else 1000
+                dbdir = tempfile.mkdtemp(prefix="dsgrn_db_", dir=os.path.expanduser(params["db_dir"])) if "db_dir" in params else None
+                duplicates = {}
+                for k,netspec in enumerate(distinct_networks(iter_networks(networks), duplicates)):
+                    if netspec in recorded:
+                        continue
+                    if dbdir is None:
+                        matches, N = count_stable_fc(pool, netspec, count, chunk_size)
+                    else:
+                        dbfile = os.path.join(dbdir, "network{}.db".format(k))
+                        make_db(netspec, dbfile, chunk_size=chunk_size, executor=pool)
+                        db = DSGRN.Database(dbfile)
+                        N = db.parametergraph.size()
+                        matches = len(DSGRN.StableFCQuery(db).matches())
+                        print("Saved {}".format(dbfile))
+                    append_checkpoint(checkpoint, netspec, (matches, N) if count else (matches > 0, N))
+                    print("Network {} of {} complete".format(k + 1, num_distinct))
+                    sys.stdout.flush()
+                checkpoint.close()
+                record_results(resultsdir, duplicates)
 
 
 def sanity_check(params):
     '''
     Checks to be sure the correct keys are in the dictionary params.
     :param params: dictionary
-    :return: Either the values of the keys "num_proc" and "count" in the parameter dictionary, or an error is raised.
+    :return: Either the value of the key "count" in the parameter dictionary, or an error is raised.
     '''
-    if "num_proc" not in params or "count" not in params:
-        raise ValueError("The keys 'num_proc' and 'count' must be specified in the parameter file.")
-    return params["num_proc"],params["count"]
+    if "count" not in params:
+        raise ValueError("The key 'count' must be specified in the parameter file.")
+    return params["count"]
 
 
-def record_results(network_file,params_file,results,resultsdir,datetime):
+def stable_fc_chunk(netspec, count, start, stop):
     '''
-    Record results in a .json file.
-    :param network_file: The input .txt file containing the list of DSGRN network specifications.
-    :param params_file: The input .json parameter file.
-    :param results: The dictionary of results.
-    :param resultsdir: The location to save the dictionary of results.
-    :param datetime: None or string with datetime
-    :return: None. File is written.
+    Work function for parallelization over chunks of DSGRN parameters.
+    :param netspec: DSGRN network specification
+    :param count: True or False, count DSGRN parameters or stop at the first stable full cycle
+    :param start: first DSGRN parameter index in the chunk
+    :param stop: one past the last DSGRN parameter index in the chunk
+    :return: number of DSGRN parameters in the chunk with a stable full cycle
     '''
-    resultsdir = create_results_folder(network_file, params_file, resultsdir,datetime)
-    rname = os.path.join(resultsdir,"query_results.json")
-    if os.path.exists(rname):
-        os.rename(rname,rname+".old")
-    json.dump(results,open(rname,'w'))
-    print(resultsdir)
+    # chunks of the same network that run on the same process share the parameter graph
+    return count_stable(get_parameter_graph(netspec)[1], start, stop, "FC", count)
 
 
-def read_networks(network_file):
+def count_stable_fc(pool, netspec, count, chunk_size):
     '''
-    NOTE: Forced to copy from file_utilities due to collision between import of MPI and the mpiexec call inside this file.
-
-    Read a .txt network file that has either a single DSGRN network specification or a list of them
-    :param networks: A .txt file containing a single DSGRN network specification or a list of network specifications,
-    :return: list of DSGRN network specifications
-    '''
-
-    network_str = open(network_file).read()
-    if not network_str:
-        networks = []
-    elif network_str[0] == "[":
-        networks = ast.literal_eval(network_str)
-    else:
-        while network_str[-1] == '\n':
-            network_str = network_str[:-1]
-        networks = [network_str]
-    return networks
-
-
-def create_results_folder(network_file, params_file, resultsdir,datetime):
-    '''
-    NOTE: Forced to copy from file_utilities due to collision between import of MPI and the mpiexec call inside this file.
-
-    Create a date-time stamped folder to save results. Copy over input files.
-    :param network_file: A .txt file
-    :param params_file: A .json file
-    :param resultsdir: optional path to directory where results will be written
-    :return: string containing path to date-time stamped directory to save results file
+    Count the DSGRN parameters with a stable full cycle as the Morse graphs are computed, without writing a database.
+    :param pool: executor object on the root process, see executor_utilities.open_executor
+    :param netspec: DSGRN network specification
+    :param count: True or False, count DSGRN parameters or stop at the first stable full cycle
+    :param chunk_size: number of DSGRN parameters in one unit of work
+    :return: (number of DSGRN parameters with a stable full cycle, size of the DSGRN parameter graph)
     '''
-    if datetime is None:
-        datetime = subprocess.check_output(['date +%Y_%m_%d_%H_%M_%S'], shell=True).decode(sys.stdout.encoding).strip()
-    dirname = os.path.join(os.path.expanduser(resultsdir), "dsgrn_net_query_results" + datetime)
-    queriesdir = os.path.join(dirname, "queries" + datetime)
-    os.makedirs(queriesdir)
-    sys.stdout.flush()
-    inputfilesdir = os.path.join(dirname, "inputs" + datetime)
-    os.makedirs(inputfilesdir)
-    # save input files to computations folder
-    shutil.copy(network_file, inputfilesdir)
-    if params_file:
-        shutil.copy(params_file, inputfilesdir)
-    return queriesdir
+    N = parameter_graph_size(netspec)
+    futures = [pool.submit(stable_fc_chunk, netspec, count, start, min(start + chunk_size, N)) for start in range(0, N, chunk_size)]
+    matches = 0
+    for future in as_completed(futures):
+        matches += future.result()
+        if matches and not count:
+            for f in futures:
+                f.cancel()
+            break
+    return matches, N
 
 
 if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
     if len(sys.argv) < 3:
         print(
             "Calling signature has two required arguments \n " \
-            "python CountStableFC_large_networks.py <path_to_network_file> <path_to_parameter_file>"
+            "python CountStableFC_large_networks.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
         )
         exit(1)
     network_file = sys.argv[1]
     params_file = sys.argv[2]
     if len(sys.argv) > 3:
         resultsdir = sys.argv[3]
-        query(network_file, params_file, resultsdir)
+        query(network_file, params_file, resultsdir, resume=resume)
     else:
-        query(network_file, params_file)
+        query(network_file, params_file, resume=resume)
@@ -0,0 +1,272 @@
+import DSGRN
+import json, os, sys
+from collections import Counter
+from functools import partial
+from operator import itemgetter
+from dsgrn_net_query.queries import CountFPMatch, CountStableFC, CountPatternMatch
+from dsgrn_net_query.utilities.file_utilities import read_networks, iter_networks, count_networks, create_results_folder, open_checkpoint, append_checkpoint, check_resume, network_names, distinct_networks, report_duplicates
+from dsgrn_net_query.utilities.schedule_utilities import get_parameter_graph, imap_chunks
+from dsgrn_net_query.utilities.pattern_utilities import get_patterngraphs, patterngraph_counters, cache_counters, cache_report, ParameterAnalysis
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache, stable_annotations
+from dsgrn_net_query.utilities.executor_utilities import open_executor, num_workers, get_backend
+from dsgrn_net_query.utilities.profile_utilities import Profile
+
+
+QUERIES = ["CountFPMatch", "CountStableFC", "CountPatternMatch"]
+
+
+def query(network_file,params_file,resultsdir="",resume=False):
+    '''
+    Run several of the queries CountFPMatch, CountStableFC and CountPatternMatch in one pass over the DSGRN parameters.
+    The domain graph and the Morse graph of every DSGRN parameter are computed once and shared by all the queries,
+    instead of once per query when the modules are run one after the other.
+
+    :param network_file: a .txt file containing either a single DSGRN network specification or a list of network
+    specification strings in DSGRN format, or a .jsonl file with one network specification per line, which is read
+    lazily
+    :param params_file: A .json file containing a dictionary with the key
+        "queries" : list of query specifications, each a dictionary with the key "query", one of "CountFPMatch",
+                    "CountStableFC" or "CountPatternMatch", and the keys of the parameter file of that query module.
+                    Every query may appear at most once. The option "neighbors" of CountFPMatch is not supported.
+                    Example: [{"query" : "CountFPMatch", "included_bounds" : [{"X1":[2,2]}], "excluded_bounds" : []},
+                              {"query" : "CountStableFC"},
+                              {"query" : "CountPatternMatch", "domain" : true, "stablefc" : true,
+                               "timeseriesfname" : "ts.tsv", "tsfile_is_row_format" : true, "epsilons" : [0.0, 0.05]}]
+        All other keys are shared by every query, unless a query specification overrides them:
+        "count" : True or False (true or false in .json format), whether to count all DSGRN parameters or shortcut at
+                    first success
+        "datetime" : optional datetime string to append to subdirectories in resultsdir, default = system time
+        "backend" : optional "mpi", "process" or "serial", whether to distribute the work over MPI processes, over
+                    forked processes on one machine or not at all, default = "mpi"; the results are the same
+        "num_proc" : optional number of worker processes of the "process" backend, default = number of CPUs
+        "chunk_size" : optional maximum number of DSGRN parameters in one unit of work, default = 1000
+        "window" : optional maximum number of networks sized, and of chunks submitted, at one time, default = 1000
+        "morse_cache" : optional path to an SQLite file that keeps the Morse graph summaries of every DSGRN parameter
+                    across runs, default = no cache
+        "morse_cache_size" : optional maximum number of DSGRN parameters in the Morse graph cache, default = 1000000
+        "schedule" : optional "file" or "lpt", whether to submit chunks in file order or largest predicted cost first,
+                    default = "file"
+        "profile" : optional True or False, whether to time the DSGRN computations of every network and the busy and
+                    idle time of every worker and write them to profile.json in the results folder, default = False
+        "cost_model" : optional dictionary of weights for the "lpt" schedule, see schedule_utilities.network_cost
+
+    :param resultsdir: optional path to directory where results will be written, default is current directory
+    :param resume: optional True or False, whether to skip the networks already recorded in the checkpoint files of
+                    the results folder with the same datetime, default is False
+
+    :return: Writes the output files of every query, in the format of its query module, to a subdirectory of the
+            results folder named after the query module. Networks with node names that are missing from the time series
+            data are left out of the CountPatternMatch results only.
+    '''
+
+    # .jsonl network files are streamed, other formats are read once
+    networks = network_file if network_file.endswith(".jsonl") else read_networks(network_file)
+    num_networks, num_distinct = count_networks(networks)
+    params = json.load(open(params_file))
+
+    specs = sanity_check(params)
+    check_resume(params, resume)
+
+    with open_executor(params) as executor:
+        if executor is not None:
+            posets = {}
+            if "CountPatternMatch" in specs:
+                # the posets are computed on the worker processes
+                posets,_ = CountPatternMatch.stream_posets(networks,specs["CountPatternMatch"],executor)
+            if not num_networks:
+                print("No networks available for analysis. Make sure network file is in the correct format.")
+                return None
+            profile = Profile(params, get_backend(params))
+            work_function = profile.wrap(partial(search_over_chunk, params, specs, posets), itemgetter(1))
+            datetime = params["datetime"] if "datetime" in params else None
+            resultsdir = create_results_folder(network_file, params_file, resultsdir, datetime)
+            querydirs = {name : os.path.join(resultsdir, name) for name in specs}
+            checkpoints = {}
+            for name, querydir in querydirs.items():
+                os.makedirs(querydir, exist_ok=True)
+                checkpoints[name] = open_checkpoint(querydir, resume, keys_only=True)
+            report_duplicates(num_networks, num_distinct)
+            num_done = 0
+            if any(recorded for recorded, _ in checkpoints.values()):
+                num_done = sum(1 for netspec in distinct_networks(iter_networks(networks), {}) if not pending_queries(netspec, specs, posets, checkpoints))
+                print("Resuming: {} of {} networks already recorded.".format(num_done, num_distinct))
+            # distinct networks are read lazily and their chunks submitted as earlier ones finish, unless they are scheduled by cost
+            duplicates = {}
+            todo = ((k, netspec) for k, netspec in enumerate(distinct_networks(iter_networks(networks), duplicates)) if pending_queries(netspec, specs, posets, checkpoints))
+            print("Querying networks with {}.".format(", ".join(specs)))
+            sys.stdout.flush()
+            chunked = {}
+            chunk_results = {}
+            counters = Counter()
+            pm_params = specs["CountPatternMatch"] if "CountPatternMatch" in specs else params
+            outputs = imap_chunks(executor, work_function, todo, params, num_workers(params), chunked, partial(CountPatternMatch.chunk_cost, pm_params, posets))
+            for k, chunk_result, chunk_counters in profile.unwrap(outputs):
+                counters.update(chunk_counters)
+                chunk_results.setdefault(k, []).append(chunk_result)
+                if len(chunk_results[k]) == chunked[k][2]:
+                    netspec, size, _ = chunked.pop(k)
+                    merged = merge_chunk_results(chunk_results.pop(k), specs, size)
+                    for name in pending_queries(netspec, specs, posets, checkpoints):
+                        append_checkpoint(checkpoints[name][1], netspec, merged[name])
+                    num_done += 1
+                    print("Network {} of {} complete.".format(num_done, num_distinct))
+                    sys.stdout.flush()
+            for _, checkpoint in checkpoints.values():
+                checkpoint.close()
+            print(cache_report(counters, "morse_cache" in params))
+            profile.write(resultsdir)
+            record_results(querydirs, specs, duplicates)
+            print(resultsdir)
+
+
+def sanity_check(params):
+    '''
+    Checks to be sure the query specifications are valid and builds the parameter dictionary of every query.
+    :param params: dictionary
+    :return: dictionary keyed by query module name with the parameter dictionary of that query, or an error is raised.
+    '''
+    if "queries" not in params or not params["queries"]:
+        raise ValueError("The key 'queries' must be specified in the parameter file with a list of query specifications.")
+    shared = {key : val for key, val in params.items() if key != "queries"}
+    specs = {}
+    for spec in params["queries"]:
+        if "query" not in spec or spec["query"] not in QUERIES:
+            raise ValueError("Every query specification must have the key 'query' with one of the values {}.".format(", ".join(QUERIES)))
+        if spec["query"] in specs:
+            raise ValueError("The query {} is specified more than once.".format(spec["query"]))
+        qparams = dict(shared)
+        qparams.update({key : val for key, val in spec.items() if key != "query"})
+        specs[spec["query"]] = qparams
+    if "CountFPMatch" in specs:
+        CountFPMatch.sanity_check(specs["CountFPMatch"])
+        if "neighbors" in specs["CountFPMatch"] and specs["CountFPMatch"]["neighbors"] is True:
+            raise ValueError("The key 'neighbors' is not supported in a combined query. Run CountFPMatch.py on its own instead.")
+    if "CountStableFC" in specs:
+        CountStableFC.sanity_check(specs["CountStableFC"])
+    if "CountPatternMatch" in specs:
+        CountPatternMatch.sanity_check(specs["CountPatternMatch"])
+    return specs
+
+
+def pending_queries(netspec, specs, posets, checkpoints):
+    '''
+    :param netspec: DSGRN network specification
+    :param specs: output of sanity_check
+    :param posets: dictionary of posets keyed by node names, see CountPatternMatch.get_posets
+    :param checkpoints: dictionary keyed by query module name with the output of open_checkpoint
+    :return: list of the names of the queries that apply to the network and are not yet recorded for it
+    '''
+    return [name for name in specs if netspec not in checkpoints[name][0] and
+            (name != "CountPatternMatch" or network_names(netspec) in posets)]
+
+
+def search_over_chunk(params,specs,posets,chunk):
+    '''
+    Work function for parallelization. The domain graph and Morse graph of every DSGRN parameter in the chunk are
+    computed once and passed to every query. A query that does not count stops as soon as it has a match, and the
+    chunk stops when every query has stopped.
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param specs: output of sanity_check
+    :param posets: dictionary of posets keyed by node names, see CountPatternMatch.get_posets
+    :param chunk: a (network index, DSGRN network specification, start, stop) tuple; DSGRN parameters with indices
+            start <= p < stop are searched
+    :return: (network index, dictionary of chunk results keyed by query module name, cache counters) tuple
+    '''
+    (k,netspec,start,stop) = chunk
+    network, parametergraph = get_parameter_graph(netspec)
+    names = network_names(netspec)
+    morsecache = open_morse_cache(params, network)
+    before = patterngraph_counters()
+    chunk_result = {}
+    done = {}
+    if "CountFPMatch" in specs:
+        fp = specs["CountFPMatch"]
+        included = CountFPMatch.compile_bounds(network, fp["included_bounds"])
+        excluded = CountFPMatch.compile_bounds(network, fp["excluded_bounds"])
+        batch_size = fp["batch_size"] if "batch_size" in fp else 100
+        stable_FP_annotations = []
+        chunk_result["CountFPMatch"] = 0
+        done["CountFPMatch"] = False
+    if "CountStableFC" in specs:
+        chunk_result["CountStableFC"] = 0
+        done["CountStableFC"] = False
+    if "CountPatternMatch" in specs and names in posets:
+        pm = specs["CountPatternMatch"]
+        patterngraphs = get_patterngraphs(network, posets[names])
+        chunk_result["CountPatternMatch"] = CountPatternMatch.init_chunk_result(posets[names], pm["count"], parametergraph.size())
+        done["CountPatternMatch"] = False
+    for p in range(start, stop):
+        if all(done.values()):
+            break
+        analysis = ParameterAnalysis(parametergraph.parameter(p), morsecache, p)
+        if "CountStableFC" in done and not done["CountStableFC"] and analysis.stable_fc():
+            chunk_result["CountStableFC"] += 1
+            done["CountStableFC"] = not specs["CountStableFC"]["count"]
+        if "CountFPMatch" in done and not done["CountFPMatch"]:
+            stable_FP_annotations.append(stable_annotations(analysis.summary(), "FP"))
+            if len(stable_FP_annotations) == batch_size or p == stop - 1:
+                matches = CountFPMatch.have_matches(stable_FP_annotations, included, excluded)
+                stable_FP_annotations = []
+                chunk_result["CountFPMatch"] += int(matches.sum())
+                done["CountFPMatch"] = not fp["count"] and chunk_result["CountFPMatch"] > 0
+        if "CountPatternMatch" in done and not done["CountPatternMatch"]:
+            if pm["count"]:
+                CountPatternMatch.count_parameter(chunk_result["CountPatternMatch"], analysis, patterngraphs, pm["domain"], pm["stablefc"], p)
+            else:
+                done["CountPatternMatch"] = CountPatternMatch.check_parameter(chunk_result["CountPatternMatch"], analysis, patterngraphs, pm["domain"], pm["stablefc"])
+    morsecache.close()
+    return (k, chunk_result, cache_counters(before, morsecache))
+
+
+def merge_chunk_results(chunk_results, specs, size):
+    '''
+    Reduce the results of all the parameter chunks of one network and format them as the query modules do.
+    :param chunk_results: list of dictionaries returned by search_over_chunk
+    :param specs: output of sanity_check
+    :param size: size of the DSGRN parameter graph of the network
+    :return: dictionary keyed by query module name with the result of the network for that query
+    '''
+    merged = {}
+    for name in ["CountFPMatch", "CountStableFC"]:
+        if name in specs:
+            numparams = sum(chunk_result[name] for chunk_result in chunk_results)
+            merged[name] = [numparams if specs[name]["count"] else numparams > 0, size]
+    if "CountPatternMatch" in chunk_results[0]:
+        pm = specs["CountPatternMatch"]
+        merged_pm = CountPatternMatch.merge_chunk_results([chunk_result["CountPatternMatch"] for chunk_result in chunk_results], pm["count"])
+        merged["CountPatternMatch"] = CountPatternMatch.format_results(merged_pm, pm)
+    return merged
+
+
+def record_results(querydirs, specs, duplicates):
+    '''
+    Write the output files of every query from its checkpoint file.
+    :param querydirs: dictionary keyed by query module name with the results subdirectory of that query
+    :param specs: output of sanity_check
+    :param duplicates: dictionary filled by distinct_networks
+    :return: None. Files are written.
+    '''
+    for name, module in [("CountFPMatch", CountFPMatch), ("CountStableFC", CountStableFC)]:
+        if name in specs:
+            module.record_results(querydirs[name], duplicates)
+    if "CountPatternMatch" in specs:
+        CountPatternMatch.record_results(querydirs["CountPatternMatch"], specs["CountPatternMatch"], duplicates)
+
+
+if __name__ == "__main__":
+    resume = "--resume" in sys.argv
+    if resume:
+        sys.argv.remove("--resume")
+    if len(sys.argv) < 3:
+        print(
+        "Calling signature has two required arguments \n " \
+        "mpiexec -n <num_processes> python MultiQuery.py <path_to_network_file> <path_to_parameter_file> <optional_path_to_resultsdir> <optional --resume>"
+        )
+        exit(1)
+    network_file = sys.argv[1]
+    params_file = sys.argv[2]
+    if len(sys.argv)>3:
+        resultsdir = sys.argv[3]
+        query(network_file, params_file, resultsdir, resume=resume)
+    else:
+        query(network_file,params_file, resume=resume)
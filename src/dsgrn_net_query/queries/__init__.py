@@ -1 +1 @@
-__all__ = ["CountFPMatch","CountStableFC","CountStableFC_large_networks","CountPatternMatch"]
\ No newline at end of file
+__all__ = ["CountFPMatch","CountStableFC","CountStableFC_large_networks","CountPatternMatch","MultiQuery"]
\ No newline at end of file
@@ -1 +1 @@
-__all__ = ["poset_utilities","file_utilities","parameter_utilities","signatures_no_mpi"]
\ No newline at end of file
+__all__ = ["poset_utilities","file_utilities","parameter_utilities","pattern_utilities","schedule_utilities","morsegraph_utilities","signatures_no_mpi","executor_utilities","profile_utilities"]
\ No newline at end of file
@@ -0,0 +1,95 @@
+import DSGRN
+import os, multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+BACKENDS = ["mpi", "process", "serial"]
+
+
+def get_backend(params, default="mpi"):
+    '''
+    :param params: dictionary of parameters generated from the .json parameter file, with the optional key
+            "backend" : "mpi", "process" or "serial", default = default
+    :param default: backend of the query module when the key "backend" is absent
+    :return: name of the backend
+    '''
+    backend = params["backend"] if "backend" in params else default
+    if backend not in BACKENDS:
+        raise ValueError("The key 'backend' must be one of {}.".format(", ".join(BACKENDS)))
+    return backend
+
+
+def num_workers(params, default="mpi"):
+    '''
+    :param params: dictionary of parameters generated from the .json parameter file, with the optional keys
+            "backend" : see get_backend
+            "num_proc" : number of worker processes of the "process" backend, default = number of CPUs
+    :param default: backend of the query module when the key "backend" is absent
+    :return: number of processes that run the work functions
+    '''
+    backend = get_backend(params, default)
+    if backend == "mpi":
+        from mpi4py import MPI
+        return MPI.COMM_WORLD.Get_size() - 1
+    if backend == "process":
+        return int(params["num_proc"]) if "num_proc" in params else os.cpu_count()
+    return 1
+
+
+def warm_up():
+    '''
+    Initializer of the worker processes of the "process" backend. The workers are forked from the root process, which
+    has already imported DSGRN; constructing a small parameter graph also loads the DSGRN logic resources before the
+    first unit of work arrives.
+    :return: None
+    '''
+    DSGRN.ParameterGraph(DSGRN.Network("X : X : E"))
+
+
+class SerialExecutor(Executor):
+    '''
+    Executor that runs every unit of work in the root process as soon as it is submitted. It needs neither MPI nor
+    extra processes, which makes it the backend of choice for debugging and profiling.
+    '''
+
+    def submit(self, fn, *args, **kwargs):
+        '''
+        :param fn: work function
+        :return: Future object that is already done
+        '''
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@contextmanager
+def open_executor(params, default="mpi"):
+    '''
+    Start the workers of the backend chosen in the parameter dictionary. With the "mpi" backend, only the root process
+    gets an executor and the other processes serve the work functions until the root is done, so query modules use
+        with open_executor(params) as executor:
+            if executor is not None:
+                ...
+    The "process" backend forks "num_proc" worker processes on one machine and the "serial" backend runs everything in
+    the calling process. mpi4py is only imported by the "mpi" backend. Every backend gives the same results.
+    :param params: dictionary of parameters generated from the .json parameter file, with the optional keys "backend"
+            and "num_proc", see num_workers
+    :param default: backend of the query module when the key "backend" is absent
+    :return: executor object on the root process, None on the other MPI processes
+    '''
+    backend = get_backend(params, default)
+    if backend == "mpi":
+        from mpi4py import MPI
+        from mpi4py.futures import MPICommExecutor
+        with MPICommExecutor(MPI.COMM_WORLD, root=0) as executor:
+            yield executor
+    elif backend == "process":
+        with ProcessPoolExecutor(num_workers(params, default), mp_context=multiprocessing.get_context("fork"),
+                                 initializer=warm_up) as executor:
+            yield executor
+    else:
+        with SerialExecutor() as executor:
+            yield executor
@@ -1,5 +1,6 @@
 import pandas as pd
-import ast, subprocess, os, shutil, sys
+import ast, subprocess, os, shutil, sys, json, hashlib
+from functools import lru_cache
 
 def extractdata(filename):
     '''
@@ -52,11 +53,14 @@ def read_networks(network_object):
     Identify a list of networks or generate a list of DSGRN network specifications from a .txt file, such as that produced in makejobs.Job.run().
 
     :param networks: Either a list of network specifications or a .txt file containing a single DSGRN network specification or a list of network specifications,
+            or a .jsonl file with one network specification (a JSON string) per line
     :return: list of DSGRN network specifications
     '''
 
     if isinstance(network_object,list):
         networks = network_object
+    elif isinstance(network_object,str) and network_object.endswith(".jsonl"):
+        networks = list(iter_networks(network_object))
     elif isinstance(network_object,str):
         # read network file
         network_str = open(network_object).read()
@@ -71,6 +75,136 @@ def read_networks(network_object):
     return networks
 
 
+def iter_networks(network_object):
+    '''
+    Iterate lazily over the network specifications of a .jsonl file, which has one network specification (a JSON
+    string) per line, so that huge network lists are never held in memory or parsed all at once. Other files are read
+    with read_networks.
+    :param network_object: a .jsonl file, any input accepted by read_networks, or an iterable of network specifications
+    :return: generator of DSGRN network specifications
+    '''
+    if isinstance(network_object,str) and network_object.endswith(".jsonl"):
+        with open(network_object) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif isinstance(network_object,str):
+        yield from read_networks(network_object)
+    else:
+        yield from network_object
+
+
+def canonical_key(netspec, ordered=False):
+    '''
+    Hash of a DSGRN network specification that ignores whitespace and the order of the node lines, so that copies of
+    the same network written differently get the same key. The key has a fixed size of 20 bytes, however long the
+    specification is.
+    :param netspec: DSGRN network specification
+    :param ordered: optional True or False, whether the order of the node lines is part of the key, default = False.
+            The order of the nodes fixes the DSGRN parameter indices, so results per DSGRN parameter need ordered keys.
+    :return: bytes
+    '''
+    lines = [line for line in ("".join(line.split()) for line in netspec.splitlines()) if line]
+    return hashlib.sha1("\n".join(lines if ordered else sorted(lines)).encode()).digest()
+
+
+def count_networks(network_object):
+    '''
+    Count the network specifications and the distinct networks among them (see canonical_key).
+    :param network_object: any input accepted by iter_networks
+    :return: (number of network specifications, number of distinct networks)
+    '''
+    num_networks = 0
+    keys = set()
+    for netspec in iter_networks(network_object):
+        num_networks += 1
+        keys.add(canonical_key(netspec))
+    return num_networks, len(keys)
+
+
+def report_duplicates(num_networks, num_distinct):
+    '''
+    Log the number of queries saved by querying every distinct network only once.
+    :param num_networks: number of network specifications
+    :param num_distinct: number of distinct networks
+    :return: None
+    '''
+    if num_distinct < num_networks:
+        print("Found {} distinct networks among {} network specifications; skipping {} duplicate queries.".format(
+            num_distinct, num_networks, num_networks - num_distinct))
+        sys.stdout.flush()
+
+
+def distinct_networks(networks, duplicates):
+    '''
+    Iterate lazily over the first specification of every distinct network (see canonical_key). Only the fixed size
+    keys of the networks seen so far are held in memory, and the text of a specification only when it is a duplicate.
+    :param networks: iterable of DSGRN network specifications
+    :param duplicates: dictionary that is filled with {canonical key : dictionary with the later specifications of the
+            same network as keys}
+    :return: generator of DSGRN network specifications
+    '''
+    seen = set()
+    for netspec in networks:
+        key = canonical_key(netspec)
+        if key not in seen:
+            seen.add(key)
+            yield netspec
+        else:
+            duplicates.setdefault(key, {})[netspec] = None
+
+
+def fan_out(results, duplicates):
+    '''
+    Copy the results of every distinct network to all its specifications, one network at a time.
+    :param results: iterable of (DSGRN network specification, result) pairs, keyed by the specifications yielded by
+            distinct_networks, such as the records of a checkpoint file
+    :param duplicates: dictionary filled by distinct_networks
+    :return: generator of (DSGRN network specification, result) pairs for every specification of every network
+    '''
+    for netspec, result in results:
+        yield netspec, result
+        if duplicates:
+            for copy in duplicates.get(canonical_key(netspec), {}):
+                if copy != netspec:
+                    yield copy, result
+
+
+def write_json(fname, items):
+    '''
+    Write a JSON object one entry at a time, so that results are never held in memory all at once. An existing file
+    is kept with the suffix ".old".
+    :param fname: path of the .json file
+    :param items: iterable of (key, value) pairs
+    :return: None. File is written.
+    '''
+    if os.path.exists(fname):
+        os.rename(fname, fname + ".old")
+    with open(fname, "w") as f:
+        f.write("{")
+        for i, (key, value) in enumerate(items):
+            f.write("{}{}: {}".format(", " if i else "", json.dumps(key), json.dumps(value)))
+        f.write("}")
+
+
+@lru_cache(maxsize=2**16)
+def network_names(netspec):
+    '''
+    Read the node names of a DSGRN network specification without constructing a DSGRN.Network. The specification is
+    parsed as DSGRN does: whitespace is ignored, empty lines and lines starting with "." or "@" are skipped, and the
+    node name is the text before the first colon. The results for the most recent specifications are cached, so the
+    preprocessing and the work functions of a process usually parse each specification only once, in bounded memory.
+    :param netspec: DSGRN network specification
+    :return: tuple of node names in canonical (sorted) order
+    '''
+    names = []
+    for line in netspec.splitlines():
+        line = "".join(line.split())
+        if line and line[0] not in ".@":
+            names.append(line.split(":")[0])
+    return tuple(sorted(names))
+
+
 def create_results_folder(network_file, params_file, resultsdir, datetime=None):
     '''
     Create a date-time stamped folder to save results. Copy over input files.
@@ -94,3 +228,67 @@ def create_results_folder(network_file, params_file, resultsdir, datetime=None):
         shutil.copy(params_file, inputfilesdir)
     return queriesdir
 
+
+def read_checkpoint(queriesdir):
+    '''
+    Iterate over the complete records of the checkpoint file in the results folder, skipping any partial line left by
+    an interrupted write.
+    :param queriesdir: path to the date-time stamped directory where results are saved
+    :return: generator of (key, value) pairs in the order they were recorded
+    '''
+    fname = os.path.join(queriesdir, "checkpoint.jsonl")
+    if os.path.exists(fname):
+        with open(fname) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield record["key"], record["value"]
+
+
+def open_checkpoint(queriesdir, resume=False, keys_only=False):
+    '''
+    Open the append-only checkpoint file in the results folder. Each line of the file is a JSON record
+    {"key" : key, "value" : value} that is written as soon as the corresponding unit of work finishes.
+    :param queriesdir: path to the date-time stamped directory where results are saved
+    :param resume: True or False, whether to keep the records of a previous run in the same directory
+    :param keys_only: True or False, whether to map every recorded key to None instead of holding the values in memory
+    :return: (dictionary of the records already in the checkpoint keyed by record key, file object opened for appending)
+    '''
+    fname = os.path.join(queriesdir, "checkpoint.jsonl")
+    records = {}
+    if resume and os.path.exists(fname):
+        # rewrite the complete records so that new records start on a fresh line
+        with open(fname + ".tmp", "w") as f:
+            for key, value in read_checkpoint(queriesdir):
+                records[key] = None if keys_only else value
+                f.write(json.dumps({"key" : key, "value" : value}) + "\n")
+        os.replace(fname + ".tmp", fname)
+    elif os.path.exists(fname):
+        os.rename(fname, fname + ".old")
+    return records, open(fname, "a")
+
+
+def append_checkpoint(checkpoint, key, value):
+    '''
+    Append one record to the checkpoint file and flush it to disk.
+    :param checkpoint: file object returned by open_checkpoint
+    :param key: string identifying the unit of work, usually the DSGRN network specification
+    :param value: JSON serializable result
+    :return: None
+    '''
+    checkpoint.write(json.dumps({"key" : key, "value" : value}) + "\n")
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
+
+
+def check_resume(params, resume):
+    '''
+    Resuming requires the results folder of the previous run, which is named by the datetime string.
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param resume: True or False
+    :return: None, errors are raised.
+    '''
+    if resume and "datetime" not in params:
+        raise ValueError("The key 'datetime' must be specified in the parameter file to resume a previous run. Use the datetime of the results folder to be resumed.")
@@ -0,0 +1,223 @@
+import DSGRN
+import sqlite3, json, os, time
+from dsgrn_net_query.utilities.profile_utilities import timed
+from dsgrn_net_query.utilities.file_utilities import canonical_key
+
+
+def network_key(network):
+    '''
+    Content hash of a network specification, used to key cached results, see file_utilities.canonical_key. The order
+    of the nodes is part of the key because it fixes the DSGRN parameter indices.
+    :param network: DSGRN.Network object
+    :return: hexadecimal string
+    '''
+    return canonical_key(network.specification(), ordered=True).hex()
+
+
+def morse_summary(domaingraph):
+    '''
+    Summarize the Morse graph of a DSGRN parameter.
+    :param domaingraph: DSGRN.DomainGraph object
+    :return: dictionary with the keys "annotations" (the annotation string of every Morse set) and "children" (the
+            list of the children of every Morse set in the Morse graph poset)
+    '''
+    morsegraph = timed("MorseGraph", DSGRN.MorseGraph, domaingraph)
+    poset = morsegraph.poset()
+    return {"annotations" : [morsegraph.annotation(i)[0] for i in range(poset.size())],
+            "children" : [list(poset.children(i)) for i in range(poset.size())]}
+
+
+def stable_indices(summary, prefix):
+    '''
+    :param summary: Morse graph summary, output of morse_summary
+    :param prefix: "FP" or "FC"
+    :return: list of the indices of the Morse sets with no children whose annotation starts with prefix
+    '''
+    return [i for i, (a, c) in enumerate(zip(summary["annotations"], summary["children"]))
+            if a.startswith(prefix) and len(c) == 0]
+
+
+def stable_annotations(summary, prefix):
+    '''
+    :param summary: Morse graph summary, output of morse_summary
+    :param prefix: "FP" or "FC"
+    :return: list of the annotations of the Morse sets with no children that start with prefix
+    '''
+    return [summary["annotations"][i] for i in stable_indices(summary, prefix)]
+
+
+def morse_graph(parameter):
+    '''
+    :param parameter: DSGRN.Parameter object
+    :return: DSGRN.MorseGraph object of the parameter
+    '''
+    return timed("MorseGraph", DSGRN.MorseGraph, timed("DomainGraph", DSGRN.DomainGraph, parameter))
+
+
+def has_stable(morsegraph, prefix):
+    '''
+    Check for a stable Morse set without summarizing the whole Morse graph. Only the Morse sets with no children are
+    annotated and the search stops at the first match. The Morse sets are tried from the last index because sinks tend
+    to have high indices; this is only a heuristic for finding a match sooner, the result does not depend on the order.
+    :param morsegraph: DSGRN.MorseGraph object
+    :param prefix: "FP" or "FC"
+    :return: True or False
+    '''
+    poset = morsegraph.poset()
+    return any(morsegraph.annotation(i)[0].startswith(prefix) for i in reversed(range(poset.size()))
+               if len(poset.children(i)) == 0)
+
+
+def count_stable(parametergraph, start, stop, prefix, count=True, morsecache=None):
+    '''
+    Count the DSGRN parameters in a chunk of the parameter graph that have a stable Morse set.
+    :param parametergraph: DSGRN.ParameterGraph object
+    :param start: first DSGRN parameter index in the chunk
+    :param stop: one past the last DSGRN parameter index in the chunk
+    :param prefix: "FP" or "FC"
+    :param count: True or False, count DSGRN parameters or stop at the first match
+    :param morsecache: optional MorseGraphCache object of the network
+    :return: number of DSGRN parameters in the chunk with a stable Morse set, at most 1 when count is False
+    '''
+    matches = 0
+    for p in range(start, stop):
+        if morsecache is not None:
+            found = morsecache.has_stable(p, prefix, parametergraph.parameter(p))
+        else:
+            found = has_stable(morse_graph(parametergraph.parameter(p)), prefix)
+        if found:
+            matches += 1
+            if not count:
+                break
+    return matches
+
+
+def open_morse_cache(params, network):
+    '''
+    Open the Morse graph cache for one network as configured in the parameter dictionary.
+    :param params: dictionary of parameters generated from the .json parameter file, with the optional keys
+            "morse_cache" : path to an SQLite file that persists Morse graph summaries across runs, default = no cache
+            "morse_cache_size" : maximum number of DSGRN parameters in the cache, default = 1000000
+    :param network: DSGRN.Network object
+    :return: MorseGraphCache object
+    '''
+    path = os.path.expanduser(params["morse_cache"]) if "morse_cache" in params else None
+    max_entries = params["morse_cache_size"] if "morse_cache_size" in params else 1000000
+    return MorseGraphCache(network, path, max_entries)
+
+
+class MorseGraphCache:
+    '''
+    Persistent cache of the Morse graph summaries of the DSGRN parameters of one network. The summaries are stored in an
+    SQLite file keyed by (content hash of the network specification, parameter index) and are shared by every query
+    module and every run that uses the same file, whatever the bounds, epsilons or time series. When the file holds more
+    than max_entries summaries, the least recently used networks are evicted. Without a path, summaries are computed
+    every time and nothing is stored.
+    '''
+
+    block_size = 10000
+
+    def __init__(self, network, path=None, max_entries=1000000):
+        '''
+        :param network: DSGRN.Network object
+        :param path: None or path to the SQLite cache file
+        :param max_entries: maximum number of summaries in the cache file
+        '''
+        self.path = path
+        self.max_entries = max_entries
+        self.key = network_key(network)
+        self.hits = 0
+        self.misses = 0
+        self._loaded = {}
+        self._blocks = set()
+        self._new = []
+        self._connection = None
+        if path is not None:
+            self._connection = sqlite3.connect(path, timeout=600)
+            with self._connection:
+                self._connection.execute("CREATE TABLE IF NOT EXISTS summaries (hash TEXT, param INTEGER, summary TEXT, PRIMARY KEY (hash, param))")
+                self._connection.execute("CREATE TABLE IF NOT EXISTS networks (hash TEXT PRIMARY KEY, last_used REAL, entries INTEGER)")
+
+    def _load_block(self, block):
+        rows = self._connection.execute("SELECT param, summary FROM summaries WHERE hash = ? AND param >= ? AND param < ?",
+                                        (self.key, block * self.block_size, (block + 1) * self.block_size))
+        self._loaded.update(rows)
+        self._blocks.add(block)
+
+    def summary(self, p, parameter=None, domaingraph=None):
+        '''
+        Fetch the Morse graph summary of a DSGRN parameter, computing and recording it on a miss.
+        :param p: DSGRN parameter index
+        :param parameter: DSGRN.Parameter object, only used on a miss when domaingraph is None
+        :param domaingraph: optional DSGRN.DomainGraph object of the parameter, to avoid recomputing it on a miss
+        :return: Morse graph summary, see morse_summary
+        '''
+        if self._connection is not None:
+            if p // self.block_size not in self._blocks:
+                self._load_block(p // self.block_size)
+            if p in self._loaded:
+                self.hits += 1
+                return json.loads(self._loaded.pop(p))
+        self.misses += 1
+        if domaingraph is None:
+            domaingraph = timed("DomainGraph", DSGRN.DomainGraph, parameter)
+        summary = morse_summary(domaingraph)
+        if self._connection is not None:
+            self._new.append((self.key, p, json.dumps(summary)))
+            if len(self._new) >= self.block_size:
+                self.flush()
+        return summary
+
+    def has_stable(self, p, prefix, parameter):
+        '''
+        Check the Morse graph of a DSGRN parameter for a stable Morse set. Without a cache file there is nothing to
+        record, so the check short-circuits with has_stable instead of computing the full summary.
+        :param p: DSGRN parameter index
+        :param prefix: "FP" or "FC"
+        :param parameter: DSGRN.Parameter object, only used on a miss
+        :return: True or False
+        '''
+        if self._connection is None:
+            self.misses += 1
+            return has_stable(morse_graph(parameter), prefix)
+        return len(stable_indices(self.summary(p, parameter), prefix)) > 0
+
+    def flush(self):
+        '''
+        Write the new summaries to the cache file and evict the least recently used networks if the file is full.
+        :return: None
+        '''
+        if self._connection is None:
+            return
+        with self._connection:
+            cursor = self._connection.executemany("INSERT OR IGNORE INTO summaries VALUES (?, ?, ?)", self._new)
+            self._connection.execute("INSERT OR IGNORE INTO networks VALUES (?, 0, 0)", (self.key,))
+            self._connection.execute("UPDATE networks SET last_used = ?, entries = entries + ? WHERE hash = ?",
+                                     (time.time(), max(cursor.rowcount, 0), self.key))
+            total = self._connection.execute("SELECT SUM(entries) FROM networks").fetchone()[0]
+            while total > self.max_entries:
+                row = self._connection.execute("SELECT hash, entries FROM networks WHERE hash != ? ORDER BY last_used LIMIT 1",
+                                               (self.key,)).fetchone()
+                if row is None:
+                    break
+                self._connection.execute("DELETE FROM summaries WHERE hash = ?", (row[0],))
+                self._connection.execute("DELETE FROM networks WHERE hash = ?", (row[0],))
+                total -= row[1]
+        self._new = []
+
+    def close(self):
+        '''
+        Flush the new summaries and close the cache file.
+        :return: None
+        '''
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def report(self):
+        '''
+        Summarize the use of the cache for the log.
+        :return: string
+        '''
+        return "Morse graph cache: {} hits, {} misses.".format(self.hits, self.misses)
@@ -1,10 +1,34 @@
 import DSGRN
+import numpy as np
+import hashlib, os
 from dsgrn_utilities import get_parameter_neighbors as neighbors
 
 
-def get_neighbors(ess_netspec):
+def get_neighbors(ess_netspec, cache_dir=None):
+    '''
+    Find the essential DSGRN parameters of a network and their neighbors in the parameter graph of the non-essential
+    version of the network. This is computationally expensive, so the result can be kept in a cache directory that is
+    shared by all processes and all runs.
+    :param ess_netspec: DSGRN network specification
+    :param cache_dir: optional path to a directory with one .npz file per network, keyed by a hash of ess_netspec,
+            default = no cache
+    :return: (non-essential DSGRN network specification, list of DSGRN parameter indices in its parameter graph)
+    '''
+    if cache_dir is not None:
+        fname = os.path.join(cache_dir, hashlib.sha256(ess_netspec.encode()).hexdigest() + ".npz")
+        if os.path.exists(fname):
+            with np.load(fname) as data:
+                if str(data["ess_netspec"]) == ess_netspec:
+                    return str(data["noness_netspec"]), data["paramlist"].tolist()
     ess, noness_net_spec = neighbors.make_nonessential(ess_netspec)
     noness_pg = DSGRN.ParameterGraph(DSGRN.Network(noness_net_spec))
     ess_params, nbrs = neighbors.get_essential_parameter_neighbors(noness_pg)
     paramlist = ess_params + nbrs
-    return noness_net_spec, paramlist
\ No newline at end of file
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write under a unique name and rename, so that other processes never read a partial file
+        tmpname = "{}.{}.tmp.npz".format(fname[:-4], os.getpid())
+        np.savez_compressed(tmpname, ess_netspec=np.array(ess_netspec), noness_netspec=np.array(noness_net_spec),
+                            paramlist=np.array(paramlist, dtype=np.int64))
+        os.replace(tmpname, fname)
+    return noness_net_spec, paramlist
@@ -0,0 +1,177 @@
+import DSGRN
+import time, sys
+from collections import OrderedDict
+from dsgrn_net_query.utilities.morsegraph_utilities import morse_summary, stable_indices
+from dsgrn_net_query.utilities.profile_utilities import timed
+
+# Per-process cache of pattern graphs. Pattern graphs depend only on the network and the posets, so every worker
+# builds them once per network and reuses them for every DSGRN parameter.
+_patterngraph_cache = OrderedDict()
+_patterngraph_cache_size = 8
+_patterngraph_last = (None, None, None)
+_patterngraph_stats = {"hits" : 0, "builds" : 0, "build_time" : 0.0}
+
+
+def get_patterngraphs(network, posets, log_builds=False):
+    '''
+    Construct the DSGRN pattern graphs for every time series and epsilon, or fetch them from the per-process cache.
+    :param network: DSGRN.Network object
+    :param posets: dictionary keyed by time series file name with a list of (eps, (events, event_ordering)) tuples
+    :param log_builds: True or False, print the cache counters whenever new pattern graphs are built
+    :return: dictionary keyed by time series file name with a list of (eps, DSGRN.PatternGraph) tuples
+    '''
+    global _patterngraph_last
+    # fast path for repeated calls with the same objects inside a parameter loop
+    if network is _patterngraph_last[0] and posets is _patterngraph_last[1]:
+        _patterngraph_stats["hits"] += 1
+        return _patterngraph_last[2]
+    # work functions receive fresh copies of the network and posets for every task, so also key on content
+    key = (network.specification(), repr(posets))
+    if key in _patterngraph_cache:
+        _patterngraph_stats["hits"] += 1
+        _patterngraph_cache.move_to_end(key)
+    else:
+        start = time.perf_counter()
+        _patterngraph_cache[key] = {tsfile : [(eps, DSGRN.PatternGraph(DSGRN.PosetOfExtrema(network, events, event_ordering)))
+                                    for (eps, (events, event_ordering)) in poset_list] for tsfile, poset_list in posets.items()}
+        _patterngraph_stats["builds"] += 1
+        _patterngraph_stats["build_time"] += time.perf_counter() - start
+        if len(_patterngraph_cache) > _patterngraph_cache_size:
+            _patterngraph_cache.popitem(last=False)
+        if log_builds:
+            print(patterngraph_cache_report())
+            sys.stdout.flush()
+    _patterngraph_last = (network, posets, _patterngraph_cache[key])
+    return _patterngraph_last[2]
+
+
+def patterngraph_cache_report():
+    '''
+    Summarize the use of the per-process pattern graph cache for the log.
+    :return: string
+    '''
+    return "Pattern graph cache: {} hits, {} builds, {:.4f} s build time.".format(
+        _patterngraph_stats["hits"], _patterngraph_stats["builds"], _patterngraph_stats["build_time"])
+
+
+def patterngraph_counters():
+    '''
+    :return: copy of the counters of the per-process pattern graph cache
+    '''
+    return dict(_patterngraph_stats)
+
+
+def cache_counters(before, morsecache):
+    '''
+    Counters of one unit of work, which the root process adds up so that the caches are reported once per run instead
+    of once per unit of work.
+    :param before: output of patterngraph_counters at the start of the unit of work
+    :param morsecache: MorseGraphCache object of the unit of work
+    :return: dictionary of counters
+    '''
+    counters = {key : value - before[key] for key, value in _patterngraph_stats.items()}
+    counters["morse_hits"] = morsecache.hits
+    counters["morse_misses"] = morsecache.misses
+    return counters
+
+
+def cache_report(counters, morse_cache=False):
+    '''
+    Summarize the use of the pattern graph cache and, optionally, the Morse graph cache for the log.
+    :param counters: sum of the outputs of cache_counters
+    :param morse_cache: True or False, whether a Morse graph cache file is in use
+    :return: string
+    '''
+    report = "Pattern graph cache: {} hits, {} builds, {:.4f} s build time.".format(
+        counters.get("hits", 0), counters.get("builds", 0), counters.get("build_time", 0.0))
+    if morse_cache:
+        report += "\nMorse graph cache: {} hits, {} misses.".format(counters.get("morse_hits", 0), counters.get("morse_misses", 0))
+    return report
+
+
+class ParameterAnalysis:
+    '''
+    DSGRN computations for a single DSGRN parameter that do not depend on the poset being matched. The search graph of
+    the whole domain graph, the Morse graph summary, the indices of the stable full cycles and their search graphs are each
+    computed at most once and then shared by every (time series, epsilon) pattern match.
+    '''
+
+    def __init__(self, parameter, morsecache=None, index=None):
+        '''
+        :param parameter: DSGRN.Parameter object
+        :param morsecache: optional MorseGraphCache object of the network, used to look up the Morse graph
+        :param index: DSGRN parameter index, required with morsecache
+        '''
+        self.domaingraph = timed("DomainGraph", DSGRN.DomainGraph, parameter)
+        self._morsecache = morsecache
+        self._index = index
+        self._searchgraph = None
+        self._summary = None
+        self._stable_fc = None
+        self._stable_fc_searchgraphs = {}
+
+    def searchgraph(self):
+        '''
+        :return: DSGRN.SearchGraph object for the whole domain graph
+        '''
+        if self._searchgraph is None:
+            self._searchgraph = timed("SearchGraph", DSGRN.SearchGraph, self.domaingraph)
+        return self._searchgraph
+
+    def summary(self):
+        '''
+        :return: Morse graph summary, see morsegraph_utilities.morse_summary
+        '''
+        if self._summary is None:
+            if self._morsecache is None:
+                self._summary = morse_summary(self.domaingraph)
+            else:
+                self._summary = self._morsecache.summary(self._index, domaingraph=self.domaingraph)
+        return self._summary
+
+    def stable_fc(self):
+        '''
+        :return: list of the indices of the Morse sets that are stable full cycles
+        '''
+        if self._stable_fc is None:
+            self._stable_fc = stable_indices(self.summary(), "FC")
+        return self._stable_fc
+
+    def stable_fc_searchgraph(self, i):
+        '''
+        :param i: index of a stable full cycle in the Morse graph
+        :return: DSGRN.SearchGraph object restricted to the Morse set i
+        '''
+        if i not in self._stable_fc_searchgraphs:
+            self._stable_fc_searchgraphs[i] = timed("SearchGraph", DSGRN.SearchGraph, self.domaingraph, i)
+        return self._stable_fc_searchgraphs[i]
+
+
+def domain_check(analysis, patterngraph):
+    '''
+    Check for match in domain graph for one parameter
+    :param analysis: ParameterAnalysis object
+    :param patterngraph: DSGRN pattern graph object
+    :return: True or False
+    '''
+    ismatch = False
+    matchinggraph = timed("MatchingGraph", DSGRN.MatchingGraph, analysis.searchgraph(), patterngraph)
+    if timed("PathMatch", DSGRN.PathMatch, matchinggraph):
+        ismatch = True
+    return ismatch
+
+
+def stableFC_check(analysis, patterngraph):
+    '''
+    Check for match in any stable full cycle for one parameter
+    :param analysis: ParameterAnalysis object
+    :param patterngraph: DSGRN pattern graph object
+    :return: True or False for the existence of a match and True or False for the existence of a stable full cycle
+    '''
+    ismatch = False
+    for i in analysis.stable_fc():
+        matchinggraph = timed("MatchingGraph", DSGRN.MatchingGraph, analysis.stable_fc_searchgraph(i), patterngraph)
+        if timed("PathMatch", DSGRN.PathMatch, matchinggraph):
+            ismatch = True
+            break
+    return ismatch, len(analysis.stable_fc()) > 0
@@ -1,44 +1,168 @@
-import DSGRN
+import hashlib, os, pickle
+from functools import lru_cache
 from min_interval_posets.curve import Curve
 from min_interval_posets.posets import eps_posets
-from dsgrn_net_query.utilities.file_utilities import readcol,readrow
+from dsgrn_net_query.utilities.file_utilities import readcol,readrow,network_names
 
 
-def calculate_poset(params, networks):
+@lru_cache(maxsize=8)
+def read_time_series(ts_file, row_format):
+    '''
+    Read a time series file once per process.
+    :param ts_file: a .csv or .tsv file name
+    :param row_format: True if time series are in rows, False if they are in columns.
+    :return: A dictionary keying gene names to individual time series, and a 1D array of times
+    '''
+    return readrow(ts_file) if row_format else readcol(ts_file)
+
+
+def calculate_poset(params, networks, executor=None):
     '''
     Construct partial orders of extrema from time series files
     :param params: A dictionary with the keys
                     'timeseriesfname' : a .csv or .tsv file name
                     'tsfile_is_row_format' : True if time series are in rows, False if they are in columns.
                     "epsilons" : a list of noise values between 0.0 and 0.5
+                    "poset_cache" : optional True or False, whether to reuse the posets saved next to the time series
+                    file by previous runs (see load_poset_cache), default = False
 
     :param networks: a list of DSGRN network specifications
+    :param executor: optional executor over which the posets of distinct sets of node names are computed in parallel
     :return: (1) A dictionary of partially ordered sets keyed by sets of node names in network files. Any input network
             that has a node name that is not in the time series file will not be analyzed. (2) The list of pruned networks.
             (3) The set of names that were missing from the time series files.
     '''
-    data, times = readrow(params['timeseriesfname']) if params['tsfile_is_row_format'] else readcol(
-        params['timeseriesfname'])
+    posets, todo, new_networks, missing_names, cache = find_posets(params, networks)
+    compute_posets([(params, posets, todo, cache)], executor)
+    return posets, new_networks, missing_names
+
+
+def find_posets(params, networks):
+    '''
+    Find the sets of node names of the networks that can be matched to a time series file and the posets that are
+    already in the poset cache.
+    :param params: A dictionary with the keys of calculate_poset
+    :param networks: a list of DSGRN network specifications
+    :return: (1) A dictionary of the cached partially ordered sets keyed by sets of node names. (2) The list of the sets
+            of node names whose posets must be computed. (3) The list of pruned networks. (4) The set of names that were
+            missing from the time series file. (5) The poset cache to update and save, or None.
+    '''
+    ts_file, row_format = params['timeseriesfname'], params['tsfile_is_row_format']
+    cache = None
+    if "poset_cache" in params and params["poset_cache"]:
+        cache = load_poset_cache(ts_file, row_format)
+    save = cache is not None and cache["names"] is None
+    if cache is None or cache["names"] is None:
+        data, _ = read_time_series(ts_file, row_format)
+        available = set(data)
+        if cache is not None:
+            cache["names"] = sorted(str(name) for name in available)
+    else:
+        available = set(cache["names"])
     posets = {}
+    todo = []
     new_networks = []
     missing_names = set([])
+    pending = set()
     for networkspec in networks:
-        network = DSGRN.Network(networkspec)
-        names = tuple(sorted([network.name(k) for k in range(network.size())]))
-        missing_names = missing_names.union(set(name for name in names if name not in data))
+        names = network_names(networkspec)
+        missing_names = missing_names.union(set(name for name in names if name not in available))
         if set(names).intersection(missing_names):
             continue
-        if names not in posets.keys():
-            curves = [Curve(data[name], times, True) for name in names]
-            pos = eps_posets(dict(zip(names, curves)), params["epsilons"])
-            if pos is None:
-                raise ValueError("poset is None!")
-            posets[names] = pos
+        if names not in posets.keys() and names not in pending:
+            key = (names, tuple(params["epsilons"]))
+            if cache is not None and key in cache["posets"]:
+                posets[names] = cache["posets"][key]
+            else:
+                todo.append(names)
+                pending.add(names)
         new_networks.append(networkspec)
-    return posets, new_networks, missing_names
+    return posets, todo, new_networks, missing_names, cache if save or todo else None
+
+
+def compute_poset(task):
+    '''
+    Work function for parallelization.
+    :param task: (time series file name, row format, tuple of epsilons, tuple of node names)
+    :return: list of (epsilon, poset) pairs, output of eps_posets
+    '''
+    ts_file, row_format, epsilons, names = task
+    data, times = read_time_series(ts_file, row_format)
+    curves = [Curve(data[name], times, True) for name in names]
+    pos = eps_posets(dict(zip(names, curves)), list(epsilons))
+    if pos is None:
+        raise ValueError("poset is None!")
+    return pos
+
+
+def compute_posets(plans, executor=None):
+    '''
+    Compute the missing posets of one or more time series files, in parallel over (time series file, node names) pairs
+    if an executor is given, and update the poset caches.
+    :param plans: list of (params, posets, todo, cache) tuples, where params is the parameter dictionary of one time
+            series file and the rest is output of find_posets
+    :param executor: optional executor, default = compute serially
+    :return: None, the posets dictionaries are updated in place.
+    '''
+    tasks = [(params['timeseriesfname'], params['tsfile_is_row_format'], tuple(params["epsilons"]), names)
+             for params, _, todo, _ in plans for names in todo]
+    results = iter((executor.map if executor is not None else map)(compute_poset, tasks))
+    for params, posets, todo, cache in plans:
+        for names in todo:
+            posets[names] = next(results)
+            if cache is not None:
+                cache["posets"][(names, tuple(params["epsilons"]))] = posets[names]
+        if cache is not None:
+            save_poset_cache(params['timeseriesfname'], cache)
+
+
+def poset_cache_file(ts_file):
+    '''
+    :param ts_file: path to a time series file
+    :return: path to the hidden poset cache file in the same directory as the time series file
+    '''
+    head, tail = os.path.split(ts_file)
+    return os.path.join(head, "." + tail + ".posets.pkl")
+
+
+def load_poset_cache(ts_file, row_format):
+    '''
+    Load the posets previously computed from a time series file. The cache is only valid for the same file contents
+    (SHA-256 hash) and the same row or column format; within it the posets are keyed by (tuple of names, tuple of epsilons).
+    :param ts_file: path to a .csv or .tsv time series file
+    :param row_format: True if time series are in rows, False if they are in columns
+    :return: dictionary with the keys "hash", "row_format", "names" (names of the time series in the file, or None if
+            unknown) and "posets"
+    '''
+    with open(ts_file, "rb") as f:
+        filehash = hashlib.sha256(f.read()).hexdigest()
+    fname = poset_cache_file(ts_file)
+    if os.path.exists(fname):
+        try:
+            with open(fname, "rb") as f:
+                cache = pickle.load(f)
+            if cache["hash"] == filehash and cache["row_format"] == row_format:
+                return cache
+        except (pickle.UnpicklingError, EOFError, KeyError, TypeError):
+            pass
+    return {"hash" : filehash, "row_format" : row_format, "names" : None, "posets" : {}}
 
 
-def calculate_posets_from_multiple_time_series(params,networks):
+def save_poset_cache(ts_file, cache):
+    '''
+    Save the poset cache of a time series file, replacing the previous one in a single step.
+    :param ts_file: path to a .csv or .tsv time series file
+    :param cache: output of load_poset_cache with added posets
+    :return: None
+    '''
+    fname = poset_cache_file(ts_file)
+    tmpname = "{}.{}.tmp".format(fname, os.getpid())
+    with open(tmpname, "wb") as f:
+        pickle.dump(cache, f)
+    os.replace(tmpname, fname)
+
+
+def calculate_posets_from_multiple_time_series(params,networks,executor=None):
     '''
     Calculate partially ordered sets of extrema for each epsilon in a list and for each time series in a list.
 
@@ -47,7 +171,10 @@ def calculate_posets_from_multiple_time_series(params,networks):
                     'tsfile_is_row_format' : True if time series are in rows, False if they are in columns.
                                     **NOTE** : All time series must in the same format, row or column
                     "epsilons" : a list of floating point noise values between 0.0 and 0.5
+                    "poset_cache" : optional True or False, whether to reuse posets saved by previous runs, default = False
     :param networks: Either a list of network specifications or a .txt file containing a list of network specifications
+    :param executor: optional executor over which the posets are computed in parallel for every (time series file, set
+            of node names) pair, default = compute serially
     :return: A dictionary of partial orders for multiple time series and a set of networks that will be pattern matched
             across all time series.
     '''
@@ -57,15 +184,21 @@ def calculate_posets_from_multiple_time_series(params,networks):
         timeseries_files = params['timeseriesfname']
     else:
         raise ValueError("Input time series file names must be a string or a list of strings.")
-    params_single = {"tsfile_is_row_format" : params["tsfile_is_row_format"], "epsilons" : params["epsilons"].copy()}
     new_networks = set([])
     posets = {}
     missing_names = set()
+    plans = []
     for ts_file in timeseries_files:
-        params_single["timeseriesfname"] = ts_file
-        pos, nets, msn = calculate_poset(params_single,networks)
+        params_single = {"timeseriesfname" : ts_file, "tsfile_is_row_format" : params["tsfile_is_row_format"],
+                         "epsilons" : params["epsilons"].copy(),
+                         "poset_cache" : params["poset_cache"] if "poset_cache" in params else False}
+        pos, todo, nets, msn, cache = find_posets(params_single,networks)
+        plans.append((params_single, pos, todo, cache))
         new_networks.update(nets)
         missing_names.update(msn)
+    compute_posets(plans, executor)
+    for params_single, pos, _, _ in plans:
+        ts_file = params_single["timeseriesfname"]
         for name,val in pos.items():
             if name not in posets:
                 posets[name] = {ts_file : val}
@@ -73,24 +206,37 @@ def calculate_posets_from_multiple_time_series(params,networks):
                 posets[name][ts_file] = val
     if missing_names:
         print(
-            "No time series data for node(s) {} in at least one time series file. \nSkipping pattern matches whenever there is a missing time series.\nContinuing with {} networks.".format(
-                missing_names, len(new_networks)))
+            "No time series data for node(s) {} in at least one time series file. \nSkipping pattern matches whenever there is a missing time series.\nContinuing with the other networks.".format(
+                missing_names))
     return posets, new_networks
 
 
 def check_posets(networks,posets):
     new_networks = []
     missing_names = set([])
+    poset_names = set([n for nodes in posets for n in nodes])
     for networkspec in networks:
-        network = DSGRN.Network(networkspec)
-        names = tuple(sorted([network.name(k) for k in range(network.size())]))
-        poset_names = set([n for nodes in posets for n in nodes])
+        names = network_names(networkspec)
         missing_names = missing_names.union(set(name for name in names if name not in poset_names))
         if set(names).intersection(missing_names):
             continue
         new_networks.append(networkspec)
     if missing_names:
         print(
-            "No data for node(s) {} in at least one partially ordered set. \nSkipping pattern matches whenever there is a missing name.\nContinuing with {} networks.".format(
-                sorted(missing_names), len(new_networks)))
+            "No data for node(s) {} in at least one partially ordered set. \nSkipping pattern matches whenever there is a missing name.\nContinuing with the other networks.".format(
+                sorted(missing_names)))
     return new_networks
+
+
+def node_name_sets(networks):
+    '''
+    One network specification for every distinct set of node names, in order of first appearance. The posets of a
+    network depend only on its node names, so a stream of networks can be pruned and its posets computed from these,
+    without holding every network in memory.
+    :param networks: iterable of DSGRN network specifications
+    :return: list of DSGRN network specifications
+    '''
+    first = {}
+    for networkspec in networks:
+        first.setdefault(network_names(networkspec), networkspec)
+    return list(first.values())
@@ -0,0 +1,127 @@
+import json, os, sys, time
+from functools import partial
+
+# Per-process stage timers. They are switched on by profiled_call for the duration of one unit of work, so a run
+# without the key "profile" pays one flag check per DSGRN computation.
+_enabled = False
+_stage_times = {}
+
+
+def timed(stage, fn, *args):
+    '''
+    Call fn, adding the time spent to the cumulative time of a stage while a profiled unit of work is running.
+    :param stage: name of the stage, for example "DomainGraph"
+    :param fn: function, usually a DSGRN constructor
+    :param args: arguments to fn
+    :return: result of fn
+    '''
+    if not _enabled:
+        return fn(*args)
+    start = time.perf_counter()
+    result = fn(*args)
+    times = _stage_times.setdefault(stage, [0.0, 0])
+    times[0] += time.perf_counter() - start
+    times[1] += 1
+    return result
+
+
+def worker_id():
+    '''
+    :return: MPI rank of the process with the "mpi" backend, otherwise its process id
+    '''
+    if "mpi4py.MPI" in sys.modules:
+        return "rank {}".format(sys.modules["mpi4py.MPI"].COMM_WORLD.Get_rank())
+    return "pid {}".format(os.getpid())
+
+
+def profiled_call(fn, key, item):
+    '''
+    Work function wrapper that measures one unit of work and the DSGRN stages inside it.
+    :param fn: work function
+    :param key: function that maps the argument of fn to the label of its network
+    :param item: argument to fn
+    :return: (result of fn, profile record) pair
+    '''
+    global _enabled
+    _enabled = True
+    _stage_times.clear()
+    start = time.perf_counter()
+    try:
+        result = fn(item)
+    finally:
+        _enabled = False
+    record = {"network" : key(item), "worker" : worker_id(), "seconds" : time.perf_counter() - start,
+              "stages" : {stage : list(times) for stage, times in _stage_times.items()}}
+    return result, record
+
+
+class Profile:
+    '''
+    Profile of a query run on the root process. With the key "profile" in the parameter dictionary, every unit of
+    work reports the cumulative time of each DSGRN stage (DomainGraph, MorseGraph, SearchGraph, MatchingGraph,
+    PathMatch) along with its own running time and worker, and the profile is summarized per stage, per network and per
+    worker in the file profile.json in the results folder. Without the key, wrap and unwrap return their arguments and
+    nothing is recorded.
+    '''
+
+    def __init__(self, params, backend="mpi"):
+        '''
+        :param params: dictionary of parameters generated from the .json parameter file, with the optional key
+                "profile" : True or False (true or false in .json format), default = False
+        :param backend: name of the backend, see executor_utilities.get_backend
+        '''
+        self.enabled = "profile" in params and params["profile"] is True
+        self.backend = backend
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.networks = {}
+        self.workers = {}
+
+    def wrap(self, fn, key):
+        '''
+        :param fn: work function
+        :param key: picklable function that maps the argument of fn to the label of its network
+        :return: work function that also returns a profile record, or fn when profiling is disabled
+        '''
+        return partial(profiled_call, fn, key) if self.enabled else fn
+
+    def unwrap(self, outputs):
+        '''
+        :param outputs: iterable of the outputs of the wrapped work function
+        :return: iterable of the results of the original work function
+        '''
+        return self._collect(outputs) if self.enabled else outputs
+
+    def _collect(self, outputs):
+        for result, record in outputs:
+            network = self.networks.setdefault(record["network"], {"seconds" : 0.0, "units" : 0, "stages" : {}})
+            worker = self.workers.setdefault(record["worker"], {"busy" : 0.0, "units" : 0})
+            for totals in [network, worker]:
+                totals["units"] += 1
+            network["seconds"] += record["seconds"]
+            worker["busy"] += record["seconds"]
+            for stage, (seconds, calls) in record["stages"].items():
+                for stages in [network["stages"], self.stages]:
+                    times = stages.setdefault(stage, {"seconds" : 0.0, "calls" : 0})
+                    times["seconds"] += seconds
+                    times["calls"] += calls
+            yield result
+
+    def write(self, resultsdir):
+        '''
+        Write the profile to profile.json in the results folder and log a summary. The idle time of a worker is the
+        wall time of the run minus the time it spent on units of work.
+        :param resultsdir: The date-time stamped directory in which to save the profile.
+        :return: None. File is written when profiling is enabled.
+        '''
+        if not self.enabled:
+            return
+        wall = time.perf_counter() - self.start
+        for worker in self.workers.values():
+            worker["idle"] = max(wall - worker["busy"], 0.0)
+        profile = {"backend" : self.backend, "wall_time" : wall, "stages" : self.stages, "workers" : self.workers,
+                   "networks" : self.networks}
+        json.dump(profile, open(os.path.join(resultsdir, "profile.json"), "w"), indent=1)
+        print("Profile: {:.2f} s wall time; {}.".format(wall, ", ".join("{} {:.2f} s".format(stage, times["seconds"])
+              for stage, times in sorted(self.stages.items(), key=lambda s: -s[1]["seconds"])) or "no DSGRN stages"))
+        sys.stdout.flush()
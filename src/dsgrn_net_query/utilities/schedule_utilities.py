@@ -0,0 +1,216 @@
+import DSGRN
+import time, heapq, sys
+from functools import lru_cache, partial
+from itertools import islice
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+def parameter_graph_size(netspec):
+    '''
+    Work function for sizing networks in parallel before the parameter graph is split into chunks.
+    :param netspec: DSGRN network specification
+    :return: size of the DSGRN parameter graph
+    '''
+    return DSGRN.ParameterGraph(DSGRN.Network(netspec)).size()
+
+
+def sized_network(enum_network):
+    '''
+    Work function for sizing a stream of networks in parallel.
+    :param enum_network: (network index, DSGRN network specification) pair
+    :return: (network index, DSGRN network specification, size of the DSGRN parameter graph) tuple
+    '''
+    k, netspec = enum_network
+    return k, netspec, parameter_graph_size(netspec)
+
+
+def split_chunks(sized_networks, chunk_size, chunked):
+    '''
+    Split the parameter graph of every network into chunks of consecutive DSGRN parameter indices, one network at a
+    time.
+    :param sized_networks: iterable of (network index, DSGRN network specification, parameter graph size) tuples
+    :param chunk_size: maximum number of DSGRN parameters in a chunk
+    :param chunked: dictionary that is filled with {network index : (DSGRN network specification, parameter graph
+            size, number of chunks)} before the chunks of the network are yielded
+    :return: generator of (network index, network specification, start, stop) tuples, with parameter indices
+             start <= p < stop
+    '''
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be a positive integer.")
+    for k, netspec, size in sized_networks:
+        starts = range(0, size, chunk_size)
+        chunked[k] = (netspec, size, len(starts))
+        for start in starts:
+            yield (k, netspec, start, min(start + chunk_size, size))
+
+
+@lru_cache(maxsize=1)
+def get_parameter_graph(netspec):
+    '''
+    Construct the DSGRN network and parameter graph once per worker process and reuse them for every chunk of the
+    same network.
+    :param netspec: DSGRN network specification
+    :return: (DSGRN.Network object, DSGRN.ParameterGraph object)
+    '''
+    network = DSGRN.Network(netspec)
+    return network, DSGRN.ParameterGraph(network)
+
+
+def imap_unordered(executor, fn, iterable, window=None, skip=None):
+    '''
+    Submit fn for every item and yield the results in order of completion, so that results can be recorded as soon
+    as they are available. With a window, the iterable is consumed lazily and at most window items are pending at any
+    time, so a stream of work is submitted as it is read instead of being held in memory.
+    :param executor: executor object on the root process
+    :param fn: work function
+    :param iterable: iterable of arguments to fn
+    :param window: optional maximum number of pending items, default = submit everything at once
+    :param skip: optional function of an item that returns True when its result is no longer needed. Such items are
+            not submitted, and pending items are cancelled as long as they have not started, so their results are
+            never yielded. Items that have already started still yield their results.
+    :return: generator of results
+    '''
+    if window is not None and window < 1:
+        raise ValueError("The submission window must be a positive integer.")
+    items = iter(iterable) if skip is None else (item for item in iterable if not skip(item))
+    pending = {executor.submit(fn, item) : item for item in islice(items, window)}
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        if skip is not None:
+            done.update(future for future, item in pending.items() if future not in done and skip(item) and future.cancel())
+        for future in done:
+            del pending[future]
+        pending.update((executor.submit(fn, item), item) for item in islice(items, len(done)))
+        for future in done:
+            if not future.cancelled():
+                yield future.result()
+
+
+def network_cost(size, params, num_posets=1):
+    '''
+    Predicted cost of querying DSGRN parameters, used to order the work longest first. Without the key "cost_model"
+    the cost is the number of DSGRN parameters. The cost model is a dictionary of weights with the optional keys
+    "parameter" (cost of the Morse graph of one DSGRN parameter, default = 1), "domain" and "stablefc" (cost of one
+    pattern match of one poset in the domain graph or in the stable full cycles, default = 1), so that the cost is
+        size * (parameter + num_posets * (domain * params["domain"] + stablefc * params["stablefc"]))
+    :param size: number of DSGRN parameters
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param num_posets: number of posets matched at every DSGRN parameter
+    :return: float
+    '''
+    if "cost_model" not in params:
+        return float(size)
+    weights = {"parameter" : 1.0, "domain" : 1.0, "stablefc" : 1.0}
+    weights.update(params["cost_model"])
+    searches = sum(weights[s] for s in ["domain", "stablefc"] if s in params and params[s])
+    return size * (weights["parameter"] + num_posets * searches)
+
+
+def timed_call(fn, indexed_item):
+    '''
+    Work function wrapper that measures the time spent on one item.
+    :param fn: work function
+    :param indexed_item: (index, argument to fn) pair
+    :return: (index, seconds, result of fn) tuple
+    '''
+    i, item = indexed_item
+    start = time.perf_counter()
+    result = fn(item)
+    return i, time.perf_counter() - start, result
+
+
+def makespan(durations, num_workers):
+    '''
+    Simulate list scheduling, where every task in turn goes to the first free worker.
+    :param durations: task durations in order of submission
+    :param num_workers: number of workers
+    :return: time at which the last task finishes
+    '''
+    finish = [0.0] * max(num_workers, 1)
+    for d in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + d)
+    return max(finish)
+
+
+def lpt_imap_unordered(executor, fn, items, costs, num_workers, skip=None):
+    '''
+    Submit the items longest processing time first (LPT) by predicted cost and yield the results in order of
+    completion. Afterwards, report the makespan predicted from the costs, with the time per unit of cost measured over
+    all items, against the actual makespan and the makespan that the measured task times would have given in the
+    original order.
+    :param executor: executor object on the root process
+    :param fn: work function
+    :param items: list of arguments to fn
+    :param costs: list of predicted costs in the same order as items
+    :param num_workers: number of worker processes
+    :param skip: optional function of an item that returns True when its result is no longer needed, see
+            imap_unordered
+    :return: generator of results
+    '''
+    order = sorted(range(len(items)), key=lambda i: costs[i], reverse=True)
+    durations = [0.0] * len(items)
+    start = time.perf_counter()
+    skip_indexed = (lambda indexed_item: skip(indexed_item[1])) if skip else None
+    for i, seconds, result in imap_unordered(executor, partial(timed_call, fn), [(i, items[i]) for i in order], skip=skip_indexed):
+        durations[i] = seconds
+        yield result
+    actual = time.perf_counter() - start
+    if items and sum(costs) > 0:
+        rate = sum(durations) / sum(costs)
+        predicted = makespan([costs[i] for i in order], num_workers) * rate
+        print("LPT schedule of {} tasks over {} workers: predicted makespan {:.2f} s, actual {:.2f} s, in original order {:.2f} s.".format(
+            len(items), num_workers, predicted, actual, makespan(durations, num_workers)))
+        sys.stdout.flush()
+
+
+def imap_networks(executor, fn, todo, params, num_workers):
+    '''
+    Query networks in parallel and yield the results in order of completion. By default the networks are submitted in
+    file order as they are read, at most params["window"] (default = 1000) at a time. With params["schedule"] = "lpt"
+    the parameter graphs of all networks are sized first and the networks are submitted largest first, see
+    lpt_imap_unordered and network_cost.
+    :param executor: executor object on the root process
+    :param fn: work function
+    :param todo: iterable of (network index, DSGRN network specification) pairs
+    :param params: dictionary of parameters generated from the .json parameter file
+    :param num_workers: number of worker processes
+    :return: generator of results
+    '''
+    if "schedule" in params and params["schedule"] == "lpt":
+        todo = list(todo)
+        sizes = list(executor.map(parameter_graph_size, [netspec for _, netspec in todo]))
+        return lpt_imap_unordered(executor, fn, todo, [network_cost(size, params) for size in sizes], num_workers)
+    return imap_unordered(executor, fn, todo, params["window"] if "window" in params else 1000)
+
+
+def imap_chunks(executor, fn, todo, params, num_workers, chunked, cost=None, skip=None):
+    '''
+    Query chunks of the parameter graphs of networks in parallel and yield the results in order of completion. By
+    default the networks are read as they are needed and sized on the workers, at most params["window"]
+    (default = 1000) at a time, and the chunks of a network are submitted as soon as its size is known, again at most
+    params["window"] at a time. With params["schedule"] = "lpt" the parameter graphs of all networks are sized first
+    and the chunks are submitted largest predicted cost first, see lpt_imap_unordered and network_cost.
+    :param executor: executor object on the root process
+    :param fn: work function of a (network index, DSGRN network specification, start, stop) chunk
+    :param todo: iterable of (network index, DSGRN network specification) pairs
+    :param params: dictionary of parameters generated from the .json parameter file, with the optional key
+            "chunk_size", the maximum number of DSGRN parameters in a chunk, default = 1000
+    :param num_workers: number of worker processes
+    :param chunked: dictionary that is filled with {network index : (DSGRN network specification, parameter graph
+            size, number of chunks)} before any result of the network is yielded
+    :param cost: optional function of a DSGRN network specification and a number of DSGRN parameters returning the
+            predicted cost of a chunk for the "lpt" schedule, default = network_cost with params
+    :param skip: optional function of a chunk that returns True when its result is no longer needed, see
+            imap_unordered
+    :return: generator of results
+    '''
+    chunk_size = params["chunk_size"] if "chunk_size" in params else 1000
+    if "schedule" in params and params["schedule"] == "lpt":
+        todo = list(todo)
+        sizes = executor.map(parameter_graph_size, [netspec for _, netspec in todo])
+        chunks = list(split_chunks(((k, netspec, size) for (k, netspec), size in zip(todo, sizes)), chunk_size, chunked))
+        costs = [cost(netspec, stop - start) if cost else network_cost(stop - start, params) for (_, netspec, start, stop) in chunks]
+        return lpt_imap_unordered(executor, fn, chunks, costs, num_workers, skip)
+    window = params["window"] if "window" in params else 1000
+    sized = imap_unordered(executor, sized_network, todo, window)
+    return imap_unordered(executor, fn, split_chunks(sized, chunk_size, chunked), window, skip)
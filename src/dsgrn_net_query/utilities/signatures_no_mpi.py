@@ -1,10 +1,29 @@
 # Signatures
 from DSGRN import *
-import sqlite3
+import sqlite3, sys
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+def MorseGraphRecord(mg):
+    '''
+    Parse a stringified Morse graph once and collect everything the database tables need.
+    :param mg: string produced by MorseGraph.stringify()
+    :return: (Graphviz string, number of vertices, list of (source, target) edges, list of (vertex, label) annotations)
+    '''
+    morsegraph = MorseGraph().parse(mg)
+    poset = morsegraph.poset()
+    size = poset.size()
+    edges = [(s, t) for s in range(size) for t in poset.children(s)]
+    annotations = [(v, label) for v in range(size) for label in morsegraph.annotation(v)]
+    return morsegraph.graphviz(), size, edges, annotations
+
 
 def SaveDatabase(filename, data, pg):
     # print("Save Database")
     conn = sqlite3.connect(filename)
+    # bulk load: no rollback journal and no syncing, the file is rebuilt from scratch if anything fails
+    conn.execute("PRAGMA journal_mode = OFF;")
+    conn.execute("PRAGMA synchronous = OFF;")
     conn.executescript("""
       create table if not exists Signatures (ParameterIndex INTEGER PRIMARY KEY, MorseGraphIndex INTEGER);
       create table if not exists MorseGraphViz (MorseGraphIndex INTEGER PRIMARY KEY, Graphviz TEXT);
@@ -14,47 +33,46 @@ def SaveDatabase(filename, data, pg):
       create table if not exists Network ( Name TEXT, Dimension INTEGER, Specification TEXT, Graphviz TEXT);
       """)
 
-    # Postprocessing to give Morse Graphs indices
-    morsegraphs = []
+    # Postprocessing to give Morse Graphs indices; each distinct Morse graph is parsed exactly once.
+    # data may be a generator, in which case the signatures are inserted as they are computed.
+    morsegraphindices = {}
+    records = []
     def signatures_table(data):
-        morsegraphindices = {}
         for (pi, mg) in data:
             if mg in morsegraphindices: # ideally I'd have a graph isomorphism check
                 mgi = morsegraphindices[mg]
             else:
                 mgi = len(morsegraphindices)
                 morsegraphindices[mg] = mgi
-                morsegraphs.append(mg)
+                records.append(MorseGraphRecord(mg))
             yield (pi,mgi)
 
-    def MG(mgi):
-        return MorseGraph().parse(morsegraphs[mgi])
-
     name = filename
     if filename[-3:] == '.db':
         name = filename[:-3]
 
-    # print("Inserting Network table into Database", flush=True)
-    conn.execute("insert into Network ( Name, Dimension, Specification, Graphviz) values (?, ?, ?, ?);", (name, pg.network().size(), pg.network().specification(), pg.network().graphviz()))
+    with conn:
+        # print("Inserting Network table into Database", flush=True)
+        conn.execute("insert into Network ( Name, Dimension, Specification, Graphviz) values (?, ?, ?, ?);", (name, pg.network().size(), pg.network().specification(), pg.network().graphviz()))
 
-    # print("Inserting Signatures table into Database", flush=True)
-    conn.executemany("insert into Signatures (ParameterIndex, MorseGraphIndex) values (?, ?);", signatures_table(data))
+        # print("Inserting Signatures table into Database", flush=True)
+        conn.executemany("insert into Signatures (ParameterIndex, MorseGraphIndex) values (?, ?);", signatures_table(data))
 
-    # print("Inserting MorseGraphViz table into Database", flush=True)
-    conn.executemany("insert into MorseGraphViz (MorseGraphIndex, Graphviz) values (?, ?);",
-      ( (mgi, MG(mgi).graphviz()) for mgi in range(0, len(morsegraphs))) )
+        # print("Inserting MorseGraphViz table into Database", flush=True)
+        conn.executemany("insert into MorseGraphViz (MorseGraphIndex, Graphviz) values (?, ?);",
+          [ (mgi, graphviz) for mgi, (graphviz, _, _, _) in enumerate(records) ])
 
-    # print("Inserting MorseGraphVertices table into Database", flush=True)
-    conn.executemany("insert into MorseGraphVertices (MorseGraphIndex, Vertex) values (?, ?);",
-      ( (mgi, v) for mgi in range(0, len(morsegraphs)) for v in range(0,MG(mgi).poset().size()) ))
+        # print("Inserting MorseGraphVertices table into Database", flush=True)
+        conn.executemany("insert into MorseGraphVertices (MorseGraphIndex, Vertex) values (?, ?);",
+          [ (mgi, v) for mgi, (_, size, _, _) in enumerate(records) for v in range(size) ])
 
-    # print("Inserting MorseGraphEdges table into Database", flush=True)
-    conn.executemany("insert into MorseGraphEdges (MorseGraphIndex, Source, Target) values (?, ?, ?);",
-      ( (mgi, s, t) for mgi in range(0, len(morsegraphs)) for s in range(0,MG(mgi).poset().size()) for t in MG(mgi).poset().children(s) ))
+        # print("Inserting MorseGraphEdges table into Database", flush=True)
+        conn.executemany("insert into MorseGraphEdges (MorseGraphIndex, Source, Target) values (?, ?, ?);",
+          [ (mgi, s, t) for mgi, (_, _, edges, _) in enumerate(records) for (s, t) in edges ])
 
-    # print("Inserting MorseGraphAnnotations table into Database", flush=True)
-    conn.executemany("insert into MorseGraphAnnotations (MorseGraphIndex, Vertex, Label) values (?, ?, ?);",
-      ( (mgi, v, label) for mgi in range(0, len(morsegraphs)) for v in range(0,MG(mgi).poset().size()) for label in MG(mgi).annotation(v) ))
+        # print("Inserting MorseGraphAnnotations table into Database", flush=True)
+        conn.executemany("insert into MorseGraphAnnotations (MorseGraphIndex, Vertex, Label) values (?, ?, ?);",
+          [ (mgi, v, label) for mgi, (_, _, _, annotations) in enumerate(records) for (v, label) in annotations ])
 
     # print("Indexing Database.", flush=True)
     conn.executescript("""
@@ -70,10 +88,53 @@ def SaveDatabase(filename, data, pg):
     conn.close()
 
 
-def make_db(specfile, outfile):
+@lru_cache(maxsize=1)
+def _parametergraph(spec):
+    return ParameterGraph(Network(spec))
+
+
+def _morsegraphs(spec, start, stop):
+    # work function for make_db; the parameter graph is built once per worker process
+    gpg = _parametergraph(spec)
+    return [(pi, MorseGraph(DomainGraph(gpg.parameter(pi))).stringify()) for pi in range(start, stop)]
+
+
+def mpi_initialized():
+    '''
+    :return: True if this process has initialized MPI through mpi4py, else False; mpi4py is not imported otherwise
+    '''
+    return "mpi4py.MPI" in sys.modules and sys.modules["mpi4py.MPI"].Is_initialized()
+
+
+def make_db(specfile, outfile, num_proc=1, chunk_size=1000, executor=None):
+    '''
+    Compute the Morse graph of every DSGRN parameter of a network and save them in a DSGRN database, without mpiexec.
+    :param specfile: DSGRN network specification or a file containing one
+    :param outfile: path of the database file
+    :param num_proc: number of processes computing Morse graphs, default = 1 (serial). The processes are forked, which
+            is unsafe in an MPI process, so num_proc > 1 is refused once MPI is initialized.
+    :param chunk_size: number of consecutive DSGRN parameters in one unit of work when num_proc > 1 or with an executor
+    :param executor: optional executor object on the root process, see executor_utilities.open_executor, whose workers
+            compute the Morse graphs instead of num_proc forked processes; this is safe under MPI
+    :return: None. The database is written.
+    '''
+    if executor is None and num_proc > 1 and mpi_initialized():
+        raise ValueError("make_db cannot fork worker processes in an MPI process. Use num_proc = 1 or a non-MPI backend.")
     gpg = ParameterGraph(Network(specfile))
-    results = []
     # print("Computing Morse Graphs")
-    for pi in range(gpg.size()):
-        results.append((pi, MorseGraph(DomainGraph(gpg.parameter(pi))).stringify()))
-    SaveDatabase(outfile, results, gpg)
+    if executor is not None:
+        SaveDatabase(outfile, _map_morsegraphs(executor, gpg, chunk_size), gpg)
+    elif num_proc <= 1:
+        results = ((pi, MorseGraph(DomainGraph(gpg.parameter(pi))).stringify()) for pi in range(gpg.size()))
+        SaveDatabase(outfile, results, gpg)
+    else:
+        with ProcessPoolExecutor(num_proc) as pool:
+            SaveDatabase(outfile, _map_morsegraphs(pool, gpg, chunk_size), gpg)
+
+
+def _map_morsegraphs(executor, gpg, chunk_size):
+    # chunks come back in order, so the Morse graph indices are the same as in the serial computation
+    spec = gpg.network().specification()
+    starts = range(0, gpg.size(), chunk_size)
+    chunks = executor.map(_morsegraphs, [spec] * len(starts), starts, [min(start + chunk_size, gpg.size()) for start in starts])
+    return (result for chunk in chunks for result in chunk)
@@ -51,5 +51,30 @@ def test_count_stableFC_no_count():
     subprocess.call(["rm","-r", "temp_results/"])
 
 
+def test_count_stableFC_serial():
+    Path("temp_results").mkdir(exist_ok=True)
+    command = " ".join(["python", "../src/dsgrn_net_query/queries/CountStableFC.py", "mpi_networks_FCln.txt", "params_FC_serial.json", "temp_results",">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+    output_file = os.path.join(qdir,"query_results.json")
+    results = json.load(open(output_file))
+    assert(results == {"SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : SWI4 : E": [2, 14], "SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : NDD1 : E": [0, 4]})
+    subprocess.call(["rm","-r", "temp_results/"])
+
+
+def test_count_stableFC_profile():
+    Path("temp_results").mkdir(exist_ok=True)
+    command = " ".join(["mpiexec", "-n", "2", "python", "../src/dsgrn_net_query/queries/CountStableFC.py", "mpi_networks_FCln.txt", "mpi_params_FC_profile.json", "temp_results",">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+    results = json.load(open(os.path.join(qdir,"query_results.json")))
+    assert(results == {"SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : SWI4 : E": [2, 14], "SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : NDD1 : E": [0, 4]})
+    profile = json.load(open(os.path.join(qdir,"profile.json")))
+    assert(profile["stages"]["DomainGraph"]["calls"] == 18 and profile["stages"]["MorseGraph"]["calls"] == 18)
+    assert(sorted(profile["networks"]) == sorted(results))
+    assert(sum(worker["units"] for worker in profile["workers"].values()) == 2)
+    subprocess.call(["rm","-r", "temp_results/"])
+
+
 if __name__ == "__main__":
     test_count_stableFCln()
\ No newline at end of file
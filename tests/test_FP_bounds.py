@@ -0,0 +1,43 @@
+import DSGRN
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.queries.CountFPMatch import DSGRN_Computation, compile_bounds, have_matches
+
+
+# string-based bounds check that compile_bounds and bounds_match replaced
+def is_FP_match(bounds_ind, annotation):
+    digits = [int(s) for s in annotation.replace(",", "").split() if s.isdigit()]
+    return all(digits[k] >= bounds_ind[k][0] and digits[k] <= bounds_ind[k][1] for k in bounds_ind)
+
+
+def is_multistable_match(network, b, stable_FP_annotations):
+    bounds_ind = {network.index(str(k)): b[k] for k in b}
+    return any([is_FP_match(bounds_ind, a) for a in stable_FP_annotations])
+
+
+def string_match(network, included_bounds, excluded_bounds, stable_FP_annotations):
+    return all(is_multistable_match(network, b, stable_FP_annotations) for b in included_bounds) and \
+           not any(is_multistable_match(network, b, stable_FP_annotations) for b in excluded_bounds)
+
+
+def test_bounds_match():
+    bounds = [([{"X1":[2,2],"X2":[1,1],"X3":[0,1]}], []),
+              ([{"X1":[2,2],"X2":[1,1],"X3":[0,1]}], [{"X1":[0,0],"X2":[0,0]}, {"X3":[3,3]}]),
+              ([{"X1":[0,1]}, {"X1":[2,2]}], []),
+              ([], [{"X2":[0,0]}]),
+              ([], [])]
+    for netspec in read_networks("mpi_networks_FP.txt"):
+        network = DSGRN.Network(netspec)
+        parametergraph = DSGRN.ParameterGraph(network)
+        annotations = [DSGRN_Computation(parametergraph.parameter(p)) for p in range(parametergraph.size())]
+        for included_bounds, excluded_bounds in bounds:
+            old = [string_match(network, included_bounds, excluded_bounds, a) for a in annotations]
+            included = compile_bounds(network, included_bounds)
+            excluded = compile_bounds(network, excluded_bounds)
+            # one batch with every parameter and batches of 7 parameters, as CountFPMatch checks them
+            assert(have_matches(annotations, included, excluded).tolist() == old)
+            batched = [bool(b) for i in range(0, len(annotations), 7) for b in have_matches(annotations[i:i + 7], included, excluded)]
+            assert(batched == old)
+
+
+if __name__ == "__main__":
+    test_bounds_match()
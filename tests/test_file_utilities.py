@@ -0,0 +1,50 @@
+import DSGRN
+import subprocess,json,os,shutil
+from pathlib import Path
+from dsgrn_net_query.utilities.file_utilities import read_networks, network_names, distinct_networks, fan_out
+
+
+def duplicate_networks():
+    networks = read_networks("mpi_networks_FCln.txt")
+    # the same networks with other whitespace and node order, and an exact repeat
+    spaced = networks[0].replace(" : ", ":").replace("\n", "\n\n  ")
+    reordered = "\n".join(reversed(networks[1].split("\n")))
+    return networks, networks + [spaced, reordered, networks[0]]
+
+
+def test_network_names():
+    networks = read_networks("mpi_networks_FP.txt") + read_networks("mpi_networks_ME.txt") + \
+               ["  B : (A)(~C) : E\n\nA : (B) : E\n. comment\nC : (A + B) : E\n@ A 0.5"]
+    for netspec in networks:
+        network = DSGRN.Network(netspec)
+        assert(network_names(netspec) == tuple(sorted(network.name(k) for k in range(network.size()))))
+
+
+def test_distinct_networks():
+    networks, specs = duplicate_networks()
+    duplicates = {}
+    assert(list(distinct_networks(specs, duplicates)) == networks)
+    # every specification gets the result of the distinct network it duplicates
+    results = dict(fan_out([(netspec, k) for k, netspec in enumerate(networks)], duplicates))
+    assert(results == {specs[0] : 0, specs[1] : 1, specs[2] : 0, specs[3] : 1})
+
+
+def test_duplicate_queries():
+    Path("temp_results").mkdir(exist_ok=True)
+    networks, specs = duplicate_networks()
+    network_file = os.path.join("temp_results", "networks_duplicates.txt")
+    open(network_file, "w").write(str(specs))
+    command = " ".join(["python", "../src/dsgrn_net_query/queries/CountStableFC.py", network_file, "params_FC_serial.json", "temp_results",">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    log = open("dsgrn_net_query.log").read()
+    assert("Found 2 distinct networks among 5 network specifications; skipping 3 duplicate queries." in log)
+    qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+    results = json.load(open(os.path.join(qdir,"query_results.json")))
+    assert(results == {specs[0] : [2, 14], specs[1] : [0, 4], specs[2] : [2, 14], specs[3] : [0, 4]})
+    shutil.rmtree("temp_results")
+
+
+if __name__ == "__main__":
+    test_network_names()
+    test_distinct_networks()
+    test_duplicate_queries()
@@ -0,0 +1,48 @@
+import sqlite3,os,tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dsgrn_net_query.utilities.executor_utilities import SerialExecutor
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.utilities.signatures_no_mpi import make_db
+
+# the Network table also records the file name, which differs between the databases
+TABLES = {"Signatures" : "*", "MorseGraphViz" : "*", "MorseGraphVertices" : "*", "MorseGraphEdges" : "*",
+          "MorseGraphAnnotations" : "*", "Network" : "Dimension, Specification, Graphviz"}
+
+
+def db_rows(dbfile):
+    connection = sqlite3.connect(dbfile)
+    rows = {table : sorted(connection.execute("SELECT {} FROM {}".format(columns, table))) for table, columns in TABLES.items()}
+    connection.close()
+    return rows
+
+
+def test_make_db_pool():
+    netspec = read_networks("networks_stable_X1X2X3.txt")[0]
+    rows = []
+    # serial, and two processes with chunks that do not divide the parameter graph evenly
+    for num_proc, chunk_size in [(1, 1000), (2, 300)]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "network.db")
+            make_db(netspec, dbfile, num_proc, chunk_size)
+            rows.append(db_rows(dbfile))
+    assert(len(rows[0]["Signatures"]) == 2352)
+    assert(rows[0] == rows[1])
+
+
+def test_make_db_executor():
+    netspec = read_networks("networks_stable_X1X2X3.txt")[0]
+    rows = []
+    # the executor of a query computes the Morse graphs instead of a pool of its own
+    for executor in [None, SerialExecutor(), ProcessPoolExecutor(2)]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbfile = os.path.join(tmpdir, "network.db")
+            make_db(netspec, dbfile, chunk_size=300, executor=executor)
+            rows.append(db_rows(dbfile))
+        if executor is not None:
+            executor.shutdown()
+    assert(rows[0] == rows[1] == rows[2])
+
+
+if __name__ == "__main__":
+    test_make_db_pool()
+    test_make_db_executor()
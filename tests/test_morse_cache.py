@@ -0,0 +1,86 @@
+import DSGRN
+import subprocess,json,os,sqlite3,tempfile
+from pathlib import Path
+from dsgrn_net_query.utilities.file_utilities import read_networks, canonical_key
+from dsgrn_net_query.utilities.morsegraph_utilities import MorseGraphCache, morse_summary, network_key
+
+
+def cached_summaries(netspec, path=None, max_entries=1000000):
+    network = DSGRN.Network(netspec)
+    parametergraph = DSGRN.ParameterGraph(network)
+    morsecache = MorseGraphCache(network, path, max_entries)
+    summaries = [morsecache.summary(p, parametergraph.parameter(p)) for p in range(parametergraph.size())]
+    morsecache.close()
+    return summaries, morsecache
+
+
+def test_morse_cache_reuse():
+    netspec = read_networks("mpi_networks_FP.txt")[0]
+    parametergraph = DSGRN.ParameterGraph(DSGRN.Network(netspec))
+    uncached = [morse_summary(DSGRN.DomainGraph(parametergraph.parameter(p))) for p in range(parametergraph.size())]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "morse_cache.db")
+        first, morsecache = cached_summaries(netspec, path)
+        assert(morsecache.hits == 0 and morsecache.misses == parametergraph.size())
+        second, morsecache = cached_summaries(netspec, path)
+        assert(morsecache.hits == parametergraph.size() and morsecache.misses == 0)
+    assert(first == uncached and second == uncached)
+
+
+def test_network_key():
+    netspec = read_networks("mpi_networks_FCln.txt")[0]
+    spaced = netspec.replace(" : ", ":").replace("\n", "\n\n  ")
+    reordered = "\n".join(reversed(netspec.split("\n")))
+    assert(network_key(DSGRN.Network(spaced)) == network_key(DSGRN.Network(netspec)) == canonical_key(netspec, ordered=True).hex())
+    # the node order fixes the DSGRN parameter indices, so it is part of the key, unlike for duplicate networks
+    assert(canonical_key(reordered) == canonical_key(netspec))
+    assert(network_key(DSGRN.Network(reordered)) != network_key(DSGRN.Network(netspec)))
+
+
+def test_morse_cache_eviction():
+    networks = read_networks("mpi_networks_FP.txt")
+    sizes = [DSGRN.ParameterGraph(DSGRN.Network(netspec)).size() for netspec in networks]
+    keys = [network_key(DSGRN.Network(netspec)) for netspec in networks]
+    max_entries = 200
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "morse_cache.db")
+
+        def cached_networks():
+            connection = sqlite3.connect(path)
+            rows = dict(connection.execute("SELECT hash, COUNT(*) FROM summaries GROUP BY hash"))
+            total = connection.execute("SELECT SUM(entries) FROM networks").fetchone()[0]
+            connection.close()
+            assert(total == sum(rows.values()))
+            return rows
+
+        # (network used, whether it is read back from the cache, networks left in the cache afterwards)
+        steps = [(0, False, [0]), (1, False, [1]), (2, False, [1, 2]), (1, True, [1, 2]), (0, False, [0]), (0, True, [0])]
+        assert(sizes[0] + sizes[1] > max_entries and sizes[1] + sizes[2] <= max_entries)
+        for k, hit, cached in steps:
+            _, morsecache = cached_summaries(networks[k], path, max_entries)
+            assert((morsecache.hits, morsecache.misses) == ((sizes[k], 0) if hit else (0, sizes[k])))
+            # the network in use is never evicted, the others are evicted least recently used first
+            rows = cached_networks()
+            assert(rows == {keys[j] : sizes[j] for j in cached})
+            assert(sum(rows.values()) <= max_entries)
+
+
+def test_morse_cache_query():
+    Path("temp_results").mkdir(exist_ok=True)
+    outputs = []
+    for _ in range(2):
+        command = " ".join(["python", "../src/dsgrn_net_query/queries/CountStableFC.py", "mpi_networks_FCln.txt", "params_FC_morse_cache.json", "temp_results",">dsgrn_net_query.log","2>&1"])
+        os.system(command)
+        qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+        outputs.append((json.load(open(os.path.join(qdir,"query_results.json"))), json.load(open(os.path.join(qdir,"profile.json")))))
+    (results, profile), (cached_results, cached_profile) = outputs
+    assert(results == {"SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : SWI4 : E": [2, 14], "SWI4 : (NDD1)(~YOX1) : E\nHCM1 : SWI4 : E\nNDD1 : HCM1 : E\nYOX1 : NDD1 : E": [0, 4]})
+    assert(cached_results == results)
+    # the second run reads every Morse graph summary from the cache
+    assert(profile["stages"]["MorseGraph"]["calls"] == 18)
+    assert("MorseGraph" not in cached_profile["stages"] and "DomainGraph" not in cached_profile["stages"])
+    subprocess.call(["rm","-r", "temp_results/"])
+
+
+if __name__ == "__main__":
+    test_morse_cache_reuse()
@@ -0,0 +1,32 @@
+import subprocess,json,os
+from pathlib import Path
+
+
+def test_multiquery():
+    Path("temp_results").mkdir(exist_ok=True)
+    command = " ".join(["mpiexec", "-n", "2", "python", "../src/dsgrn_net_query/queries/MultiQuery.py", "networks_stable_X1X2X3.txt", "mpi_params_MQ.json", "temp_results",">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+    results = json.load(open(os.path.join(qdir,"CountFPMatch","query_results.json")))
+    assert (results == {
+        'X1 : (X1)(~X3) : E\nX2 : (X3)(~X1) : E\nX3 : (X1 + X2) : E\n': [0, 2352],
+        'X1 : (X1)(~X3) : E\nX2 : (X1 + X3) : E\nX3 : (X1 + X2) : E\n': [24, 2352],
+        'X1 : (X1)(~X3) : E\nX2 : (X1) : E\nX3 : (X1 + X2) : E\n': [8, 168]
+    })
+    results = json.load(open(os.path.join(qdir,"CountStableFC","query_results.json")))
+    assert (results == {
+        'X1 : (X1)(~X3) : E\nX2 : (X3)(~X1) : E\nX3 : (X1 + X2) : E\n': [152, 2352],
+        'X1 : (X1)(~X3) : E\nX2 : (X1 + X3) : E\nX3 : (X1 + X2) : E\n': [500, 2352],
+        'X1 : (X1)(~X3) : E\nX2 : (X1) : E\nX3 : (X1 + X2) : E\n': [76, 168]
+    })
+    results = json.load(open(os.path.join(qdir,"CountPatternMatch","query_results_stablefc_no_time_series_file.json")))
+    assert (results == {
+        'X1 : (X1)(~X3) : E\nX2 : (X3)(~X1) : E\nX3 : (X1 + X2) : E\n': [[0.0, 0, 152, 2352], [0.1, 0, 152, 2352]],
+        'X1 : (X1)(~X3) : E\nX2 : (X1 + X3) : E\nX3 : (X1 + X2) : E\n': [[0.0, 205, 500, 2352], [0.1, 317, 500, 2352]],
+        'X1 : (X1)(~X3) : E\nX2 : (X1) : E\nX3 : (X1 + X2) : E\n': [[0.0, 40, 76, 168], [0.1, 54, 76, 168]]
+    })
+    subprocess.call(["rm","-r", "temp_results/"])
+
+
+if __name__ == "__main__":
+    test_multiquery()
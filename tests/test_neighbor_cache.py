@@ -0,0 +1,37 @@
+import os,tempfile
+from dsgrn_net_query.utilities import parameter_utilities
+from dsgrn_net_query.utilities.file_utilities import read_networks
+
+
+class CountingNeighbors:
+    # stands in for dsgrn_utilities.get_parameter_neighbors and counts the expensive computations
+    def __init__(self):
+        self.calls = 0
+
+    def make_nonessential(self, netspec):
+        return netspec, netspec.replace(" : E", "")
+
+    def get_essential_parameter_neighbors(self, parametergraph):
+        self.calls += 1
+        return [0, 1], [parametergraph.size() - 1]
+
+
+def test_neighbor_cache(monkeypatch):
+    neighbors = CountingNeighbors()
+    monkeypatch.setattr(parameter_utilities, "neighbors", neighbors)
+    netspecs = read_networks("mpi_networks_FP.txt")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        first = parameter_utilities.get_neighbors(netspecs[0], cache_dir)
+        assert(neighbors.calls == 1)
+        assert(os.listdir(cache_dir) and not [f for f in os.listdir(cache_dir) if ".tmp" in f])
+        # the second call loads the cached result
+        assert(parameter_utilities.get_neighbors(netspecs[0], cache_dir) == first)
+        assert(neighbors.calls == 1)
+        # a different network specification misses the cache
+        second = parameter_utilities.get_neighbors(netspecs[1], cache_dir)
+        assert(neighbors.calls == 2 and second != first)
+        assert(parameter_utilities.get_neighbors(netspecs[1], cache_dir) == second)
+        assert(neighbors.calls == 2)
+    # without a cache directory every call computes
+    assert(parameter_utilities.get_neighbors(netspecs[0]) == first)
+    assert(neighbors.calls == 3)
@@ -0,0 +1,96 @@
+import DSGRN
+import copy,os,tempfile
+from collections import OrderedDict
+from dsgrn_net_query.utilities import pattern_utilities
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.utilities.morsegraph_utilities import open_morse_cache
+from dsgrn_net_query.utilities.pattern_utilities import get_patterngraphs, patterngraph_counters, cache_counters, ParameterAnalysis, domain_check, stableFC_check
+
+EVENTS = [("X1","min"),("X2","min"),("X3","min"),("X1","max"),("X2","max"),("X3","max")]
+POSETS = {"ts" : [(0.0, (EVENTS, [(0,1),(1,2),(2,3),(3,4),(4,5)])), (0.1, (EVENTS, [(0,1),(0,2),(1,3),(2,5),(3,4),(4,5)]))]}
+
+
+def empty_patterngraph_cache(monkeypatch, size=8):
+    monkeypatch.setattr(pattern_utilities, "_patterngraph_cache", OrderedDict())
+    monkeypatch.setattr(pattern_utilities, "_patterngraph_cache_size", size)
+    monkeypatch.setattr(pattern_utilities, "_patterngraph_last", (None, None, None))
+    monkeypatch.setattr(pattern_utilities, "_patterngraph_stats", {"hits" : 0, "builds" : 0, "build_time" : 0.0})
+
+
+def test_patterngraph_cache(monkeypatch):
+    empty_patterngraph_cache(monkeypatch)
+    networks = read_networks("networks_stable_X1X2X3.txt")
+    network = DSGRN.Network(networks[0])
+    morsecache = open_morse_cache({}, network)
+    before = patterngraph_counters()
+    patterngraphs = get_patterngraphs(network, POSETS)
+    assert(cache_counters(before, morsecache)["builds"] == 1 and cache_counters(before, morsecache)["hits"] == 0)
+    assert([eps for eps, _ in patterngraphs["ts"]] == [0.0, 0.1])
+    # the same objects, as inside a parameter loop
+    assert(get_patterngraphs(network, POSETS) is patterngraphs)
+    # fresh copies with the same contents, as every work function receives them
+    assert(get_patterngraphs(DSGRN.Network(networks[0]), copy.deepcopy(POSETS)) is patterngraphs)
+    counters = cache_counters(before, morsecache)
+    assert(counters["builds"] == 1 and counters["hits"] == 2)
+    # another network or another set of posets builds new pattern graphs
+    get_patterngraphs(DSGRN.Network(networks[1]), POSETS)
+    get_patterngraphs(network, {"ts" : POSETS["ts"][:1]})
+    get_patterngraphs(network, {"other_ts" : POSETS["ts"]})
+    counters = cache_counters(before, morsecache)
+    assert(counters["builds"] == 4 and counters["hits"] == 2)
+    assert(get_patterngraphs(network, POSETS) is patterngraphs)
+    assert(cache_counters(before, morsecache)["builds"] == 4)
+
+
+def test_patterngraph_cache_eviction(monkeypatch):
+    empty_patterngraph_cache(monkeypatch, size=2)
+    networks = [DSGRN.Network(netspec) for netspec in read_networks("networks_stable_X1X2X3.txt")]
+    for network in networks:
+        get_patterngraphs(network, POSETS)
+    # the two most recently used networks are still cached
+    get_patterngraphs(networks[2], POSETS)
+    get_patterngraphs(networks[1], POSETS)
+    assert(patterngraph_counters()["builds"] == 3)
+    # the least recently used network was evicted and is built again
+    get_patterngraphs(networks[0], POSETS)
+    assert(patterngraph_counters()["builds"] == 4)
+    assert(len(pattern_utilities._patterngraph_cache) == 2)
+
+
+
+def recomputed_checks(parameter, patterngraph):
+    # every DSGRN object is computed again for each pattern match, as before ParameterAnalysis
+    dommatch = bool(DSGRN.PathMatch(DSGRN.MatchingGraph(DSGRN.SearchGraph(DSGRN.DomainGraph(parameter)), patterngraph)))
+    domaingraph = DSGRN.DomainGraph(parameter)
+    morsegraph = DSGRN.MorseGraph(domaingraph)
+    FC = False
+    stabmatch = False
+    for i in range(0, morsegraph.poset().size()):
+        if morsegraph.annotation(i)[0] == "FC" and len(morsegraph.poset().children(i)) == 0:
+            FC = True
+            if DSGRN.PathMatch(DSGRN.MatchingGraph(DSGRN.SearchGraph(domaingraph, i), patterngraph)):
+                stabmatch = True
+                break
+    return dommatch, stabmatch, FC
+
+
+def test_parameter_analysis():
+    netspec = [netspec for netspec in read_networks("networks_stable_X1X2X3.txt") if "X2 : (X1) : E" in netspec][0]
+    network = DSGRN.Network(netspec)
+    parametergraph = DSGRN.ParameterGraph(network)
+    # the unordered poset matches at some parameters and not at others
+    posets = {"ts" : POSETS["ts"] + [(0.2, (EVENTS[:3], []))]}
+    patterngraphs = [patterngraph for _, patterngraph in get_patterngraphs(network, posets)["ts"]]
+    expected = [[recomputed_checks(parametergraph.parameter(p), patterngraph) for patterngraph in patterngraphs] for p in range(parametergraph.size())]
+    assert(len(set(result[-1][0] for result in expected)) == 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # without a Morse graph cache, then filling and reading a cache file
+        for params in [{}, {"morse_cache" : os.path.join(tmpdir, "morse_cache.db")}, {"morse_cache" : os.path.join(tmpdir, "morse_cache.db")}]:
+            morsecache = open_morse_cache(params, network)
+            results = []
+            for p in range(parametergraph.size()):
+                # one analysis is shared by all pattern matches of the parameter
+                analysis = ParameterAnalysis(parametergraph.parameter(p), morsecache, p)
+                results.append([(domain_check(analysis, patterngraph),) + stableFC_check(analysis, patterngraph) for patterngraph in patterngraphs])
+            morsecache.close()
+            assert(results == expected)
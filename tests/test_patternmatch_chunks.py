@@ -0,0 +1,59 @@
+import json
+import numpy as np
+from dsgrn_net_query.queries.CountPatternMatch_large_networks import get_chunks, encode_chunk, decode_chunk, encode_bitmaps, decode_bitmaps, cell_layout, union_columns, union_bitmaps, merge_chunk, reformat_output
+
+# only the time series file names and the epsilons of the posets are used here
+POSETS = {"ts1" : [(0.0, None), (0.1, None)], "ts2" : [(0.0, None), (0.1, None)]}
+PARAMS = {"domain" : True, "stablefc" : True}
+
+
+def checkpointed(record):
+    # the checkpoint file stores JSON
+    return json.loads(json.dumps(record))
+
+
+def test_get_chunks():
+    # without a parameter list the chunks are ranges
+    chunks = get_chunks({"chunk_size" : 10}, 25, {})
+    assert(chunks == [range(0, 10), range(10, 20), range(20, 25)])
+    assert(encode_chunk(chunks[1]) == {"start" : 10, "stop" : 20})
+    assert([decode_chunk(checkpointed(encode_chunk(chunk))) for chunk in chunks] == chunks)
+    # a parameter list keeps its order without duplicates
+    chunks = get_chunks({"chunk_size" : 2, "parameter_list" : [5, 3, 5, 8, 1]}, 25, {})
+    assert(chunks == [[5, 3], [8, 1]])
+    assert([decode_chunk(checkpointed(encode_chunk(chunk))) for chunk in chunks] == chunks)
+    # on resume, the parameters recorded in the checkpoint are skipped
+    records = {"chunk 0" : checkpointed({"parameters" : encode_chunk(range(0, 10))}), "chunk 5" : checkpointed({"parameters" : encode_chunk([20, 5, 24])})}
+    chunks = get_chunks({"chunk_size" : 4}, 25, records)
+    assert(chunks == [[10, 11, 12, 13], [14, 15, 16, 17], [18, 19, 21, 22], [23]])
+
+
+def test_merge_chunks():
+    cells = cell_layout(POSETS, PARAMS)
+    columns = union_columns(cells, POSETS)
+    assert(columns == {("domain", 0.0) : [0, 2], ("domain", 0.1) : [1, 3], ("stablefc", 0.0) : [4, 6], ("stablefc", 0.1) : [5, 7]})
+    assert(union_columns(cell_layout({"ts1" : POSETS["ts1"]}, PARAMS), {"ts1" : POSETS["ts1"]}) == {})
+    pgsize = 53
+    rows = np.random.default_rng(0).random((pgsize, len(cells) + 1)) < 0.3
+    union_totals = {key : int(rows[:, cols].any(axis=1).sum()) for key, cols in columns.items()}
+    # chunks that do not divide the parameter graph evenly, as ranges and as lists out of order
+    for param_dict in [{"chunk_size" : 10}, {"chunk_size" : 7, "parameter_list" : list(range(pgsize))[::-1]}]:
+        totals = np.zeros(len(cells) + 1, dtype=np.int64)
+        union = {key : np.zeros(pgsize, dtype=bool) for key in columns}
+        for chunk in get_chunks(param_dict, pgsize, {}):
+            chunk_rows = rows[np.asarray(chunk)]
+            record = checkpointed({"parameters" : encode_chunk(chunk), "counts" : chunk_rows.sum(axis=0).tolist(), "union" : encode_bitmaps(union_bitmaps(chunk_rows, cells, POSETS))})
+            merge_chunk(totals, union, decode_chunk(record["parameters"]), record["counts"], decode_bitmaps(record["union"]))
+        assert((totals == rows.sum(axis=0)).all())
+        # a DSGRN parameter that matches both time series is counted once in "all"
+        assert({key : int(matched.sum()) for key, matched in union.items()} == union_totals)
+    res = reformat_output(cells, totals, union_totals, pgsize)
+    numFC = int(rows[:, -1].sum())
+    assert(res["domain"]["all"] == [[eps, union_totals[("domain", eps)], pgsize] for eps in [0.0, 0.1]])
+    assert(res["stablefc"]["all"] == [[eps, union_totals[("stablefc", eps)], numFC, pgsize] for eps in [0.0, 0.1]])
+    assert(res["domain"]["ts2"] == [[0.0, int(rows[:, 2].sum()), pgsize], [0.1, int(rows[:, 3].sum()), pgsize]])
+
+
+if __name__ == "__main__":
+    test_get_chunks()
+    test_merge_chunks()
@@ -0,0 +1,54 @@
+import os,shutil,tempfile,json
+from concurrent.futures import ProcessPoolExecutor
+from dsgrn_net_query.utilities import poset_utilities
+from dsgrn_net_query.utilities.file_utilities import read_networks
+
+
+def test_poset_cache(monkeypatch):
+    computed = []
+
+    def counting_compute_poset(task):
+        # stands in for the poset computation and records every call
+        computed.append(task)
+        ts_file, row_format, epsilons, names = task
+        return [(eps, (list(names), [])) for eps in epsilons]
+
+    monkeypatch.setattr(poset_utilities, "compute_poset", counting_compute_poset)
+    networks = read_networks("mpi_networks_pm.txt")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ts_file = os.path.join(tmpdir, "wt_rnaseq_ts.tsv")
+        shutil.copy("wt_rnaseq_ts.tsv", ts_file)
+        params = {"timeseriesfname" : ts_file, "tsfile_is_row_format" : True, "epsilons" : [0.0, 0.05], "poset_cache" : True}
+        # both networks have the same node names, so there is one poset computation
+        posets, new_networks, _ = poset_utilities.calculate_poset(params, networks)
+        assert(len(computed) == 1 and new_networks == networks)
+        assert(os.path.exists(poset_utilities.poset_cache_file(ts_file)))
+        assert(not [f for f in os.listdir(tmpdir) if ".tmp" in f])
+        # the second call loads the posets from the cache
+        assert(poset_utilities.calculate_poset(params, networks)[0] == posets)
+        assert(len(computed) == 1)
+        # other epsilons miss the cache, and both sets of epsilons are kept
+        poset_utilities.calculate_poset(dict(params, epsilons=[0.01]), networks)
+        assert(len(computed) == 2)
+        assert(poset_utilities.calculate_poset(params, networks)[0] == posets)
+        assert(len(computed) == 2)
+        # a change to the contents of the time series file changes its SHA-256 hash and misses the cache
+        open(ts_file, "a").write("# changed\n")
+        assert(poset_utilities.calculate_poset(params, networks)[0] == posets)
+        assert(len(computed) == 3)
+        assert(poset_utilities.calculate_poset(params, networks)[0] == posets)
+        assert(len(computed) == 3)
+        # without the key "poset_cache" the posets are always computed
+        poset_utilities.calculate_poset(dict(params, poset_cache=False), networks)
+        assert(len(computed) == 4)
+
+
+def test_parallel_posets():
+    params = json.load(open("mpi_params_pm.json"))
+    networks = read_networks("mpi_networks_pm.txt")
+    # one task per time series file and set of node names, whose results come back in the order of the tasks
+    serial = poset_utilities.calculate_posets_from_multiple_time_series(params, networks)
+    with ProcessPoolExecutor(2) as executor:
+        parallel = poset_utilities.calculate_posets_from_multiple_time_series(params, networks, executor)
+    assert(parallel == serial)
+    assert(len(next(iter(serial[0].values()))) == len(params["timeseriesfname"]))
@@ -0,0 +1,46 @@
+import subprocess,json,os,glob
+from pathlib import Path
+
+
+def run_query(module, resume=False):
+    command = " ".join(["mpiexec", "-n", "2", "python", "../src/dsgrn_net_query/queries/{}".format(module), "networks_stable_X1X2X3.txt", "params_pm_resume.json", "temp_results"] + (["--resume"] if resume else []) + [">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    # the datetime of the parameter file fixes the results folder, which resuming requires
+    qdir = os.path.join("temp_results","dsgrn_net_query_results_resume","queries_resume")
+    results = {os.path.basename(f) : json.load(open(f)) for f in glob.glob(os.path.join(qdir,"query_results*.json"))}
+    return qdir, results
+
+
+def truncate_checkpoint(qdir):
+    # keep the first record and half of the second, as an interrupted run would
+    fname = os.path.join(qdir,"checkpoint.jsonl")
+    lines = open(fname).readlines()
+    assert(len(lines) > 2)
+    open(fname,"w").write(lines[0] + lines[1][:len(lines[1]) // 2])
+
+
+def check_resume(module):
+    Path("temp_results").mkdir(exist_ok=True)
+    qdir, results = run_query(module)
+    assert(results)
+    truncate_checkpoint(qdir)
+    qdir, resumed = run_query(module, resume=True)
+    assert("Resuming" in open("dsgrn_net_query.log").read())
+    assert(resumed == results)
+    subprocess.call(["rm","-r", "temp_results/"])
+
+
+def test_resume_patternmatch():
+    check_resume("CountPatternMatch.py")
+
+
+def test_resume_patternmatch_DB():
+    check_resume("CountPatternMatch_DB.py")
+
+
+def test_resume_patternmatch_ln():
+    check_resume("CountPatternMatch_large_networks.py")
+
+
+if __name__ == "__main__":
+    test_resume_patternmatch()
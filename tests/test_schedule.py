@@ -0,0 +1,117 @@
+import subprocess,json,os,shutil,time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dsgrn_net_query.utilities.file_utilities import read_networks
+from dsgrn_net_query.utilities.executor_utilities import SerialExecutor
+from dsgrn_net_query.utilities.schedule_utilities import makespan, imap_unordered, lpt_imap_unordered, imap_chunks, parameter_graph_size
+
+
+def test_makespan():
+    # list scheduling in the given order leaves the long task for last, LPT order balances the workers
+    assert(makespan([1, 1, 1, 1, 4], 2) == 6)
+    assert(makespan([4, 1, 1, 1, 1], 2) == 4)
+    assert(makespan([5, 4, 3, 3, 3], 2) == 10)
+    assert(makespan([5, 4, 3, 3, 3], 3) == 7)
+    assert(makespan([2, 3], 0) == 5)
+    assert(makespan([], 2) == 0)
+
+
+def test_lpt_order(capsys):
+    submitted = []
+
+    def work(item):
+        # the serial executor runs every item as it is submitted
+        submitted.append(item)
+        return item * 10
+
+    items = ["a", "b", "c", "d", "e"]
+    costs = [1, 4, 2, 5, 3]
+    results = list(lpt_imap_unordered(SerialExecutor(), work, items, costs, 2))
+    assert(submitted == ["d", "b", "e", "c", "a"])
+    assert(sorted(results) == sorted(item * 10 for item in items))
+    assert("LPT schedule of 5 tasks over 2 workers" in capsys.readouterr().out)
+
+
+def test_skip():
+    submitted = []
+
+    def work(item):
+        submitted.append(item)
+        return item
+
+    # items of a finished group are not submitted any more; the next item is pulled before a result is yielded
+    finished = set()
+    items = [(0, 1), (0, 2), (1, 1), (0, 3), (1, 2), (0, 4)]
+    for result in imap_unordered(SerialExecutor(), work, items, 1, lambda item: item[0] in finished):
+        finished.add(result[0])
+    assert(submitted == [(0, 1), (0, 2), (1, 1), (1, 2)])
+    # queued items are cancelled at the next completion, only the items that have started by then still run
+    results = []
+    with ThreadPoolExecutor(1) as executor:
+        for result in imap_unordered(executor, partial(sleep_and_return, 0.05), range(10), skip=lambda item: bool(results)):
+            results.append(result)
+    assert(results[0] == 0 and len(results) <= 3)
+
+
+def sleep_and_return(seconds, item):
+    time.sleep(seconds)
+    return item
+
+
+def test_imap_chunks():
+    networks = read_networks("networks_stable_X1X2X3.txt")
+    sizes = [parameter_graph_size(netspec) for netspec in networks]
+    todo = list(enumerate(networks))
+    for params in [{"chunk_size" : 500}, {"chunk_size" : 500, "window" : 1}, {"chunk_size" : 500, "schedule" : "lpt"}]:
+        chunked = {}
+        submitted = []
+
+        def work(chunk):
+            # the serial executor runs every chunk as it is submitted
+            submitted.append(chunk)
+            return chunk
+
+        assert(sorted(imap_chunks(SerialExecutor(), work, todo, params, 1, chunked)) == sorted(submitted))
+        assert(chunked == {k : (netspec, sizes[k], -(-sizes[k] // 500)) for k, netspec in todo})
+        # the chunks of every network cover its parameter graph exactly once
+        for k, netspec in todo:
+            ranges = sorted((start, stop) for (j, spec, start, stop) in submitted if j == k and spec == netspec)
+            assert(ranges[0][0] == 0 and ranges[-1][1] == sizes[k])
+            assert(all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:])))
+        if "schedule" in params:
+            lengths = [stop - start for (_, _, start, stop) in submitted]
+            assert(lengths == sorted(lengths, reverse=True))
+
+
+def run_query(module, network_file, params, schedule):
+    params_file = os.path.join("temp_results", "params_{}.json".format(schedule))
+    json.dump(dict(params, schedule=schedule, datetime="_" + schedule), open(params_file, "w"))
+    command = " ".join(["mpiexec", "-n", "2", "python", "../src/dsgrn_net_query/queries/{}".format(module), network_file, params_file, "temp_results",">dsgrn_net_query.log","2>&1"])
+    os.system(command)
+    qdir = subprocess.check_output("tail -n 1 dsgrn_net_query.log",shell=True).strip().decode("utf-8")
+    return {f : json.load(open(os.path.join(qdir, f))) for f in os.listdir(qdir) if f.startswith("query_results") and f.endswith(".json")}
+
+
+def check_lpt(module, network_file, params_file):
+    Path("temp_results").mkdir(exist_ok=True)
+    params = json.load(open(params_file))
+    results = run_query(module, network_file, params, "file")
+    assert(results)
+    assert(run_query(module, network_file, params, "lpt") == results)
+    shutil.rmtree("temp_results")
+
+
+def test_lpt_stableFC():
+    check_lpt("CountStableFC.py", "mpi_networks_FCln.txt", "mpi_params_FCln.json")
+
+
+def test_lpt_patternmatch():
+    check_lpt("CountPatternMatch.py", "networks_stable_X1X2X3.txt", "params_pm_resume.json")
+
+
+if __name__ == "__main__":
+    test_makespan()
+    test_imap_chunks()
+    test_lpt_stableFC()
+    test_lpt_patternmatch()